@@ -0,0 +1,283 @@
+"""End-to-end benchmark of the checker pipeline on saved farsroid pages.
+
+Usage: python benchmarks/bench_pipeline.py [--rounds N] [--output FILE] [--baseline FILE]
+       python benchmarks/bench_pipeline.py --record [URL ...]
+
+Pages are served from a local HTTP server: every *.html file in
+benchmarks/fixtures (the vivatv page from urls_to_check.txt among them) plus
+synthetic farsroid pages with hundreds of download links. Each page goes through
+the same stages as a real run, each timed separately:
+
+  fetch    get_page_source_static() over the keep-alive session
+  parse    parse_page_html() with the chosen parser, scoped and full
+  extract  extract_app_name_from_page(), aggressively_clean_name_for_tracking()
+           and scrape_farsroid_page() against an empty tracker; extract_unchanged
+           repeats the scrape with the link fingerprints of a previous one
+  compare  compare_versions_batch() over the page's links, with a cold version cache
+
+Latency is reported as the median and p95 per page in milliseconds, throughput as
+pages (and MB) per second, and peak memory per stage from a separate tracemalloc
+pass. Logging is disabled while timing. With --baseline, stages whose median got
+slower than --max-regression (and by more than half a millisecond) are listed and the exit status is 1.
+
+--record saves live pages (by default those in urls_to_check.txt) as fixtures.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIXTURES_DIR = os.path.join(REPO_DIR, 'benchmarks', 'fixtures')
+sys.path.insert(0, os.path.join(REPO_DIR, 'scripts'))
+
+import app_updater  # noqa: E402
+from farsroid_scraper import aggressively_clean_name_for_tracking, extract_app_name_from_page, scrape_farsroid_page  # noqa: E402
+from version_utils import compare_versions_batch, version_key  # noqa: E402
+
+SYNTHETIC_LINK_COUNTS = (200, 800)
+REGRESSION_NOISE_FLOOR_MS = 0.5 # sub-millisecond stages jitter by more than any sensible --max-regression
+SYNTHETIC_VARIANTS = [
+    ("Mod-Extra", "دانلود فایل نصبی مود اکسترا برنامه با لینک مستقیم - 25 مگابایت"),
+    ("Mod-Lite", "دانلود فایل نصبی مود لایت برنامه با لینک مستقیم - 21 مگابایت"),
+    ("Premium", "دانلود فایل نصبی پرمیوم برنامه با لینک مستقیم - 30 مگابایت"),
+    ("arm64-v8a", "دانلود نسخه Arm64-v8a برنامه با لینک مستقیم"),
+    ("armeabi-v7a", "دانلود نسخه Armeabi-v7a برنامه با لینک مستقیم"),
+    ("x86_64", "دانلود نسخه x86_64 برنامه"),
+    ("Windows", "دانلود نسخه ویندوز برنامه (کامپیوتر)"),
+    ("Data", "دانلود دیتای بازی با لینک مستقیم - 1.2 گیگابایت"),
+]
+
+
+def synthetic_page(link_count):
+    """A farsroid-shaped page whose download box holds `link_count` links."""
+    items = []
+    for i in range(link_count):
+        variant, text = SYNTHETIC_VARIANTS[i % len(SYNTHETIC_VARIANTS)]
+        version = f"{1 + i // 100}.{(i // 10) % 10}.{i % 10}"
+        extension = ".exe" if variant == "Windows" else ".zip" if variant == "Data" else ".apk"
+        filename = f"App{i // len(SYNTHETIC_VARIANTS)}-{version}-{variant}(www.farsroid.com){extension}"
+        items.append(f'<li class="download-link"><a class="download-btn" href="https://dl.farsroid.com/app/{filename}" rel="nofollow">'
+                     f'<span class="txt">{text}</span></a></li>')
+    filler = "<p>" + "متن توضیحات برنامه برای پر کردن صفحه. " * 40 + "</p>\n"
+    return ('<!DOCTYPE html><html dir="rtl" lang="fa-IR"><head><meta charset="UTF-8">'
+            f'<title>دانلود Synthetic App {link_count} – برنامه آزمایشی | فارسروید</title></head><body>'
+            f'<h1 class="title">دانلود Synthetic App 2.0.1 – برنامه آزمایشی با {link_count} لینک</h1>\n'
+            + filler * 20
+            + '<section class="downloadbox"><ul class="download-links">\n' + "\n".join(items) + '\n</ul></section>\n'
+            + filler * 20 + '</body></html>\n')
+
+
+def load_pages():
+    """Returns {path: html}; fixture files are served under /farsroid.com/<name>."""
+    pages = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+                pages[f"/farsroid.com/{name}"] = f.read()
+    for link_count in SYNTHETIC_LINK_COUNTS:
+        pages[f"/farsroid.com/synthetic-{link_count}-links.html"] = synthetic_page(link_count)
+    return pages
+
+
+class FixtureServer:
+    """Serves the fixture pages on 127.0.0.1 from a background thread."""
+
+    def __init__(self, pages):
+        encoded = {path: html.encode('utf-8') for path, html in pages.items()}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, like the real site
+
+            def do_GET(self):
+                body = encoded.get(urlparse(self.path).path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=UTF-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self._server.server_address[1]}{path}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def summarize(samples, page_bytes):
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        "median_ms": median * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "pages_per_s": 1 / median if median else None,
+        "mb_per_s": page_bytes / 1024 / 1024 / median if median else None,
+    }
+
+
+def time_stage(func, rounds, setup=None):
+    samples = []
+    result = None
+    for _ in range(rounds):
+        if setup: setup()
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def peak_memory_kb(func, setup=None):
+    if setup: setup()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_page(url, parser, rounds):
+    stages = {}
+    memory = {}
+    page_content = app_updater.get_page_source_static(url) # warms the connection pool
+    page_bytes = len(page_content.encode('utf-8'))
+
+    samples, _ = time_stage(lambda: app_updater.get_page_source_static(url), rounds)
+    stages["fetch"] = summarize(samples, page_bytes)
+
+    for scoped in (True, False):
+        stage = "parse" if scoped else "parse_full"
+        parse = lambda: app_updater.parse_page_html(page_content, parser=parser, scoped=scoped)  # noqa: E731
+        samples, soup = time_stage(parse, rounds)
+        stages[stage] = summarize(samples, page_bytes)
+        memory[stage] = peak_memory_kb(parse)
+    soup = app_updater.parse_page_html(page_content, parser=parser, scoped=True)
+
+    samples, app_name = time_stage(lambda: extract_app_name_from_page(soup, url), rounds)
+    stages["extract_app_name"] = summarize(samples, page_bytes)
+    samples, _ = time_stage(lambda: aggressively_clean_name_for_tracking(app_name), rounds)
+    stages["clean_name"] = summarize(samples, page_bytes)
+    scrape = lambda: scrape_farsroid_page(url, soup, {})  # noqa: E731
+    samples, candidates = time_stage(scrape, rounds, setup=version_key.cache_clear)
+    stages["extract"] = summarize(samples, page_bytes)
+    memory["extract"] = peak_memory_kb(scrape, setup=version_key.cache_clear)
+    fingerprints = {}
+    scrape_farsroid_page(url, soup, {}, fingerprints=fingerprints)
+    samples, _ = time_stage(lambda: scrape_farsroid_page(url, soup, {}, fingerprints=dict(fingerprints)), rounds, setup=version_key.cache_clear)
+    stages["extract_unchanged"] = summarize(samples, page_bytes)
+
+    # Compared against the link's own version with one minor bump, so every pair is really parsed.
+    pairs = [(candidate["version"], candidate["version"] + ".1") for candidate in candidates]
+    compare = lambda: compare_versions_batch(pairs)  # noqa: E731
+    samples, _ = time_stage(compare, rounds, setup=version_key.cache_clear)
+    stages["compare"] = summarize(samples, page_bytes)
+    memory["compare"] = peak_memory_kb(compare, setup=version_key.cache_clear)
+
+    return {"bytes": page_bytes, "links": len(candidates), "stages": stages, "peak_memory_kb": memory}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_regressions(results, baseline, max_regression):
+    regressions = []
+    for page, page_results in results["pages"].items():
+        baseline_page = baseline.get("pages", {}).get(page)
+        if not baseline_page:
+            continue
+        for stage, numbers in page_results["stages"].items():
+            before = baseline_page["stages"].get(stage, {}).get("median_ms")
+            if before and numbers["median_ms"] > before * (1 + max_regression) and numbers["median_ms"] - before > REGRESSION_NOISE_FLOOR_MS:
+                regressions.append({"page": page, "stage": stage, "baseline_ms": before, "current_ms": numbers["median_ms"],
+                                    "change": numbers["median_ms"] / before - 1})
+    return regressions
+
+
+def record_fixtures(urls):
+    if not urls:
+        with open(os.path.join(REPO_DIR, app_updater.URL_FILE), 'r', encoding='utf-8') as f:
+            urls = [line.strip().lstrip('\ufeff') for line in f if line.strip() and not line.startswith('#')]
+    for url in urls:
+        page_content = app_updater.get_page_source_static(url)
+        if not page_content:
+            print(f"could not fetch {url}", file=sys.stderr)
+            return 1
+        name = [part for part in urlparse(url).path.split('/') if part][-1] + ".html"
+        with open(os.path.join(FIXTURES_DIR, name), 'w', encoding='utf-8') as f:
+            f.write(page_content)
+        print(f"saved {url} -> benchmarks/fixtures/{name}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--parser', choices=app_updater.PARSER_BACKENDS, default=app_updater.default_parser_backend())
+    parser.add_argument('--output', help="Write the JSON results here instead of stdout.")
+    parser.add_argument('--baseline', help="Results of an earlier run to compare against.")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="Tolerated slowdown of a stage median against the baseline (0.2 = 20%%).")
+    parser.add_argument('--record', nargs='*', metavar='URL', help="Save live pages as fixtures and exit.")
+    args = parser.parse_args()
+
+    if args.record is not None:
+        return record_fixtures(args.record)
+
+    logging.disable(logging.CRITICAL)
+    pages = load_pages()
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "parser": args.parser,
+        "rounds": args.rounds,
+        "pages": {},
+    }
+    with FixtureServer(pages) as server:
+        for path in pages:
+            results["pages"][os.path.basename(path)] = bench_page(server.url(path), args.parser, args.rounds)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            results["regressions"] = find_regressions(results, json.load(f), args.max_regression)
+        status = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Microbenchmark: precompiled variant matcher vs. the previous per-keyword regex loops.
+
+Usage: python benchmarks/bench_variant_matcher.py [--rounds N]
+
+Both implementations run over a corpus of farsroid link texts, download filenames
+and page titles. The script exits non-zero if their outputs ever differ.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from variant_matcher import COMMON_VARIANT_KEYWORDS_TO_DETECT_AND_CLEAN, detect_link_variants, strip_variant_keywords  # noqa: E402
+
+LINK_TEXTS = [
+    "دانلود فایل نصبی مود اکسترا برنامه با لینک مستقیم - 25 مگابایت",
+    "دانلود فایل نصبی مود لایت برنامه با لینک مستقیم - 21 مگابایت",
+    "دانلود فایل نصبی پرمیوم برنامه با لینک مستقیم - 30 مگابایت",
+    "دانلود فایل نصبی برنامه با لینک مستقیم - 18 مگابایت",
+    "دانلود نسخه Arm64-v8a برنامه با لینک مستقیم",
+    "دانلود نسخه Armeabi-v7a برنامه با لینک مستقیم",
+    "دانلود نسخه x86_64 برنامه",
+    "دانلود نسخه بدون تبلیغات برنامه",
+    "دانلود نسخه آنلاک شده برنامه",
+    "دانلود دیتای بازی با لینک مستقیم - 1.2 گیگابایت",
+    "دانلود نسخه ویندوز برنامه (کامپیوتر)",
+    "دانلود نسخه پرو مود",
+    "دانلود نسخه فارسی برنامه",
+    "Download Mod-Lite Pro Plus",
+    "دانلود نسخه بتا برنامه",
+    "",
+]
+FILENAMES = [
+    "ViVaTV-1.7.7-Mod-Extra(www.farsroid.com).apk",
+    "ViVaTV-1.7.7-Mod-Lite(www.farsroid.com).apk",
+    "ViVaTV-7.6b-Premium(www.farsroid.com).apk",
+    "Telegram-10.3.2-arm64-v8a(www.farsroid.com).apk",
+    "Telegram-10.3.2-armeabi-v7a(www.farsroid.com).apk",
+    "Telegram-10.3.2-x86_64(www.farsroid.com).apk",
+    "Telegram-Desktop-4.14.9-Windows(www.farsroid.com).exe",
+    "Game-2.0.1-Data(www.farsroid.com).zip",
+    "com.game.obb.main.1200(www.farsroid.com).zip",
+    "App_Pro_Unlocked_3.1(www.farsroid.com).apk",
+    "App-Clone-Ultra-5.0.apk",
+]
+PAGE_TITLES = [
+    "ViVa TV 1.7.7",
+    "ViVa TV Mod-Extra 1.7.7",
+    "Telegram 10.3.2 Arm64 Beta",
+    "برنامه تلگرام فارسی 10.3.2",
+    "Nova Launcher Prime Pro 8.0.4",
+    "VLC Media Player for Windows PC 3.0.20",
+    "Photoshop Express Premium Unlocked 15.1",
+    "Lite Mod-Lite Lite",
+    "Clone App Pro Plus 2.1 Full",
+]
+# Separators next to keywords: they are stripped between keyword removals, which decides what later keywords match.
+SEPARATOR_CASES = [
+    "Arm64-v8a__",
+    "اولترا_ Armv7",
+    "مود اکسترا_ ",
+    "_Pro_ App",
+    "App__Mod-Lite_Lite",
+    "Telegram_-_x86_64 - Beta",
+    "-Full Premium_ Unlocked-",
+    "Beta_  کامل_",
+]
+
+
+def build_corpus():
+    corpus = []
+    for filename in FILENAMES:
+        for link_text in LINK_TEXTS:
+            text = (filename.lower() + " " + link_text.lower()).replace('(farsroid.com)', '').replace('دانلود فایل نصبی', '').replace('برنامه با لینک مستقیم', '').strip()
+            corpus.append(re.sub(r'\b(?:با لینک مستقیم|مگابایت|\d+)\b', '', text, flags=re.IGNORECASE).strip())
+    return corpus
+
+
+# --- Previous implementation, kept for comparison (only the keyword tie-break is pinned, see below) ---
+
+def legacy_detect_link_variants(temp_combined_text):
+    link_only_variant_parts = []
+    variant_keywords_ordered = {
+        "Mod-Extra": ["mod-extra", "مود اکسترا"], "Mod-Lite": ["mod-lite", "مود لایت"],
+        "Ad-Free": ["ad-free", "بدون تبلیغات"], "Unlocked": ["unlocked", "آنلاک"], "Patched": ["patched", "پچ شده"],
+        "Premium": ["premium", "پرمیوم"], "Ultra": ["ultra", "اولترا"], "Clone": ["clone", "کلون"],
+        "Beta": ["beta", "بتا"], "Full": ["full", "کامل"], "Lite": ["lite", "لایت"], "Main": ["main"],
+        "Pro": ["pro", "پرو"], "VIP": ["vip"], "Plus": ["plus", "پلاس"],
+        "Persian": ["persian", "فارسی"], "English": ["english", "انگلیسی"],
+        "Arm64-v8a": ["arm64-v8a", "arm64"], "Armeabi-v7a": ["armeabi-v7a", "armv7"],
+        "x86_64": ["x86_64"], "x86": ["x86"], "Arm": ["arm"],
+        "Mod": ["mod", "مود"],
+        "PC": ["pc", "کامپیوتر"], "Windows": ["windows", "ویندوز"],
+        "Data": ["data", "obb", "دیتا"]
+    }
+    for key, patterns in variant_keywords_ordered.items():
+        for pattern in patterns:
+            if re.search(r'\b' + re.escape(pattern) + r'\b', temp_combined_text, flags=re.IGNORECASE):
+                if key == "Mod" and any(k in link_only_variant_parts for k in ["Mod-Extra", "Mod-Lite"]): continue
+                if key == "Lite" and "Mod-Lite" in link_only_variant_parts: continue
+                if key not in link_only_variant_parts: link_only_variant_parts.append(key)
+                break
+    return link_only_variant_parts
+
+
+def legacy_strip_variant_keywords(cleaned_name):
+    all_keywords_for_aggressive_clean = COMMON_VARIANT_KEYWORDS_TO_DETECT_AND_CLEAN + \
+                                        ["PC", "کامپیوتر", "ویندوز", "Windows", "Lite", "لایت", "Pro", "پرو"]
+    # The original sorted by length alone, so equal-length keywords came in set (hash seed) order and a name like
+    # "Beta_  کامل_" could clean differently from run to run. Ties are broken by name here, as in variant_matcher.
+    sorted_keywords = sorted(set(all_keywords_for_aggressive_clean), key=lambda kw: (-len(kw), kw))
+    for kw in sorted_keywords:
+        kw_regex = r'\b' + re.escape(kw) + r'\b'
+        prev_name = None
+        while prev_name != cleaned_name:
+            prev_name = cleaned_name
+            cleaned_name = re.sub(kw_regex, '', cleaned_name, flags=re.IGNORECASE).strip("-_ ")
+            cleaned_name = re.sub(r'\s+', ' ', cleaned_name).strip("-_ ")
+    return cleaned_name
+
+
+def check_equivalence(corpus):
+    mismatches = []
+    for text in corpus:
+        if legacy_detect_link_variants(text) != detect_link_variants(text):
+            mismatches.append(("detect", text, legacy_detect_link_variants(text), detect_link_variants(text)))
+    for title in PAGE_TITLES + FILENAMES + SEPARATOR_CASES:
+        if legacy_strip_variant_keywords(title) != strip_variant_keywords(title):
+            mismatches.append(("strip", title, legacy_strip_variant_keywords(title), strip_variant_keywords(title)))
+    return mismatches
+
+
+def bench(func, inputs, rounds):
+    seconds = min(timeit.repeat(lambda: [func(item) for item in inputs], number=rounds, repeat=3))
+    return seconds / (rounds * len(inputs)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    mismatches = check_equivalence(corpus)
+    for kind, text, legacy, current in mismatches:
+        print(f"MISMATCH ({kind}) {text!r}: legacy={legacy!r} current={current!r}", file=sys.stderr)
+
+    names = PAGE_TITLES + FILENAMES + SEPARATOR_CASES
+    results = {
+        "corpus_size": len(corpus),
+        "detect_legacy_us": bench(legacy_detect_link_variants, corpus, args.rounds),
+        "detect_current_us": bench(detect_link_variants, corpus, args.rounds),
+        "strip_legacy_us": bench(legacy_strip_variant_keywords, names, args.rounds),
+        "strip_current_us": bench(strip_variant_keywords, names, args.rounds),
+        "mismatches": len(mismatches),
+    }
+    results["detect_speedup"] = results["detect_legacy_us"] / results["detect_current_us"]
+    results["strip_speedup"] = results["strip_legacy_us"] / results["strip_current_us"]
+    print(json.dumps(results, indent=2))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
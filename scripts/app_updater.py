@@ -1,445 +1,629 @@
+from startup_timer import PROCESS_START, record as record_startup, report as startup_report, timed
 import requests
-from bs4 import BeautifulSoup
-import re
 import json
 import os
-from packaging.version import parse, InvalidVersion
-from urllib.parse import urljoin, urlparse, unquote
+import importlib.util
+from urllib.parse import urlparse
 import logging
+import multiprocessing
 import time
 import sys
-
-# Selenium imports
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
+import argparse
+import heapq
+import threading
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+
+from browser_pool import BrowserPool, CHROME_USER_AGENT
+from check_scheduler import CheckSchedule, SCHEDULE_MODES, DEFAULT_MIN_INTERVAL_HOURS, DEFAULT_MAX_INTERVAL_DAYS
+from fetch_resilience import (CircuitBreaker, RetryPolicy, TokenBucket, TransientFetchError, RETRYABLE_STATUS_CODES,
+                              DEFAULT_BASE_DELAY, DEFAULT_MAX_DELAY, DEFAULT_FAILURE_THRESHOLD, DEFAULT_RESET_TIMEOUT,
+                              parse_retry_after)
+from page_cache import PageCache, content_hash, pending_path, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_AGE_DAYS
+from run_metrics import RunMetrics, write_report
+from scrapers import get_scraper
+from sharding import SHARD_STRATEGIES, load_url_costs, select_shard, shard_path
+from tracker_store import LinkFingerprintStore, TrackerStore
+
+# bs4, Selenium, webdriver_manager and the scrapers (with packaging) are imported on first use,
+# so a run in which no page changed never loads them.
+record_startup("imports", time.perf_counter() - PROCESS_START)
 
 URL_FILE = "urls_to_check.txt"
 TRACKING_FILE = "versions_tracker.json"
 OUTPUT_JSON_FILE = "updates_found.json"
+RUN_REPORT_FILE = os.path.join(os.path.dirname(OUTPUT_JSON_FILE), "run_report.json")
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+SHARD_INDEX = os.getenv('SHARD_INDEX') # set: this job is one shard of a sharded run, even if SHARD_COUNT is 1
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '1'))
+PAGE_CACHE_FILE = os.path.join(os.path.dirname(TRACKING_FILE), "page_cache.json")
+SCHEDULE_FILE = os.path.join(os.path.dirname(TRACKING_FILE), "check_schedule.json")
+LINK_FINGERPRINTS_FILE = os.path.join(os.path.dirname(TRACKING_FILE), "link_fingerprints.json")
+CHECK_SCHEDULE = os.getenv('CHECK_SCHEDULE', 'all')
 GITHUB_OUTPUT_FILE = os.getenv('GITHUB_OUTPUT', 'local_github_output.txt')
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '1'))
+BROWSER_MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', '50'))
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '4'))
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '2'))
+# forkserver where the platform has it (Linux), spawn elsewhere.
+PARSE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+PER_HOST_CONCURRENCY = int(os.getenv('PER_HOST_CONCURRENCY', '2'))
+HOST_POLITENESS_DELAY = float(os.getenv('HOST_POLITENESS_DELAY', '1.0'))
+HOST_BURST = int(os.getenv('HOST_BURST', '1'))
+FETCH_MAX_ATTEMPTS = int(os.getenv('FETCH_MAX_ATTEMPTS', '3'))
+HTTP_TIMEOUT = 20
+HTTP_POOL_SIZE = 10
+FETCH_STRATEGIES = ("auto", "static", "selenium")
+PARSER_BACKENDS = ("lxml", "html.parser")
+PAGE_NOT_MODIFIED = object() # returned by the fetch layer when the server answers a conditional request with 304
+RETRY_FETCH = object() # returned by fetch_url_for_engine, with the delay in seconds, when the page goes back into the retry queue
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+# Metric names for the stages the fetch layer writes into its `timings` dict.
+FETCH_TIMING_STAGES = {
+    'static': "fetch.static",
+    'startup': "browser.startup",
+    'acquire': "browser.acquire",
+    'navigate': "browser.navigate",
+    'wait': "browser.wait",
+    'extract': "browser.page_source",
+}
+
+_http_session = None
+_http_session_lock = threading.Lock()
+_host_strategy = {} # hostname -> "static" | "selenium", whichever produced a usable page first
+_host_strategy_lock = threading.Lock()
 
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
-VERSION_REGEX_PATTERNS = [
-    r'(?<![\w.-])(?:[vV])?(\d+(?:\.\d+){1,3}(?:(?:[-._]?[a-zA-Z0-9]+)+)?)(?![.\w])',
-    r'(?<![\w.-])(?:[vV])?(\d+(?:\.\d+){1,2})(?![.\w])',
-]
-VERSION_PATTERNS_FOR_CLEANING = [
-    r'\s*[vV]?\d+(?:\.\d+){1,3}(?:(?:[-._]?[a-zA-Z0-9]+)+)?\b',
-    r'\s*[vV]?\d+(?:\.\d+){1,2}\b',
-    r'\s+\d+(?:\.\d+)*\b' 
-]
-
-COMMON_VARIANT_KEYWORDS_TO_DETECT_AND_CLEAN = [
-    "Mod-Extra", "مود اکسترا", "موداکسترا",
-    "Mod-Lite", "مود لایت", "مودلایت",
-    "Ad-Free", "بدون تبلیغات",
-    "Unlocked", "آنلاک شده", "آنلاک",
-    "Patched", "پچ شده",
-    "Premium", "پرمیوم",
-    "Persian", "فارسی",
-    "English", "انگلیسی",
-    "Universal", "یونیورسال",
-    "Original", "اورجینال", "اصلی", "معمولی",
-    "Arm64-v8a", "Armeabi-v7a", "x86_64",
-    "Arm64", "Armv7", "Arm", "x86", 
-    "Windows", "ویندوز", "PC", "کامپیوتر", 
-    "macOS", "Mac", "OSX", 
-    "Linux", "لینوکس", 
-    "Ultra", "اولترا",
-    "Clone", "کلون",
-    "Beta", "بتا",
-    "Full", "کامل",
-    "Lite", "لایت",
-    "Main", 
-    "Data", "دیتا", "Obb",
-    "Mod", "مود", 
-    "Pro", "پرو", 
-    "VIP", "وی آی پی",
-    "Plus", "پلاس",
-    "Image", "تصویر", 
-    "Audio", "صوتی", 
-    "Video", "ویدیو", 
-    "Document", "سند", "Text", "متن",
-    "Archive", "آرشیو", 
-    "Font", "فونت"
-]
-
-def load_tracker():
-    if os.path.exists(TRACKING_FILE):
-        try:
-            with open(TRACKING_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logging.info(f"فایل ردیابی {TRACKING_FILE} با موفقیت بارگذاری شد.")
-                return data
-        except json.JSONDecodeError:
-            logging.warning(f"{TRACKING_FILE} خراب است. با ردیاب خالی شروع می شود.")
-            return {}
-    logging.info(f"فایل ردیابی {TRACKING_FILE} یافت نشد. با ردیاب خالی شروع می شود.")
-    return {}
-
-def compare_versions(current_v_str, last_v_str):
-    logging.info(f"مقایسه نسخه ها: فعلی='{current_v_str}', قبلی='{last_v_str}'")
-    try:
-        if not current_v_str:
-            logging.warning("نسخه فعلی نامعتبر است (خالی).")
-            return False
-        if not last_v_str or last_v_str == "0.0.0":
-            logging.info(f"نسخه قبلی یافت نشد یا 0.0.0 بود. نسخه فعلی '{current_v_str}' جدید است.")
-            return True
-        try:
-            parsed_current = parse(current_v_str)
-            parsed_last = parse(last_v_str)
-            if parsed_current > parsed_last: return True
-            elif parsed_current < parsed_last: return False
-            else: return current_v_str != last_v_str and current_v_str > last_v_str 
-        except InvalidVersion:
-            logging.warning(f"InvalidVersion ao تجزیه '{current_v_str}' یا '{last_v_str}'. مقایسه رشته ای.")
-            return current_v_str != last_v_str and current_v_str > last_v_str
-        except TypeError: 
-            logging.warning(f"TypeError هنگام مقایسه '{current_v_str}' با '{last_v_str}'. مقایسه رشته ای.")
-            return current_v_str != last_v_str and current_v_str > last_v_str
-    except Exception as e:
-        logging.error(f"خطا در compare_versions ('{current_v_str}' vs '{last_v_str}'): {e}")
-        return current_v_str != last_v_str and current_v_str > last_v_str
-
-def sanitize_text_for_tracking_id(text): # Simplified sanitize for tracking ID parts
-    if not text: return ""
-    text_cleaned = text.strip().lower()
-    text_cleaned = text_cleaned.replace('–', '-').replace('—', '-')
-    text_cleaned = re.sub(r'[^a-z0-9-_]', '', text_cleaned) # Keep only alphanumeric, dash, underscore
-    text_cleaned = re.sub(r'[-_]+', '_', text_cleaned) # Consolidate dash/underscore to single underscore
-    text_cleaned = text_cleaned.strip('_')
-    return text_cleaned
-
-
-def aggressively_clean_name_for_tracking(name_to_clean):
-    """Aggressively cleans a name for tracking ID purposes."""
-    cleaned_name = name_to_clean
-    
-    for pattern in VERSION_PATTERNS_FOR_CLEANING:
-        cleaned_name = re.sub(pattern, '', cleaned_name, flags=re.IGNORECASE).strip("-_ ")
-        cleaned_name = re.sub(r'\s+', ' ', cleaned_name).strip("-_ ")
-
-    all_keywords_for_aggressive_clean = COMMON_VARIANT_KEYWORDS_TO_DETECT_AND_CLEAN + \
-                                        ["PC", "کامپیوتر", "ویندوز", "Windows", "Lite", "لایت", "Pro", "پرو"] 
-    
-    sorted_keywords = sorted(list(set(all_keywords_for_aggressive_clean)), key=len, reverse=True)
-
-    for kw in sorted_keywords:
-        kw_regex = r'\b' + re.escape(kw) + r'\b'
-        prev_name = None
-        while prev_name != cleaned_name: 
-            prev_name = cleaned_name
-            cleaned_name = re.sub(kw_regex, '', cleaned_name, flags=re.IGNORECASE).strip("-_ ")
-            cleaned_name = re.sub(r'\s+', ' ', cleaned_name).strip("-_ ")
-
-    cleaned_name = re.sub(r'\s*\((?:www\.)?farsroid\.com.*?\)\s*$', '', cleaned_name, flags=re.IGNORECASE).strip()
-    cleaned_name = re.sub(r'\s*[-–—]\s*Farsroid\s*$', '', cleaned_name, flags=re.IGNORECASE).strip()
-    cleaned_name = cleaned_name.strip(' -–—') 
-    cleaned_name = re.sub(r'\s+', ' ', cleaned_name).strip()
-    if not cleaned_name: 
-        name_parts = name_to_clean.split()
-        if name_parts: cleaned_name = name_parts[0] 
-    return cleaned_name
-
-
-def extract_app_name_from_page(soup, page_url):
-    """Extracts app name from H1/Title, performs light cleaning (versions at end, site tags)."""
-    app_name_candidate = None
-    h1_tag = soup.find('h1', class_=re.compile(r'title', re.IGNORECASE))
-    if h1_tag and h1_tag.text.strip():
-        app_name_candidate = h1_tag.text.strip()
-    
-    if not app_name_candidate:
-        title_tag = soup.find('title')
-        if title_tag and title_tag.text.strip():
-            app_name_candidate = title_tag.text.strip()
-            app_name_candidate = re.sub(r'\s*[-|–—]\s*(?:فارسروید|دانلود.*)$', '', app_name_candidate, flags=re.IGNORECASE).strip()
-            app_name_candidate = re.sub(r'\s*–\s*اپلیکیشن.*$', '', app_name_candidate, flags=re.IGNORECASE).strip()
-
-    if app_name_candidate:
-        original_name = app_name_candidate 
-        if app_name_candidate.lower().startswith("دانلود "):
-            app_name_candidate = app_name_candidate[len("دانلود "):].strip()
-        
-        page_name_for_display = app_name_candidate # Keep it richer for display
-        
-        # Lightly clean for display (remove Farsroid tags, maybe trailing versions)
-        page_name_for_display = re.sub(r'\s*\((?:www\.)?farsroid\.com.*?\)\s*$', '', page_name_for_display, flags=re.IGNORECASE).strip()
-        for pattern in VERSION_PATTERNS_FOR_CLEANING: # Remove versions if they are at the very end
-            page_name_for_display = re.sub(pattern + r'$', '', page_name_for_display, flags=re.IGNORECASE).strip("-_ ")
-
-        page_name_for_display = page_name_for_display.strip(' -–—')
-        page_name_for_display = re.sub(r'\s+', ' ', page_name_for_display).strip()
-
-
-        if page_name_for_display:
-            logging.info(f"نام برنامه از H1/Title (اصلی: '{original_name}', برای نمایش: '{page_name_for_display}')")
-            return page_name_for_display
-    
-    # Fallback to URL if H1/Title fails (less aggressive cleaning here)
-    logging.info(f"نام برنامه از H1/Title استخراج نشد، تلاش برای استخراج از URL: {page_url}")
-    parsed_url = urlparse(page_url)
-    path_parts = [part for part in unquote(parsed_url.path).split('/') if part]
-    if path_parts:
-        guessed_name = path_parts[-1]
-        # Remove extension
-        known_extensions_regex = r'\.(apk|zip|exe|rar|xapk|apks|msi|dmg|pkg|deb|rpm|appimage|tar\.gz|tgz|tar\.bz2|tbz2|tar\.xz|txz|7z|gz|bz2|xz|jpg|jpeg|png|gif|bmp|tiff|tif|webp|svg|ico|mp3|wav|ogg|aac|flac|m4a|wma|mp4|mkv|avi|mov|wmv|flv|webm|mpeg|mpg|txt|pdf|doc|docx|xls|xlsx|ppt|pptx|odt|ods|odp|rtf|csv|html|htm|xml|json|md|ttf|otf|woff|woff2|eot)$'
-        guessed_name = re.sub(known_extensions_regex, '', guessed_name, flags=re.IGNORECASE)
-        # Remove versions
-        for pattern in VERSION_PATTERNS_FOR_CLEANING:
-            guessed_name = re.sub(pattern, '', guessed_name, flags=re.IGNORECASE).strip("-_ ")
-        # Remove only very generic URL terms
-        generic_url_terms = r'\b(دانلود|Download|برنامه|App|Apk|Farsroid|Android)\b'
-        guessed_name = re.sub(generic_url_terms, '', guessed_name, flags=re.IGNORECASE).strip("-_ ")
-        # Capitalize and join
-        guessed_name = ' '.join(word.capitalize() for word in re.split(r'[-_]+', guessed_name) if word)
-        guessed_name = re.sub(r'\s+', ' ', guessed_name).strip()
-        if guessed_name:
-            logging.info(f"نام حدس زده شده از URL (پاکسازی شده): {guessed_name}")
-            return guessed_name
-            
-    logging.warning(f"نام برنامه از هیچ منبعی استخراج نشد. URL: {page_url}")
-    return "UnknownApp"
-
-
-def get_page_source_with_selenium(url, wait_time=20, wait_for_class="downloadbox"):
+def get_page_source_with_selenium(url, wait_time=20, wait_for_class="downloadbox", pool=None, timings=None, readiness=None):
     # Note: The URL cleaning is now done in main() before this function is called.
     # So, the 'url' parameter here is expected to be already cleaned.
+    # Without a shared pool (e.g. one-off calls) a single-use pool is created and closed here.
+    if pool is None:
+        with BrowserPool(size=1, max_pages_per_driver=1) as one_off_pool:
+            return get_page_source_with_selenium(url, wait_time, wait_for_class, one_off_pool, timings, readiness)
+    # Selenium is only imported once a page actually needs a browser.
+    with timed("import selenium"):
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.by import By
+    if timings is None: timings = {}
     logging.info(f"در حال دریافت {url} با Selenium...")
-    chrome_options = ChromeOptions()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-gpu") 
-    chrome_options.add_argument("--window-size=1920,1080") 
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36")
-    driver = None
+    stage_start = time.perf_counter()
     try:
-        try:
-            driver_path = ChromeDriverManager().install()
-            service = ChromeService(executable_path=driver_path)
-        except Exception as e_driver_manager:
-            logging.warning(f"خطا در ChromeDriverManager: {e_driver_manager}. استفاده از درایور پیشفرض.")
-            service = ChromeService() # Fallback to default service if manager fails
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        pooled = pool.acquire()
+    except Exception as e:
+        logging.error(f"راه اندازی مرورگر برای {url} ناموفق بود: {e}", exc_info=True)
+        raise TransientFetchError(f"browser startup failed: {e}") from e
+    if pooled.pages_served == 0:
+        # A freshly started driver: report its startup apart from the time spent waiting for a free one.
+        timings['startup'] = pooled.startup_seconds
+    timings['acquire'] = time.perf_counter() - stage_start - timings.get('startup', 0.0)
+    driver = pooled.driver
+    broken = False
+    try:
+        stage_start = time.perf_counter()
         driver.get(url) # The URL passed here should be clean
-        WebDriverWait(driver, wait_time).until(EC.presence_of_element_located((By.CLASS_NAME, wait_for_class)))
-        time.sleep(5) 
+        if wait_for_class:
+            WebDriverWait(driver, wait_time).until(EC.presence_of_element_located((By.CLASS_NAME, wait_for_class)))
+        timings['navigate'] = time.perf_counter() - stage_start
+        if readiness is not None:
+            is_ready, timings['wait'] = readiness.wait(driver)
+            if is_ready:
+                logging.info(f"صفحه پس از {timings['wait']:.2f} ثانیه آماده شد.")
+            else:
+                logging.warning(f"صفحه {url} پس از {timings['wait']:.2f} ثانیه هنوز آماده نبود. ادامه با سورس فعلی.")
+        stage_start = time.perf_counter()
         page_source = driver.page_source
+        timings['extract'] = time.perf_counter() - stage_start
         logging.info(f"موفقیت در دریافت سورس صفحه با Selenium برای {url}")
         return page_source
+    except TimeoutException as e:
+        # The page never became ready; its current source is still worth a look.
+        logging.error(f"خطای Selenium برای {url}: {e}", exc_info=True)
+        try: return driver.page_source
+        except Exception:
+            broken = True
+            return None
     except Exception as e:
+        # Anything else may have left the browser unusable and the source half-loaded: retry on a fresh driver.
+        broken = True
         logging.error(f"خطای Selenium برای {url}: {e}", exc_info=True)
-        if driver: 
-            try: return driver.page_source # Try to get source even on error if driver exists
-            except: pass
+        raise TransientFetchError(f"selenium error: {e}") from e
+    finally:
+        timings.setdefault('navigate', time.perf_counter() - stage_start)
+        pool.release(pooled, broken=broken)
+        logging.info(f"زمان بندی {url}: " + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items()))
+
+
+def get_http_session():
+    """Returns the process-wide keep-alive session used by the static fetch path."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({
+                'User-Agent': CHROME_USER_AGENT,
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Encoding': 'gzip, deflate',
+                'Accept-Language': 'fa,en;q=0.8',
+            })
+            _http_session = session
+        return _http_session
+
+
+def get_page_source_static(url, timings=None, page_cache=None):
+    """Returns the page source, None on a permanent failure (e.g. 404) or PAGE_NOT_MODIFIED.
+
+    Raises TransientFetchError for connection errors, timeouts and 429/5xx answers.
+    """
+    if timings is None: timings = {}
+    logging.info(f"در حال دریافت {url} با HTTP...")
+    stage_start = time.perf_counter()
+    try:
+        conditional_headers = page_cache.conditional_headers(url) if page_cache else {}
+        response = get_http_session().get(url, timeout=HTTP_TIMEOUT, headers=conditional_headers)
+        if response.status_code == 304 and conditional_headers:
+            logging.info(f"صفحه {url} از آخرین بررسی تغییری نکرده است (304).")
+            return PAGE_NOT_MODIFIED
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            logging.warning(f"دریافت HTTP برای {url} با کد {response.status_code} ناموفق بود.")
+            raise TransientFetchError(f"HTTP {response.status_code}", retry_after=parse_retry_after(response.headers.get('Retry-After')))
+        response.raise_for_status()
+        if page_cache:
+            page_cache.note_validators(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            response.encoding = 'utf-8' # requests would otherwise fall back to ISO-8859-1 for text/html
+        page_source = response.text
+    except (requests.ConnectionError, requests.Timeout) as e:
+        logging.warning(f"دریافت HTTP برای {url} ناموفق بود: {e}")
+        raise TransientFetchError(str(e)) from e
+    except requests.RequestException as e:
+        logging.warning(f"دریافت HTTP برای {url} ناموفق بود: {e}")
         return None
     finally:
-        if driver:
-            driver.quit()
-
-
-def extract_version_from_text_or_url(text_content, url_content):
-    if text_content:
-        for pattern in VERSION_REGEX_PATTERNS:
-            match = re.search(pattern, text_content)
-            if match: return match.group(1).strip("-_ ")
-    if url_content:
-        for pattern in VERSION_REGEX_PATTERNS:
-            match = re.search(pattern, url_content) 
-            if match: return match.group(1).strip("-_ ")
-    # Fallback pattern if more specific ones fail
-    fallback_pattern = r'(\d+\.\d+(?:\.\d+){0,2}(?:[.-]?[a-zA-Z0-9]+)*)' 
-    if text_content:
-        match = re.search(fallback_pattern, text_content)
-        if match: return match.group(1).strip("-_ ")
-    if url_content:
-        match = re.search(fallback_pattern, url_content)
-        if match: return match.group(1).strip("-_ ")
-    return None
-
-def get_file_extension_from_url(download_url, combined_text_for_variant):
-    parsed_url_path = urlparse(download_url).path
-    raw_filename_from_url = os.path.basename(parsed_url_path)
-    
-    double_extensions = [".tar.gz", ".tar.bz2", ".tar.xz"]
-    for de in double_extensions:
-        if raw_filename_from_url.lower().endswith(de): return de
+        timings['static'] = time.perf_counter() - stage_start
+    return page_source
+
+
+def fetch_page_source(url, pool, scraper, strategy=None, timings=None, page_cache=None):
+    """Fetches a page over plain HTTP first and escalates to Selenium only when the expected content is missing.
+
+    `scraper` is the page's ScraperSpec; `strategy` overrides its fetch strategy.
+    Returns the page source, None on failure, or PAGE_NOT_MODIFIED when `page_cache`
+    made the request conditional and the server answered 304. Transient failures
+    raise TransientFetchError; a struggling host is not retried with Selenium.
+    """
+    if timings is None: timings = {}
+    strategy = strategy or scraper.fetch_strategy
+    host = (urlparse(url).hostname or "").lower()
+    with _host_strategy_lock:
+        known_strategy = _host_strategy.get(host)
+    if strategy == "selenium" or (strategy == "auto" and known_strategy == "selenium"):
+        return get_page_source_with_selenium(url, wait_for_class=scraper.wait_for_class, pool=pool, timings=timings, readiness=scraper.readiness)
+
+    page_content = get_page_source_static(url, timings, page_cache)
+    if page_content is PAGE_NOT_MODIFIED:
+        return page_content
+    if scraper.has_expected_content(page_content):
+        if known_strategy is None:
+            with _host_strategy_lock: _host_strategy.setdefault(host, "static")
+        logging.info(f"جعبه دانلود در HTML ایستا پیدا شد ({timings['static']:.2f}s). نیازی به Selenium نیست.")
+        return page_content
+    if strategy == "static":
+        return page_content
+
+    logging.info(f"جعبه دانلود در HTML ایستا برای {url} پیدا نشد. استفاده از Selenium...")
+    if page_cache:
+        # The static response's ETag/Last-Modified say nothing about the links the browser fills in,
+        # so a 304 for it must never stand in for the rendered page.
+        page_cache.discard_validators(url)
+    page_content = get_page_source_with_selenium(url, wait_for_class=scraper.wait_for_class, pool=pool, timings=timings, readiness=scraper.readiness)
+    if known_strategy is None and scraper.has_expected_content(page_content):
+        with _host_strategy_lock: _host_strategy.setdefault(host, "selenium")
+    return page_content
+
+
+def _is_scraped_element(name, attrs):
+    """True for the only elements the farsroid scraper reads: <title>, <h1> and section.downloadbox."""
+    if name in ('title', 'h1'):
+        return True
+    if name != 'section' or not attrs:
+        return False
+    classes = attrs.get('class') or ''
+    if isinstance(classes, str):
+        classes = classes.split()
+    return 'downloadbox' in classes
+
+
+@lru_cache(maxsize=None)
+def _scraped_elements_filter_class():
+    try:
+        from bs4.filter import ElementFilter
+    except ImportError: # beautifulsoup4 < 4.13
+        return None
 
-    _, ext_from_url = os.path.splitext(raw_filename_from_url)
-    
-    known_extensions = [
-        '.apk', '.zip', '.exe', '.rar', '.xapk', '.apks', '.7z', '.gz', '.bz2', '.xz',
-        '.msi', '.dmg', '.pkg', '.deb', '.rpm', '.appimage',
-        '.tgz', '.tbz2', '.txz', 
-        '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.webp', '.svg', '.ico',
-        '.mp3', '.wav', '.ogg', '.aac', '.flac', '.m4a', '.wma',
-        '.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mpeg', '.mpg',
-        '.txt', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', 
-        '.odt', '.ods', '.odp', '.rtf', '.csv', '.html', '.htm', '.xml', '.json', '.md',
-        '.ttf', '.otf', '.woff', '.woff2', '.eot'
-    ]
-    
-    if ext_from_url and ext_from_url.lower() in known_extensions:
-        return ext_from_url.lower()
-    else:
-        # Guess based on variant text if primary extension detection fails
-        combined_text_for_variant_lower = combined_text_for_variant.lower()
-        if "windows" in combined_text_for_variant_lower or "pc" in combined_text_for_variant_lower : return ".exe" 
-        if "macos" in combined_text_for_variant_lower or "mac" in combined_text_for_variant_lower: return ".dmg"
-        if "linux" in combined_text_for_variant_lower : return ".appimage" 
-        if "data" in combined_text_for_variant_lower or "obb" in combined_text_for_variant_lower : return ".zip" 
-        if "font" in combined_text_for_variant_lower: return ".zip" 
-        if ext_from_url: return ext_from_url.lower() # Return original if still unknown but present
-        return ".bin" # Default fallback
-
-
-def scrape_farsroid_page(page_url, soup, tracker_data):
-    updates_found_on_page = []
-    # page_app_name_full is the name from H1/Title, lightly cleaned
-    page_app_name_for_display = extract_app_name_from_page(soup, page_url) 
-    logging.info(f"پردازش صفحه: {page_url} (نام برنامه از صفحه برای نمایش: '{page_app_name_for_display}')")
-
-    # For tracking ID, use an aggressively cleaned name to ensure stability
-    base_app_name_for_tracking_id = aggressively_clean_name_for_tracking(page_app_name_for_display) # Use the display name as input
-    if not base_app_name_for_tracking_id: base_app_name_for_tracking_id = "UnknownApp" 
-    logging.info(f"  نام پایه برای شناسه ردیابی: '{base_app_name_for_tracking_id}'")
-
-    download_box = soup.find('section', class_='downloadbox')
-    if not download_box: return updates_found_on_page
-    download_links_ul = download_box.find('ul', class_='download-links')
-    if not download_links_ul: return updates_found_on_page
-    found_lis = download_links_ul.find_all('li', class_='download-link')
-    if not found_lis: return updates_found_on_page
-
-    logging.info(f"تعداد {len(found_lis)} آیتم li.download-link پیدا شد.")
-
-    for i, li in enumerate(found_lis):
-        logging.info(f"--- پردازش li شماره {i+1} ---")
-        link_tag = li.find('a', class_='download-btn')
-        if not link_tag or not link_tag.get('href'): continue
-
-        download_url = urljoin(page_url, link_tag['href'])
-        link_text_span = link_tag.find('span', class_='txt')
-        link_text = link_text_span.text.strip() if link_text_span else ""
-        logging.info(f"  URL: {download_url}, متن لینک: {link_text}")
-
-        filename_from_url_decoded = unquote(urlparse(download_url).path.split('/')[-1])
-        current_version = extract_version_from_text_or_url(link_text, filename_from_url_decoded)
-
-        if not current_version:
-            logging.warning(f"  نسخه استخراج نشد.")
-            continue
-        logging.info(f"  نسخه: {current_version}")
-
-        # --- تشخیص نوع (Variant) فقط از لینک دانلود ---
-        link_only_variant_parts = []
-        # Prepare a combined text from link and filename for robust variant detection
-        combined_text_for_link_variant_detection = (filename_from_url_decoded.lower() + " " + link_text.lower()).replace('(farsroid.com)', '').replace('دانلود فایل نصبی', '').replace('برنامه با لینک مستقیم', '').strip()
-        combined_text_for_link_variant_detection = re.sub(r'\b(?:با لینک مستقیم|مگابایت|\d+)\b', '', combined_text_for_link_variant_detection, flags=re.IGNORECASE).strip()
-        
-        variant_keywords_ordered = { 
-            "Mod-Extra": ["mod-extra", "مود اکسترا"], "Mod-Lite": ["mod-lite", "مود لایت"],
-            "Ad-Free": ["ad-free", "بدون تبلیغات"], "Unlocked": ["unlocked", "آنلاک"], "Patched": ["patched", "پچ شده"],
-            "Premium": ["premium", "پرمیوم"], "Ultra": ["ultra", "اولترا"], "Clone": ["clone", "کلون"],
-            "Beta": ["beta", "بتا"], "Full": ["full", "کامل"], "Lite": ["lite", "لایت"], "Main": ["main"],
-            "Pro": ["pro", "پرو"], "VIP": ["vip"], "Plus": ["plus", "پلاس"],
-            "Persian": ["persian", "فارسی"], "English": ["english", "انگلیسی"],
-            "Arm64-v8a": ["arm64-v8a", "arm64"], "Armeabi-v7a": ["armeabi-v7a", "armv7"],
-            "x86_64": ["x86_64"], "x86": ["x86"], "Arm": ["arm"], 
-            "Mod": ["mod", "مود"], 
-            "PC": ["pc", "کامپیوتر"], "Windows": ["windows", "ویندوز"], 
-            "Data": ["data", "obb", "دیتا"]
-        }
-        
-        temp_combined_text = combined_text_for_link_variant_detection
-        for key, patterns in variant_keywords_ordered.items():
-            for pattern in patterns:
-                if re.search(r'\b' + re.escape(pattern) + r'\b', temp_combined_text, flags=re.IGNORECASE):
-                    if key == "Mod" and any(k in link_only_variant_parts for k in ["Mod-Extra", "Mod-Lite"]): continue
-                    if key == "Lite" and "Mod-Lite" in link_only_variant_parts: continue
-                    if key not in link_only_variant_parts: link_only_variant_parts.append(key)
-                    break 
-        
-        file_extension = get_file_extension_from_url(download_url, combined_text_for_link_variant_detection)
-        logging.info(f"  پسوند فایل: {file_extension}")
-        
-        if file_extension == ".exe":
-            if "PC" in link_only_variant_parts:
-                link_only_variant_parts.remove("PC")
-            if "Windows" not in link_only_variant_parts:
-                link_only_variant_parts.append("Windows")
-        
-        arch_found_in_link_variants = any(arch_kw in link_only_variant_parts for arch_kw in ["Arm64-v8a", "Armeabi-v7a", "x86_64", "x86", "Arm"])
-        
-        temp_display_variants = sorted(list(set(link_only_variant_parts))) 
-        variant_final_for_display_tracking = "-".join(temp_display_variants) if temp_display_variants else ""
-        
-        if not variant_final_for_display_tracking:
-            if file_extension == ".apk" and not arch_found_in_link_variants : variant_final_for_display_tracking = "Universal"
-            elif file_extension == ".exe": variant_final_for_display_tracking = "Windows"
-            # Add more defaults based on extension if needed
-            else: variant_final_for_display_tracking = "Default" # Fallback for JSON/tracking
-        
-        logging.info(f"  نوع نهایی برای نمایش/ردیابی: '{variant_final_for_display_tracking}'")
-
-        tracking_id_app_part = sanitize_text_for_tracking_id(base_app_name_for_tracking_id)
-        tracking_id_variant_part = sanitize_text_for_tracking_id(variant_final_for_display_tracking)
-        tracking_id = f"{tracking_id_app_part}_{tracking_id_variant_part}".lower()
-        tracking_id = re.sub(r'_+', '_', tracking_id).strip('_')
-        # Refine tracking_id: remove generic suffixes if not an APK or if they are redundant
-        if tracking_id.endswith(("_default", "_archive", "_image", "_audio", "_video", "_document", "_font")) and file_extension != ".apk":
-            tracking_id = tracking_id.rsplit('_', 1)[0]
-        elif tracking_id.endswith('_universal') and file_extension != ".apk":
-            tracking_id = tracking_id[:-len('_universal')]
-        
-        if not tracking_id_app_part and tracking_id_variant_part: # If app name was empty, use variant as base
-            tracking_id = tracking_id_variant_part
-        elif not tracking_id_variant_part and tracking_id_app_part: # If variant was empty, use app name as base
-            tracking_id = tracking_id_app_part
-        elif not tracking_id_app_part and not tracking_id_variant_part:
-            tracking_id = "unknown_app_variant" # Absolute fallback
-
-        logging.info(f"  شناسه ردیابی: {tracking_id}")
-        
-        # --- ساخت نام فایل پیشنهادی (رویکرد جدید و ساده‌تر) ---
-        suggested_filename = filename_from_url_decoded
-        # فقط پسوند سایت را حذف کن
-        site_suffix_pattern = r'\s*\((?:www\.)?farsroid\.com.*?\)\s*'
-        suggested_filename = re.sub(site_suffix_pattern, '', suggested_filename, flags=re.IGNORECASE).strip()
-        # اطمینان از اینکه پسوند فایل حفظ شده
-        if not os.path.splitext(suggested_filename)[1]: # اگر پسوند ندارد
-            base_name_no_ext = os.path.splitext(filename_from_url_decoded)[0]
-            base_name_no_ext_cleaned = re.sub(site_suffix_pattern, '', base_name_no_ext, flags=re.IGNORECASE).strip()
-            suggested_filename = base_name_no_ext_cleaned + file_extension
-
-        logging.info(f"  نام فایل پیشنهادی (ساده شده): {suggested_filename}")
-        
-        last_known_version = tracker_data.get(tracking_id, "0.0.0")
-        if compare_versions(current_version, last_known_version):
-            logging.info(f"    => آپدیت جدید برای {tracking_id}: {current_version} (قبلی: {last_known_version})")
-            updates_found_on_page.append({
-                "app_name": page_app_name_for_display, # Use the richer name for display
-                "version": current_version,
-                "variant": variant_final_for_display_tracking, 
-                "download_url": download_url,
-                "page_url": page_url,
-                "tracking_id": tracking_id,
-                "suggested_filename": suggested_filename,
-                "current_version_for_tracking": current_version # Store the version used for comparison
-            })
+    class _ScrapedElementsFilter(ElementFilter):
+        # Only consulted for top-level markup; everything inside an allowed element is kept.
+        @property
+        def includes_everything(self):
+            return False
+
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return _is_scraped_element(name, attrs)
+
+        def allow_string_creation(self, string):
+            return False
+
+    return _ScrapedElementsFilter
+
+
+def _scraped_elements_strainer():
+    filter_class = _scraped_elements_filter_class()
+    if filter_class is not None:
+        return filter_class()
+    # Older releases call a function passed as `name` with the raw tag name and attributes.
+    from bs4 import SoupStrainer
+    return SoupStrainer(_is_scraped_element)
+
+
+def default_parser_backend():
+    # find_spec only locates the package; importing lxml here would slow down every start.
+    return "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+
+
+def parse_page_html(page_content, parser="html.parser", scoped=True):
+    """Parses a page; with `scoped`, only the title, the H1s and the download box are materialized."""
+    with timed("import bs4"):
+        from bs4 import BeautifulSoup
+    parse_only = _scraped_elements_strainer() if scoped else None
+    return BeautifulSoup(page_content, parser, parse_only=parse_only)
+
+
+def _host(url):
+    return (urlparse(url).hostname or "").lower()
+
+
+class HostLimiter:
+    """Per-host guard: caps in-flight fetches, rate-limits their starts and trips a circuit breaker.
+
+    Starts are paced by a token bucket refilled once per politeness `delay`
+    (bursts of up to `burst`), and held back while the host's Retry-After runs.
+    """
+
+    def __init__(self, max_per_host=2, delay=1.0, burst=1, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.max_per_host = max(1, max_per_host)
+        self.delay = max(0.0, delay)
+        self.burst = max(1, burst)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._buckets = {}
+        self._breakers = {}
+        self._paused_until = {}
+
+    def _breaker(self, host):
+        return self._breakers.setdefault(host, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+
+    @contextmanager
+    def slot(self, url):
+        host = _host(url)
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        with semaphore:
+            with self._lock:
+                bucket = self._buckets.setdefault(host, TokenBucket(1 / self.delay if self.delay else 0, self.burst))
+                now = time.monotonic()
+                wait_seconds = max(bucket.reserve(now), self._paused_until.get(host, now) - now)
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+            yield
+
+    def blocked_for(self, url):
+        """Seconds until the host's circuit lets requests through again (0 when it does now)."""
+        with self._lock:
+            return self._breaker(_host(url)).blocked_for()
+
+    def record_success(self, url):
+        with self._lock:
+            self._breaker(_host(url)).record_success()
+
+    def record_failure(self, url, retry_after=None):
+        """Counts a transient failure; returns True when it opened the host's circuit."""
+        host = _host(url)
+        with self._lock:
+            if retry_after:
+                # Every page of the host waits, not only the one that was told to.
+                self._paused_until[host] = max(self._paused_until.get(host, 0.0), time.monotonic() + retry_after)
+            return self._breaker(host).record_failure()
+
+
+def _retry_or_fail(page_url, metrics, retry_policy, attempt, deadline, reason, retry_after=None, min_delay=0.0):
+    """(RETRY_FETCH, delay) if the page gets another attempt in this run, else marks it failed and returns (None, None)."""
+    delay = retry_policy.retry_delay(attempt, retry_after) if retry_policy else None
+    if delay is not None: delay = max(delay, min_delay)
+    if delay is not None and (deadline is None or time.monotonic() + delay < deadline):
+        logging.warning(f"دریافت {page_url} ناموفق بود ({reason}). تلاش {attempt + 1} از {retry_policy.max_attempts} در {delay:.1f} ثانیه دیگر.")
+        metrics.increment("fetch.retries", url=page_url)
+        return RETRY_FETCH, delay
+    logging.error(f"دریافت {page_url} پس از {attempt} تلاش ناموفق بود ({reason}). بررسی در اجرای بعد.")
+    metrics.set_outcome(page_url, "failed")
+    return None, None
+
+
+def fetch_url_for_engine(page_url, browser_pool, host_limiter, fetch_strategy, page_cache, metrics, deadline=None,
+                         retry_policy=None, attempt=1):
+    """Returns (page_content, content_hash); page_content is None when there is nothing new to parse.
+
+    Past `deadline` (a time.monotonic() value) the page is not fetched and is left for the next run.
+    After a transient failure that `retry_policy` allows to retry, returns (RETRY_FETCH, delay in seconds).
+    """
+    if attempt == 1:
+        logging.info(f"\n--- شروع بررسی URL: {page_url} ---")
+    scraper = get_scraper(page_url)
+    if scraper is None:
+        logging.warning(f"خراش دهنده برای {page_url} پیاده سازی نشده است.")
+        metrics.set_outcome(page_url, "skipped")
+        return None, None
+    blocked_for = host_limiter.blocked_for(page_url)
+    if blocked_for:
+        metrics.increment("fetch.circuit_rejected", url=page_url)
+        return _retry_or_fail(page_url, metrics, retry_policy, attempt, deadline, "circuit open", min_delay=blocked_for)
+    timings = {}
+    try:
+        wait_start = time.perf_counter()
+        with host_limiter.slot(page_url):
+            metrics.observe("host_wait", time.perf_counter() - wait_start, page_url)
+            if deadline is not None and time.monotonic() > deadline:
+                logging.info(f"بودجه زمانی اجرا تمام شده است. بررسی {page_url} به اجرای بعد موکول شد.")
+                metrics.set_outcome(page_url, "deferred")
+                return None, None
+            with metrics.timer("fetch", page_url):
+                page_content = fetch_page_source(page_url, browser_pool, scraper, strategy=fetch_strategy, timings=timings, page_cache=page_cache)
+        host_limiter.record_success(page_url)
+    except TransientFetchError as e:
+        metrics.increment("fetch.transient_errors", url=page_url)
+        if host_limiter.record_failure(page_url, e.retry_after):
+            logging.warning(f"میزبان {_host(page_url)} پس از خطاهای پیاپی تا {host_limiter.reset_timeout:.0f} ثانیه درخواستی دریافت نمی کند.")
+            metrics.increment("fetch.circuit_opened")
+        return _retry_or_fail(page_url, metrics, retry_policy, attempt, deadline, str(e), e.retry_after)
+    except Exception as e:
+        logging.error(f"خطای پیش بینی نشده هنگام دریافت {page_url}: {e}", exc_info=True)
+        metrics.set_outcome(page_url, "failed")
+        return None, None
+    finally:
+        for stage, seconds in timings.items():
+            metrics.observe(FETCH_TIMING_STAGES.get(stage, "fetch." + stage), seconds, page_url)
+    if page_content is PAGE_NOT_MODIFIED:
+        page_cache.mark_checked(page_url)
+        metrics.set_outcome(page_url, "not_modified")
+        return None, None
+    if not page_content:
+        logging.error(f"محتوای صفحه برای {page_url} دریافت نشد. رد شدن...")
+        metrics.set_outcome(page_url, "failed")
+        return None, None
+    metrics.increment("fetch.bytes", len(page_content), page_url)
+    page_hash = content_hash(page_content)
+    if page_cache.is_unchanged(page_url, page_hash):
+        logging.info(f"محتوای {page_url} با آخرین بررسی یکسان است. پردازش رد می شود.")
+        page_cache.mark_checked(page_url)
+        metrics.set_outcome(page_url, "unchanged")
+        return None, None
+    return page_content, page_hash
+
+
+def parse_page_for_engine(page_url, page_content, tracker_data, parse_options, fingerprints=None):
+    """Parses one fetched page and returns (updates, timings, fingerprints); updates is None if parsing failed.
+
+    Runs inside the parse process pool, so its stage timings and the page's new
+    link fingerprints (None for scrapers that keep none) travel back with the result.
+    """
+    timings = {}
+    try:
+        logging.getLogger().setLevel(parse_options.get('log_level', LOG_LEVEL)) # spawned workers start with the default level
+        parser = parse_options.get('parser', 'html.parser')
+        profile_memory = parse_options.get('profile_memory', False)
+        if profile_memory: tracemalloc.start()
+        parse_start = time.perf_counter()
+        try:
+            scraper = get_scraper(page_url)
+            soup = parse_page_html(page_content, parser=parser, scoped=parse_options.get('scoped', True) and scraper.scoped_parse)
+            parse_seconds = timings['parse'] = time.perf_counter() - parse_start
+            peak_memory_note = ""
+            if profile_memory:
+                peak_memory_note = f", حافظه اوج={tracemalloc.get_traced_memory()[1] / 1024 / 1024:.2f}MB"
+        finally:
+            if profile_memory: tracemalloc.stop()
+        logging.info(f"تجزیه {page_url}: parser={parser}, اندازه={len(page_content) / 1024:.0f}KB, زمان={parse_seconds * 1000:.1f}ms{peak_memory_note}")
+        with timed("import scraper " + scraper.host):
+            extract = scraper.extract_function()
+        extract_start = time.perf_counter()
+        extract_options = {}
+        if scraper.link_fingerprints:
+            fingerprints = extract_options['fingerprints'] = dict(fingerprints or {})
         else:
-            logging.info(f"    => {tracking_id} به‌روز است (فعلی: {current_version}, قبلی: {last_known_version}).")
-    return updates_found_on_page
+            fingerprints = None
+        updates_on_page = extract(page_url, soup, tracker_data, timings=timings, **extract_options)
+        # The extractor reports its version comparison separately; "extract" is everything else it did.
+        timings['extract'] = time.perf_counter() - extract_start - timings.get('compare', 0.0)
+        return updates_on_page, timings, fingerprints
+    except Exception as e:
+        logging.error(f"خطا هنگام پردازش محتوای دریافت شده برای {page_url}: {e}", exc_info=True)
+        return None, timings, None
+
+
+def run_url_checks(urls_to_process, tracker_data, browser_pool, page_cache, args, metrics=None, link_fingerprints=None):
+    """Fetches pages on a bounded thread pool and parses them on a separate process pool.
+
+    Results are merged in the order of `urls_to_process`, so the output does not
+    depend on which page finished first. `link_fingerprints` (a LinkFingerprintStore)
+    is handed to the scrapers that keep per-link state and updated with their results.
+    """
+    if metrics is None: metrics = RunMetrics()
+    # Like the schedule's budget, the deadline never stops the first page, so a small budget still makes progress.
+    deadline = time.monotonic() + args.time_budget if args.time_budget else None
+    host_limiter = HostLimiter(max_per_host=args.per_host_concurrency, delay=args.politeness_delay, burst=args.host_burst,
+                               failure_threshold=args.circuit_failure_threshold, reset_timeout=args.circuit_reset_seconds)
+    retry_policy = RetryPolicy(args.max_fetch_attempts, args.retry_base_delay, args.retry_max_delay)
+    updates_per_url = [[] for _ in urls_to_process]
+    page_hashes = {}
+    parse_options = {'parser': args.parser, 'scoped': not args.no_scoped_parse, 'profile_memory': args.profile_parse_memory,
+                     'log_level': args.log_level}
+
+    def record_parse_result(index, parse_result):
+        page_url = urls_to_process[index]
+        updates_on_page, timings, fingerprints = parse_result
+        metrics.observe_all(timings, url=page_url)
+        if updates_on_page is not None:
+            if link_fingerprints is not None and fingerprints is not None:
+                link_fingerprints.update(page_url, fingerprints)
+            updates_per_url[index] = updates_on_page
+            # A page with updates is only cached once they are published (see PageCache).
+            page_cache.commit(page_url, page_hashes[index], pending=bool(updates_on_page))
+            metrics.increment("updates_found", len(updates_on_page), page_url)
+            metrics.set_outcome(page_url, "updated" if updates_on_page else "current")
+        else:
+            metrics.set_outcome(page_url, "failed")
+        logging.info(f"--- پایان بررسی URL: {page_url} ---")
 
-def main():
+    # Workers are started on the first parse, while fetch threads may hold locks (logging, startup_timer), so they are not
+    # forked from this process: a forked child would inherit those locks held.
+    parse_executor = (ProcessPoolExecutor(max_workers=args.parse_workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD))
+                      if args.parse_workers > 0 else None)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.fetch_workers)) as fetch_executor:
+            def submit_fetch(index, attempt):
+                future = fetch_executor.submit(fetch_url_for_engine, urls_to_process[index], browser_pool, host_limiter, args.fetch_strategy,
+                                               page_cache, metrics, deadline if index else None, retry_policy, attempt)
+                fetch_futures[future] = (index, attempt)
+
+            fetch_futures = {}
+            retry_queue = [] # heap of (time.monotonic() when due, index, attempt)
+            for index in range(len(urls_to_process)):
+                submit_fetch(index, 1)
+            parse_futures = {}
+            while fetch_futures or retry_queue:
+                while retry_queue and retry_queue[0][0] <= time.monotonic():
+                    _, index, attempt = heapq.heappop(retry_queue)
+                    submit_fetch(index, attempt)
+                timeout = max(0.0, retry_queue[0][0] - time.monotonic()) if retry_queue else None
+                if not fetch_futures:
+                    time.sleep(timeout)
+                    continue
+                done, _ = wait(fetch_futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for fetch_future in done:
+                    index, attempt = fetch_futures.pop(fetch_future)
+                    page_url = urls_to_process[index]
+                    page_content, page_hash = fetch_future.result()
+                    if page_content is RETRY_FETCH:
+                        # Retried from the queue rather than on the worker, which moves on to other pages meanwhile.
+                        heapq.heappush(retry_queue, (time.monotonic() + page_hash, index, attempt + 1))
+                        continue
+                    page_hashes[index] = page_hash
+                    if page_content is None:
+                        continue
+                    previous_fingerprints = link_fingerprints.get(page_url) if link_fingerprints is not None and not args.no_link_fingerprints else None
+                    if parse_executor is None:
+                        record_parse_result(index, parse_page_for_engine(page_url, page_content, tracker_data, parse_options, previous_fingerprints))
+                    else:
+                        parse_futures[parse_executor.submit(parse_page_for_engine, page_url, page_content, tracker_data, parse_options, previous_fingerprints)] = index
+            for parse_future in as_completed(parse_futures):
+                index = parse_futures[parse_future]
+                try:
+                    parse_result = parse_future.result()
+                except Exception as e:
+                    logging.error(f"پردازشگر صفحه برای {urls_to_process[index]} از کار افتاد: {e}")
+                    parse_result = (None, {}, None)
+                record_parse_result(index, parse_result)
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown()
+    return [update for updates in updates_per_url for update in updates]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check app pages for new versions.")
+    parser.add_argument('--browser-pool-size', type=int, default=BROWSER_POOL_SIZE,
+                        help="Number of long-lived headless Chrome instances.")
+    parser.add_argument('--max-pages-per-browser', type=int, default=BROWSER_MAX_PAGES,
+                        help="Recycle a browser after it has served this many pages.")
+    parser.add_argument('--fetch-strategy', choices=FETCH_STRATEGIES, default=None,
+                        help="Override every scraper's own strategy. auto: plain HTTP first, Selenium only when the download box is missing.")
+    parser.add_argument('--fetch-workers', type=int, default=FETCH_WORKERS,
+                        help="Number of pages fetched concurrently.")
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS,
+                        help="Processes used for HTML parsing; 0 parses on the fetch thread.")
+    parser.add_argument('--per-host-concurrency', type=int, default=PER_HOST_CONCURRENCY,
+                        help="Maximum concurrent fetches against a single host.")
+    parser.add_argument('--politeness-delay', type=float, default=HOST_POLITENESS_DELAY,
+                        help="Minimum seconds between the start of two fetches to the same host.")
+    parser.add_argument('--host-burst', type=int, default=HOST_BURST,
+                        help="Fetches to a host that may start back to back before --politeness-delay applies.")
+    parser.add_argument('--max-fetch-attempts', type=int, default=FETCH_MAX_ATTEMPTS,
+                        help="Attempts per page for transient failures (connection errors, 429/5xx, browser crashes).")
+    parser.add_argument('--retry-base-delay', type=float, default=DEFAULT_BASE_DELAY,
+                        help="Backoff base in seconds; retry n waits a random time up to base * 2^(n-1), and at least Retry-After.")
+    parser.add_argument('--retry-max-delay', type=float, default=DEFAULT_MAX_DELAY,
+                        help="Longest backoff; a longer Retry-After leaves the page for the next run.")
+    parser.add_argument('--circuit-failure-threshold', type=int, default=DEFAULT_FAILURE_THRESHOLD,
+                        help="Consecutive transient failures after which a host gets no requests for --circuit-reset-seconds.")
+    parser.add_argument('--circuit-reset-seconds', type=float, default=DEFAULT_RESET_TIMEOUT)
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default=default_parser_backend(),
+                        help="BeautifulSoup tree builder (lxml when installed).")
+    parser.add_argument('--no-scoped-parse', action='store_true',
+                        help="Build the whole document tree instead of only the title, H1 and download box.")
+    parser.add_argument('--profile-parse-memory', action='store_true',
+                        help="Log peak parse memory per page (tracemalloc slows parsing down).")
+    parser.add_argument('--no-page-cache', action='store_true',
+                        help="Re-scrape every page even if it is unchanged since the last run (the cache is still refreshed).")
+    parser.add_argument('--no-link-fingerprints', action='store_true',
+                        help="Process every download link even if it is unchanged since the last run (the fingerprints are still refreshed).")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default=LOG_LEVEL.upper(),
+                        help="WARNING drops the per-page progress lines; per-link details are only logged at DEBUG.")
+    parser.add_argument('--run-report', default=RUN_REPORT_FILE,
+                        help="JSON report with per-stage and per-URL timings and counters.")
+    parser.add_argument('--prometheus-file',
+                        help="Also write the run-wide metrics here in Prometheus text format.")
+    parser.add_argument('--shard-index', type=int, default=int(SHARD_INDEX) if SHARD_INDEX else None,
+                        help="Run as shard <i> (0-based) of --shard-count; results go to .shard-<i> files for sharding.py merge, also with a count of 1.")
+    parser.add_argument('--shard-count', type=int, default=SHARD_COUNT,
+                        help="Split the URL list across this many jobs (shard 0 unless --shard-index is given).")
+    parser.add_argument('--shard-by', choices=SHARD_STRATEGIES, default="hash",
+                        help="hash: stable URL -> shard mapping. cost: balance by per-URL times from --shard-costs.")
+    parser.add_argument('--shard-costs', default=RUN_REPORT_FILE,
+                        help="Run report of an earlier run; its per-URL times drive --shard-by cost and --time-budget.")
+    parser.add_argument('--schedule', choices=SCHEDULE_MODES, default=CHECK_SCHEDULE,
+                        help="all: check every page. adaptive: only pages that are due, given how often they changed before.")
+    parser.add_argument('--max-pages', type=int,
+                        help="Check at most this many pages, the most likely to have changed first.")
+    parser.add_argument('--time-budget', type=float,
+                        help="Seconds this run may spend; pages are picked by likelihood of change and estimated cost, and fetching stops once it is used up.")
+    parser.add_argument('--min-check-interval-hours', type=float, default=DEFAULT_MIN_INTERVAL_HOURS)
+    parser.add_argument('--max-check-interval-days', type=float, default=DEFAULT_MAX_INTERVAL_DAYS)
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Log how long imports and one-off initialization (tracker, cache, browser) took.")
+    parser.add_argument('--page-cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES)
+    parser.add_argument('--page-cache-max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help="Force a full re-scrape of pages whose cache entry is older than this.")
+    args = parser.parse_args(argv)
+    if args.shard_count < 1:
+        parser.error("--shard-count must be at least 1")
+    if args.shard_index is not None and not 0 <= args.shard_index < args.shard_count:
+        parser.error(f"--shard-index {args.shard_index} is outside 0..{args.shard_count - 1}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(args.log_level)
+    metrics = RunMetrics()
     if not os.path.exists(URL_FILE):
         logging.error(f"فایل URL ها یافت نشد: {URL_FILE}")
         with open(OUTPUT_JSON_FILE, 'w', encoding='utf-8') as f: json.dump([], f)
@@ -460,55 +644,101 @@ def main():
             logging.info(f"کاراکتر BOM از ابتدای URL '{raw_url}' حذف و به '{cleaned_url}' تبدیل شد.")
         urls_to_process.append(cleaned_url)
 
+    # Pages no longer in the URL file are pruned from the schedule and link fingerprints when they are saved.
+    all_urls = list(urls_to_process)
+    # A shard writes .shard-<i> files for the merge step, even when it is the only one.
+    sharded = args.shard_index is not None or args.shard_count > 1
+    shard_index = args.shard_index or 0
+    output_file, page_cache_output, run_report_output, schedule_output = OUTPUT_JSON_FILE, PAGE_CACHE_FILE, args.run_report, SCHEDULE_FILE
+    fingerprints_output = LINK_FINGERPRINTS_FILE
+    pending_page_cache_output = pending_path(PAGE_CACHE_FILE)
+    if sharded:
+        urls_to_process = select_shard(urls_to_process, shard_index, args.shard_count, args.shard_by, load_url_costs(args.shard_costs))
+        output_file = shard_path(OUTPUT_JSON_FILE, shard_index)
+        page_cache_output = shard_path(PAGE_CACHE_FILE, shard_index)
+        pending_page_cache_output = shard_path(pending_path(PAGE_CACHE_FILE), shard_index)
+        run_report_output = shard_path(args.run_report, shard_index)
+        schedule_output = shard_path(SCHEDULE_FILE, shard_index)
+        fingerprints_output = shard_path(LINK_FINGERPRINTS_FILE, shard_index)
+        logging.info(f"شارد {shard_index} از {args.shard_count} ({args.shard_by}): {len(urls_to_process)} URL.")
+
     if not urls_to_process:
         logging.info("فایل URL ها خالی است یا فقط شامل کامنت است.")
-        with open(OUTPUT_JSON_FILE, 'w', encoding='utf-8') as f: json.dump([], f)
+        with open(output_file, 'w', encoding='utf-8') as f: json.dump([], f)
         if os.getenv('GITHUB_OUTPUT'):
             with open(GITHUB_OUTPUT_FILE, 'a', encoding='utf-8') as gh_output: gh_output.write(f"updates_count=0\n")
         return
 
-    tracker_data = load_tracker()
-    all_updates_found = []
-    
-    for page_url in urls_to_process: # page_url is now the cleaned version
-        logging.info(f"\n--- شروع بررسی URL: {page_url} ---")
-        # Pass the cleaned page_url to Selenium function
-        page_content = get_page_source_with_selenium(page_url, wait_for_class="downloadbox") 
-        
-        if not page_content:
-            logging.error(f"محتوای صفحه برای {page_url} با Selenium دریافت نشد. رد شدن...")
-            continue
-        try:
-            soup = BeautifulSoup(page_content, 'html.parser')
-            # Assuming only farsroid.com URLs are processed this way for now
-            if "farsroid.com" in page_url.lower(): 
-                updates_on_page = scrape_farsroid_page(page_url, soup, tracker_data)
-                all_updates_found.extend(updates_on_page)
-            else:
-                logging.warning(f"خراش دهنده برای {page_url} پیاده سازی نشده است.")
-        except Exception as e:
-            logging.error(f"خطا هنگام پردازش محتوای دریافت شده از Selenium برای {page_url}: {e}", exc_info=True)
-        logging.info(f"--- پایان بررسی URL: {page_url} ---")
+    schedule = CheckSchedule(SCHEDULE_FILE, args.min_check_interval_hours, args.max_check_interval_days).load()
+    scheduled_urls = list(urls_to_process)
+    urls_to_process, deferred_urls = schedule.plan(urls_to_process, args.schedule, args.max_pages, args.time_budget,
+                                                   load_url_costs(args.shard_costs) if args.time_budget else None)
+    if deferred_urls:
+        logging.info(f"زمان بندی ({args.schedule}): {len(urls_to_process)} صفحه بررسی می شود و {len(deferred_urls)} صفحه به اجرای بعد موکول شد.")
+        for url in deferred_urls:
+            metrics.set_outcome(url, "deferred")
+
+    with timed("load tracker"):
+        tracker_store = TrackerStore(TRACKING_FILE).load()
+        tracker_data = tracker_store.snapshot()
+        link_fingerprints = LinkFingerprintStore(LINK_FINGERPRINTS_FILE).load()
+    with timed("load page cache"):
+        page_cache = PageCache(PAGE_CACHE_FILE, max_entries=args.page_cache_max_entries,
+                               max_age_days=args.page_cache_max_age_days, enabled=not args.no_page_cache).load()
+    record_startup("ready to fetch", time.perf_counter() - PROCESS_START)
+
+    browser_pool = BrowserPool(size=args.browser_pool_size, max_pages_per_driver=args.max_pages_per_browser)
+    try:
+        all_updates_found = run_url_checks(urls_to_process, tracker_data, browser_pool, page_cache, args, metrics, link_fingerprints)
+    finally:
+        browser_pool.close()
+        for counter, value in browser_pool.stats.items():
+            metrics.increment("browser." + counter, value)
 
-    new_tracker_data_for_save = tracker_data.copy()
-    for update_item in all_updates_found:
-        new_tracker_data_for_save[update_item["tracking_id"]] = update_item["current_version_for_tracking"]
+    try:
+        page_cache.save(page_cache_output)
+        page_cache.save_pending(pending_page_cache_output)
+        logging.info(f"کش صفحات ذخیره شد ({page_cache.hits} صفحه بدون تغییر رد شد).")
+    except Exception as e:
+        logging.error(f"خطا در ذخیره کش صفحات {page_cache_output}: {e}")
 
-    with open(OUTPUT_JSON_FILE, 'w', encoding='utf-8') as f:
+    with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(all_updates_found, f, ensure_ascii=False, indent=2)
+
+    try:
+        # A shard writes only the pages it checked; sharding.py merge folds them into the full file.
+        link_fingerprints.save(fingerprints_output, page_urls=urls_to_process if sharded else all_urls)
+    except Exception as e:
+        logging.error(f"خطا در ذخیره اثر انگشت لینک ها {fingerprints_output}: {e}")
+
+    try:
+        outcomes = metrics.outcomes()
+        for url in urls_to_process:
+            schedule.record(url, outcomes.get(url))
+        # A shard writes its own pages, deferred ones included; the merge prunes the committed file.
+        schedule.save(schedule_output, urls=scheduled_urls if sharded else all_urls)
+    except Exception as e:
+        logging.error(f"خطا در ذخیره زمان بندی بررسی {schedule_output}: {e}")
     
+    # The tracker is not touched here, in any mode: release_publisher.py records the updates in updates_found.json
+    # (merged by `sharding.py merge` for a sharded run) once their assets are actually published.
+
     try:
-        with open(TRACKING_FILE, 'w', encoding='utf-8') as f:
-            json.dump(new_tracker_data_for_save, f, ensure_ascii=False, indent=2)
-        logging.info(f"فایل ردیاب {TRACKING_FILE} با موفقیت بروزرسانی شد.")
+        run_report = metrics.report()
+        write_report(run_report, run_report_output, args.prometheus_file)
+        logging.info(f"گزارش اجرا در {run_report_output} ذخیره شد. پرهزینه ترین مراحل: " + ", ".join(
+            f"{stage}={values['total_s']:.1f}s" for stage, values in list(run_report["stages"].items())[:5]))
     except Exception as e:
-        logging.error(f"خطا در ذخیره فایل ردیاب {TRACKING_FILE}: {e}")
+        logging.error(f"خطا در ذخیره گزارش اجرا {args.run_report}: {e}")
 
     num_updates = len(all_updates_found)
     if os.getenv('GITHUB_OUTPUT'): 
         with open(GITHUB_OUTPUT_FILE, 'a', encoding='utf-8') as gh_output:
             gh_output.write(f"updates_count={num_updates}\n")
-    logging.info(f"\nخلاصه: {num_updates} آپدیت پیدا شد. جزئیات در {OUTPUT_JSON_FILE}")
+    logging.info(f"\nخلاصه: {num_updates} آپدیت پیدا شد. جزئیات در {output_file}")
+    if args.profile_startup:
+        # Parse workers import bs4 and the scrapers in their own processes; use --parse-workers 0 to see those costs here.
+        logging.info("زمان های راه اندازی: " + ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in startup_report().items()))
 
 if __name__ == "__main__":
     main()
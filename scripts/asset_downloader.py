@@ -0,0 +1,344 @@
+"""Downloads the assets listed in updates_found.json into the release directory.
+
+Assets are fetched concurrently over pooled connections and streamed to disk in
+chunks. Partial files (`<name>.part`) are resumed with HTTP Range requests, and
+failed downloads are retried with exponential backoff. The result is written to
+a manifest listing the downloaded, linked and failed updates; the release and
+tracker steps work from that manifest.
+
+Every asset is SHA-256 hashed while it streams in. asset_index.json maps hashes
+and (download URL, version) pairs to assets already published in earlier
+releases, so a file that was published before is linked instead of being
+uploaded again. A URL alone proves nothing: a site may serve every version
+from the same fixed URL.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from atomic_files import write_json_atomically
+from run_metrics import RunMetrics, merge_into_report
+
+UPDATES_FILE = "updates_found.json"
+DOWNLOAD_DIR = "release_assets"
+MANIFEST_FILE = "download_manifest.json"
+ASSET_INDEX_FILE = "asset_index.json"
+GITHUB_OUTPUT_FILE = os.getenv('GITHUB_OUTPUT', 'local_github_output.txt')
+DOWNLOAD_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36"
+CHUNK_SIZE = 1024 * 1024
+CONNECT_TIMEOUT = 15
+READ_TIMEOUT = 60
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+_CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+class DownloadError(Exception):
+    """A download failed in a way that retrying will not fix."""
+
+
+def build_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = DOWNLOAD_USER_AGENT
+    return session
+
+
+def _hash_existing_bytes(path, chunk_size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest
+
+
+def _stream_to_part_file(session, url, part_path, chunk_size):
+    """Downloads `url` into `part_path`, resuming from its current size. Returns (size in bytes, sha256 hex)."""
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={resume_from}-'} if resume_from else {}
+    with session.get(url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), allow_redirects=True) as response:
+        if response.status_code == 416 and resume_from:
+            # The partial file does not fit the remote one (it probably changed); start over.
+            os.remove(part_path)
+            return _stream_to_part_file(session, url, part_path, chunk_size)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+        if response.status_code >= 400:
+            raise DownloadError(f"HTTP {response.status_code} {response.reason}")
+
+        mode = 'wb'
+        expected_total = None
+        digest = hashlib.sha256()
+        if response.status_code == 206:
+            match = _CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+            if not match or int(match.group(1)) != resume_from:
+                raise DownloadError(f"Unexpected Content-Range: {response.headers.get('Content-Range')!r}")
+            mode = 'ab'
+            digest = _hash_existing_bytes(part_path, chunk_size)
+            if match.group(3) != '*':
+                expected_total = int(match.group(3))
+        else:
+            # The server ignored the Range header (or there was nothing to resume): write from scratch.
+            resume_from = 0
+            if response.headers.get('Content-Length') and 'Content-Encoding' not in response.headers:
+                expected_total = int(response.headers['Content-Length'])
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    digest.update(chunk)
+
+    size = os.path.getsize(part_path)
+    if expected_total is not None and size != expected_total:
+        # Keep the .part file so the next attempt resumes from here.
+        raise requests.ConnectionError(f"Incomplete download: {size} of {expected_total} bytes")
+    return size, digest.hexdigest()
+
+
+def download_asset(session, url, dest_path, retries=3, backoff=2.0, chunk_size=CHUNK_SIZE):
+    """Downloads `url` to `dest_path` with resume and retries. Returns (size in bytes, sha256 hex)."""
+    part_path = dest_path + '.part'
+    attempt = 0
+    while True:
+        try:
+            size, sha256 = _stream_to_part_file(session, url, part_path, chunk_size)
+            os.replace(part_path, dest_path)
+            return size, sha256
+        except DownloadError:
+            raise
+        except (requests.RequestException, OSError) as e:
+            if attempt >= retries:
+                raise DownloadError(f"{e} (after {attempt + 1} attempts)") from e
+            delay = backoff * (2 ** attempt)
+            logging.warning(f"  دانلود {url} ناموفق بود ({e}). تلاش مجدد در {delay:.1f} ثانیه...")
+            time.sleep(delay)
+            attempt += 1
+
+
+class AssetIndex:
+    """Content-addressed record of assets that have been published in a release.
+
+    `by_hash` maps a SHA-256 to {"asset_name", "release_tag", "size", "tracking_ids",
+    "urls"}; `by_url` maps every download URL seen for that content to {version: hash}.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.by_hash = {}
+        self.by_url = {}
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.by_hash = data.get('by_hash', {})
+                # Older indexes mapped a URL straight to a hash, without the version it was published as; those
+                # entries are dropped and the assets are matched by their hash after downloading instead.
+                self.by_url = {url: versions for url, versions in data.get('by_url', {}).items() if isinstance(versions, dict)}
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning(f"فهرست فایل ها {self.path} قابل خواندن نیست ({e}). با فهرست خالی شروع می شود.")
+        return self
+
+    def published_for_url(self, url, version):
+        sha256 = self.by_url.get(url, {}).get(version)
+        entry = self.by_hash.get(sha256) if sha256 else None
+        return (sha256, entry) if entry and entry.get('release_tag') else (None, None)
+
+    def published_for_hash(self, sha256):
+        entry = self.by_hash.get(sha256)
+        return entry if entry and entry.get('release_tag') else None
+
+    def record(self, sha256, asset_name, release_tag, size, tracking_id, url, version):
+        entry = self.by_hash.setdefault(sha256, {'asset_name': asset_name, 'release_tag': release_tag,
+                                                 'size': size, 'tracking_ids': [], 'urls': []})
+        if tracking_id not in entry['tracking_ids']:
+            entry['tracking_ids'].append(tracking_id)
+        if url not in entry['urls']:
+            entry['urls'].append(url)
+        self.by_url.setdefault(url, {})[version] = sha256
+
+    def save(self):
+        write_json_atomically(self.path, {'by_hash': self.by_hash, 'by_url': self.by_url})
+
+
+def _linked_record(item, sha256, entry):
+    return dict(item, sha256=sha256, release_tag=entry['release_tag'], asset_name=entry['asset_name'])
+
+
+def assign_filenames(updates):
+    """Returns a unique, path-safe filename for every update, keeping suggested_filename where possible."""
+    used = {}
+    filenames = []
+    for item in updates:
+        filename = os.path.basename(item.get('suggested_filename') or '') or f"{item['tracking_id']}.bin"
+        owner = used.get(filename)
+        if owner is not None and owner != item['download_url']:
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}-{item['tracking_id']}{ext}"
+        used.setdefault(filename, item['download_url'])
+        filenames.append(filename)
+    return filenames
+
+
+def download_updates(updates, output_dir, workers=4, retries=3, backoff=2.0, chunk_size=CHUNK_SIZE, asset_index=None, metrics=None):
+    """Downloads every update and returns the manifest dict.
+
+    The manifest has three lists of update records: "downloaded" (a file under
+    `output_dir` to upload, with its sha256), "linked" (identical content is already
+    published; see release_tag/asset_name) and "failed". Updates whose content
+    turns out to be identical within this run share one downloaded file.
+    Download times and sizes are recorded per URL in `metrics` (a RunMetrics).
+    """
+    if metrics is None: metrics = RunMetrics(outcome_counter="download.assets")
+    os.makedirs(output_dir, exist_ok=True)
+    if asset_index is None:
+        asset_index = AssetIndex(ASSET_INDEX_FILE)
+    filenames = assign_filenames(updates)
+    session = build_session(max(1, workers))
+
+    manifest = {"downloaded": [], "linked": [], "failed": []}
+    # Items that share a filename also share a URL (see assign_filenames), so each file is fetched once.
+    jobs = {}
+    for item, filename in zip(updates, filenames):
+        if asset_index.published_for_url(item['download_url'], item['current_version_for_tracking'])[1] is None:
+            jobs.setdefault(filename, item['download_url'])
+
+    def run(filename):
+        url = jobs[filename]
+        started = time.perf_counter()
+        logging.info(f"  در حال دانلود {filename} از {url}...")
+        try:
+            size, sha256 = download_asset(session, url, os.path.join(output_dir, filename), retries, backoff, chunk_size)
+        except DownloadError as e:
+            logging.error(f"  دانلود {filename} ناموفق بود: {e}")
+            metrics.observe("download", time.perf_counter() - started, url)
+            return filename, None, None, str(e)
+        seconds = time.perf_counter() - started
+        metrics.observe("download", seconds, url)
+        metrics.increment("download.bytes", size, url)
+        logging.info(f"  دانلود {filename} کامل شد ({size / 1024 / 1024:.1f}MB در {seconds:.1f} ثانیه، sha256={sha256[:12]}).")
+        return filename, size, sha256, None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        outcomes = {filename: (size, sha256, error) for filename, size, sha256, error in executor.map(run, list(jobs))}
+
+    first_file_for_hash = {}
+    for item, filename in zip(updates, filenames):
+        sha256, published = asset_index.published_for_url(item['download_url'], item['current_version_for_tracking'])
+        if published is not None:
+            logging.info(f"  {item['download_url']} (نسخه {item['current_version_for_tracking']}) قبلا در {published['release_tag']} منتشر شده است. دانلود رد شد.")
+            manifest["linked"].append(_linked_record(item, sha256, published))
+            metrics.set_outcome(item['download_url'], "linked")
+            continue
+        size, sha256, error = outcomes[filename]
+        if error is not None:
+            manifest["failed"].append(dict(item, filename=filename, error=error))
+            metrics.set_outcome(item['download_url'], "failed")
+            continue
+        published = asset_index.published_for_hash(sha256)
+        if published is not None:
+            logging.info(f"  محتوای {filename} با {published['asset_name']} در {published['release_tag']} یکسان است. آپلود رد شد.")
+            manifest["linked"].append(_linked_record(item, sha256, published))
+            metrics.set_outcome(item['download_url'], "linked")
+            _remove_quietly(os.path.join(output_dir, filename))
+            continue
+        canonical = first_file_for_hash.setdefault(sha256, filename)
+        if canonical != filename:
+            logging.info(f"  محتوای {filename} با {canonical} یکسان است. فقط یک نسخه آپلود می شود.")
+            _remove_quietly(os.path.join(output_dir, filename))
+        manifest["downloaded"].append(dict(item, filename=canonical, path=os.path.join(output_dir, canonical), size=size, sha256=sha256))
+        metrics.set_outcome(item['download_url'], "downloaded")
+    return manifest
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def record_release(manifest, release_tag, asset_index):
+    """Adds the assets of a successfully published release to the index."""
+    for record in manifest.get("downloaded", []):
+        asset_index.record(record['sha256'], record['filename'], release_tag, record['size'], record['tracking_id'], record['download_url'],
+                           record['current_version_for_tracking'])
+    for record in manifest.get("linked", []):
+        entry = asset_index.by_hash[record['sha256']]
+        asset_index.record(record['sha256'], entry['asset_name'], entry['release_tag'], entry['size'], record['tracking_id'], record['download_url'],
+                           record['current_version_for_tracking'])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download the assets listed in updates_found.json.")
+    parser.add_argument('--updates-file', default=UPDATES_FILE)
+    parser.add_argument('--output-dir', default=DOWNLOAD_DIR)
+    parser.add_argument('--manifest', default=MANIFEST_FILE)
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent downloads.")
+    parser.add_argument('--retries', type=int, default=3, help="Retries per asset after the first attempt.")
+    parser.add_argument('--backoff', type=float, default=2.0, help="Base delay in seconds, doubled after every retry.")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--asset-index', default=ASSET_INDEX_FILE,
+                        help="Content-addressed index of assets published in earlier releases.")
+    parser.add_argument('--run-report',
+                        help="Add download timings to this run report (written by app_updater.py).")
+    parser.add_argument('--prometheus-file',
+                        help="With --run-report, also rewrite the run's Prometheus metrics here.")
+    parser.add_argument('--log-level', choices=("DEBUG", "INFO", "WARNING", "ERROR"), default=os.getenv('LOG_LEVEL', 'INFO').upper())
+    parser.add_argument('--record-release', metavar='TAG',
+                        help="Do not download; add the manifest's assets to the index as published in release TAG.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(args.log_level)
+    asset_index = AssetIndex(args.asset_index).load()
+    if args.record_release is not None:
+        with open(args.manifest, 'r', encoding='utf-8') as f:
+            record_release(json.load(f), args.record_release, asset_index)
+        asset_index.save()
+        logging.info(f"فایل های انتشار {args.record_release} در {args.asset_index} ثبت شدند.")
+        return 0
+
+    try:
+        with open(args.updates_file, 'r', encoding='utf-8') as f:
+            updates = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.error(f"فایل آپدیت ها {args.updates_file} قابل خواندن نیست: {e}")
+        return 1
+
+    logging.info(f"دانلود {len(updates)} فایل با {args.workers} اتصال همزمان...")
+    metrics = RunMetrics(outcome_counter="download.assets")
+    manifest = download_updates(updates, args.output_dir, args.workers, args.retries, args.backoff, args.chunk_size, asset_index, metrics)
+    write_json_atomically(args.manifest, manifest)
+    if args.run_report:
+        try:
+            merge_into_report(args.run_report, "download", metrics.report(), args.prometheus_file)
+        except Exception as e:
+            logging.error(f"خطا در افزودن زمان های دانلود به {args.run_report}: {e}")
+
+    if os.getenv('GITHUB_OUTPUT'):
+        with open(GITHUB_OUTPUT_FILE, 'a', encoding='utf-8') as gh_output:
+            gh_output.write(f"downloaded_count={len(manifest['downloaded'])}\n")
+    logging.info(f"خلاصه دانلود: {len(manifest['downloaded'])} موفق، {len(manifest['linked'])} پیوند به فایل موجود، {len(manifest['failed'])} ناموفق. جزئیات در {args.manifest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
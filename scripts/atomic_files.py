@@ -0,0 +1,27 @@
+"""Atomic file writes, shared by every script that rewrites a state file.
+
+The data goes to a temporary file in the target's directory, is flushed to
+disk and then replaces the target with one os.replace(), so a reader (or a
+run that dies half way) sees either the old file or the new one, never a mix.
+"""
+import json
+import os
+import tempfile
+
+
+def write_text_atomically(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_json_atomically(path, data, indent=2, sort_keys=False):
+    write_text_atomically(path, json.dumps(data, ensure_ascii=False, indent=indent, sort_keys=sort_keys))
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from atomic_files import write_json_atomically
+from startup_timer import record, timed
+
+# Selenium and webdriver_manager are imported where a browser is actually needed, so that
+# importing this module (e.g. for CHROME_USER_AGENT or ReadinessCondition) stays cheap.
+
+CHROME_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36"
+# Where the resolved chromedriver path is remembered between runs; an empty value disables the disk cache.
+CHROMEDRIVER_CACHE_FILE = os.getenv('CHROMEDRIVER_CACHE_FILE', os.path.join(os.path.expanduser('~'), '.cache', 'app_updater', 'chromedriver.json'))
+# Re-resolve now and then so a Chrome upgrade eventually gets a matching driver even if the old one still starts.
+CHROMEDRIVER_CACHE_MAX_AGE_DAYS = float(os.getenv('CHROMEDRIVER_CACHE_MAX_AGE_DAYS', '7'))
+
+_driver_path_lock = threading.Lock()
+_driver_path = None
+_driver_path_resolved = False
+
+
+def _read_cached_driver_path(cache_file=CHROMEDRIVER_CACHE_FILE, max_age_days=CHROMEDRIVER_CACHE_MAX_AGE_DAYS):
+    if not cache_file:
+        return None
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        path, resolved_at = cached['path'], float(cached['resolved_at'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if time.time() - resolved_at > max_age_days * 86400:
+        return None
+    if not (os.path.isfile(path) and os.access(path, os.X_OK)):
+        return None
+    return path
+
+
+def _write_cached_driver_path(path, cache_file=CHROMEDRIVER_CACHE_FILE):
+    if not cache_file:
+        return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        write_json_atomically(cache_file, {'path': path, 'resolved_at': time.time()}, indent=None)
+    except OSError as e:
+        logging.warning(f"ذخیره مسیر chromedriver در {cache_file} ناموفق بود: {e}")
+
+
+def resolve_driver_path(refresh=False):
+    """Returns the chromedriver path, or None to let Selenium find one itself.
+
+    Resolved once per process. The path is also cached on disk, so later runs
+    skip ChromeDriverManager (which may hit the network) entirely. `refresh`
+    bypasses both caches, e.g. after the cached driver failed to start.
+    """
+    global _driver_path, _driver_path_resolved
+    with _driver_path_lock:
+        if _driver_path_resolved and not refresh:
+            return _driver_path
+        with timed("chromedriver path"):
+            path = None if refresh else _read_cached_driver_path()
+            if path is not None:
+                logging.info(f"مسیر chromedriver از کش خوانده شد: {path}")
+            else:
+                try:
+                    from webdriver_manager.chrome import ChromeDriverManager
+                    path = ChromeDriverManager().install()
+                    _write_cached_driver_path(path)
+                except Exception as e_driver_manager:
+                    logging.warning(f"خطا در ChromeDriverManager: {e_driver_manager}. استفاده از درایور پیشفرض.")
+                    path = None
+        _driver_path, _driver_path_resolved = path, True
+        return path
+
+
+def build_chrome_options():
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    chrome_options = ChromeOptions()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument(f"user-agent={CHROME_USER_AGENT}")
+    return chrome_options
+
+
+# Installs a MutationObserver on first call and reports [matching elements, ms since the last DOM mutation].
+_READINESS_PROBE_JS = """
+if (!window.__updaterMutationObserver) {
+    window.__updaterLastMutation = Date.now();
+    window.__updaterMutationObserver = new MutationObserver(function () { window.__updaterLastMutation = Date.now(); });
+    window.__updaterMutationObserver.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return [document.querySelectorAll(arguments[0]).length, Date.now() - window.__updaterLastMutation];
+"""
+
+
+class ReadinessCondition:
+    """Decides when a loaded page is ready to be read.
+
+    The page is ready once at least `min_count` elements match `selector` and the
+    DOM has not changed for `quiet_period` seconds. wait() returns as soon as that
+    holds, or when `timeout` seconds have passed, and reports how long it waited.
+    """
+
+    def __init__(self, selector, min_count=1, quiet_period=0.5, timeout=10, poll_interval=0.1):
+        self.selector = selector
+        self.min_count = min_count
+        self.quiet_period = quiet_period
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def wait(self, driver):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            count, quiet_ms = driver.execute_script(_READINESS_PROBE_JS, self.selector)
+            if count >= self.min_count and quiet_ms >= self.quiet_period * 1000:
+                return True, time.monotonic() - start
+            now = time.monotonic()
+            if now >= deadline:
+                return False, now - start
+            time.sleep(min(self.poll_interval, deadline - now))
+
+
+class _PooledDriver:
+    """A Chrome driver plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, driver, slot, startup_seconds=0.0):
+        self.driver = driver
+        self.slot = slot
+        self.startup_seconds = startup_seconds
+        self.pages_served = 0
+        self.created_at = time.monotonic()
+
+
+class BrowserPool:
+    """A fixed number of long-lived headless Chrome drivers shared by all workers.
+
+    Drivers are started lazily on first use, handed out one per caller and
+    returned with release(). A driver is recycled after `max_pages_per_driver`
+    pages or as soon as a caller reports it as broken.
+    """
+
+    def __init__(self, size=1, max_pages_per_driver=50):
+        self.size = max(1, int(size))
+        self.max_pages_per_driver = max(1, int(max_pages_per_driver))
+        self._idle = []
+        self._cond = threading.Condition()
+        self._live = 0
+        self._next_slot = 0
+        self._closed = False
+        self.stats = {"started": 0, "recycled": 0, "crashed": 0}
+
+    def _start_driver(self, slot):
+        with timed("import selenium"):
+            from selenium import webdriver
+            from selenium.webdriver.chrome.service import Service as ChromeService
+        driver_path = resolve_driver_path()
+        start = time.perf_counter()
+        try:
+            driver = webdriver.Chrome(service=ChromeService(executable_path=driver_path) if driver_path else ChromeService(),
+                                      options=build_chrome_options())
+        except Exception as e:
+            if not driver_path:
+                raise
+            # The cached driver may no longer match the installed Chrome; resolve it again once.
+            logging.warning(f"راه اندازی مرورگر با {driver_path} ناموفق بود ({e}). مسیر chromedriver دوباره تعیین می شود.")
+            driver_path = resolve_driver_path(refresh=True)
+            driver = webdriver.Chrome(service=ChromeService(executable_path=driver_path) if driver_path else ChromeService(),
+                                      options=build_chrome_options())
+        seconds = time.perf_counter() - start
+        record("first browser launch", seconds)
+        self.stats["started"] += 1
+        logging.info(f"مرورگر شماره {slot} در {seconds:.2f} ثانیه راه اندازی شد.")
+        return _PooledDriver(driver, slot, seconds)
+
+    @staticmethod
+    def _quit(pooled):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logging.warning(f"خطا در بستن مرورگر شماره {pooled.slot}: {e}")
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("BrowserPool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._live < self.size:
+                    self._live += 1
+                    self._next_slot += 1
+                    slot = self._next_slot
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No browser became available in time")
+                self._cond.wait(remaining)
+        try:
+            return self._start_driver(slot)
+        except Exception:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, pooled, broken=False):
+        pooled.pages_served += 1
+        recycle = self._closed or broken or pooled.pages_served >= self.max_pages_per_driver
+        if recycle and not self._closed:
+            if broken:
+                self.stats["crashed"] += 1
+                logging.warning(f"مرورگر شماره {pooled.slot} پس از خطا جایگزین می شود.")
+            else:
+                self.stats["recycled"] += 1
+                logging.info(f"مرورگر شماره {pooled.slot} پس از {pooled.pages_served} صفحه بازیافت می شود.")
+        if recycle:
+            self._quit(pooled)
+        with self._cond:
+            if recycle:
+                # Free the slot; the replacement is started lazily by the next acquire().
+                self._live -= 1
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+        logging.info(f"استخر مرورگر بسته شد (راه اندازی: {self.stats['started']}, بازیافت: {self.stats['recycled']}, خرابی: {self.stats['crashed']}).")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,128 @@
+"""Per-URL check schedule based on how often each page has actually changed.
+
+check_schedule.json keeps, per page URL, when it was last checked, when its
+checks last found a new version (the same event that moves the tracker) and
+the current check interval:
+
+  - a check that finds a new version resets the interval to the minimum;
+  - a check that finds nothing doubles it, up to the maximum, but never beyond
+    half the page's typical gap between changes, so pages that change often
+    stay on a short interval;
+  - a failed check leaves the page due on the next run.
+
+Pages are ranked by how likely they are to have changed since their last
+check: 1 - exp(-elapsed / typical gap), where the typical gap is the mean
+time between recorded changes, or the current interval while there is no
+such history. Pages never checked before come first. A budget ("at most N
+pages" or "about T seconds", using per-URL times from an earlier run report)
+is filled in that order.
+"""
+import json
+import logging
+import math
+import os
+import time
+
+from atomic_files import write_json_atomically
+
+SCHEDULE_FILE = "check_schedule.json"
+# A little under the daily cron period, so a page checked yesterday is due again today even if the run starts early.
+DEFAULT_MIN_INTERVAL_HOURS = 20
+DEFAULT_MAX_INTERVAL_DAYS = 7
+BACKOFF_FACTOR = 2
+HISTORY_LENGTH = 10 # change timestamps kept per page
+SCHEDULE_MODES = ("all", "adaptive")
+CHANGED_OUTCOMES = {"updated"}
+UNCHANGED_OUTCOMES = {"current", "unchanged", "not_modified"}
+
+
+class CheckSchedule:
+    def __init__(self, path=SCHEDULE_FILE, min_interval_hours=DEFAULT_MIN_INTERVAL_HOURS, max_interval_days=DEFAULT_MAX_INTERVAL_DAYS):
+        self.path = path
+        self.min_interval = min_interval_hours * 3600
+        self.max_interval = max(self.min_interval, max_interval_days * 86400)
+        self.entries = {} # url -> {"last_checked", "next_check", "interval", "changes": [timestamps]}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logging.warning(f"زمان بندی بررسی {self.path} قابل خواندن نیست ({e}). همه صفحات بررسی می شوند.")
+            self.entries = {}
+        return self
+
+    def _typical_gap(self, entry):
+        changes = entry.get('changes', [])
+        if len(changes) >= 2:
+            return (changes[-1] - changes[0]) / (len(changes) - 1)
+        return None
+
+    def is_due(self, url, now):
+        entry = self.entries.get(url)
+        return entry is None or entry.get('next_check', 0) <= now
+
+    def change_likelihood(self, url, now):
+        entry = self.entries.get(url)
+        if entry is None or not entry.get('last_checked'):
+            return 1.0
+        gap = self._typical_gap(entry) or entry.get('interval') or self.min_interval
+        return 1 - math.exp(-max(0.0, now - entry['last_checked']) / max(gap, 1.0))
+
+    def plan(self, urls, mode="all", max_pages=None, time_budget=None, costs=None, now=None):
+        """Returns (urls to check, urls deferred to a later run).
+
+        With a budget, the selection is ordered most-likely-to-change first;
+        otherwise it keeps the order of `urls`.
+        """
+        now = time.time() if now is None else now
+        candidates = [url for url in urls if mode == "all" or self.is_due(url, now)]
+        candidate_set = set(candidates)
+        not_due = [url for url in urls if url not in candidate_set]
+        if max_pages is None and time_budget is None:
+            return candidates, not_due
+        position = {url: index for index, url in enumerate(urls)}
+        ranked = sorted(candidates, key=lambda url: (-self.change_likelihood(url, now), position[url]))
+        costs = costs or {}
+        known_costs = sorted(costs[url] for url in ranked if url in costs)
+        default_cost = known_costs[len(known_costs) // 2] if known_costs else 0.0
+        selected, spent = [], 0.0
+        for url in ranked:
+            if max_pages is not None and len(selected) >= max_pages:
+                break
+            cost = costs.get(url, default_cost)
+            # The first page always fits, so a small budget still makes progress.
+            if time_budget is not None and selected and spent + cost > time_budget:
+                break
+            selected.append(url)
+            spent += cost
+        chosen = set(selected)
+        return selected, not_due + [url for url in ranked if url not in chosen]
+
+    def record(self, url, outcome, now=None):
+        """Updates a page's history after a check ended with `outcome` (see RunMetrics.set_outcome)."""
+        now = time.time() if now is None else now
+        entry = self.entries.setdefault(url, {'last_checked': None, 'next_check': 0, 'interval': self.min_interval, 'changes': []})
+        if outcome in CHANGED_OUTCOMES:
+            entry['changes'] = (entry.get('changes', []) + [now])[-HISTORY_LENGTH:]
+            entry['interval'] = self.min_interval
+        elif outcome in UNCHANGED_OUTCOMES:
+            interval = min(self.max_interval, entry.get('interval', self.min_interval) * BACKOFF_FACTOR)
+            gap = self._typical_gap(entry)
+            if gap is not None:
+                interval = min(interval, max(self.min_interval, gap / 2))
+            entry['interval'] = interval
+        else:
+            # Failed, skipped or deferred: nothing was learned, so check again on the next run.
+            entry['next_check'] = now
+            return
+        entry['last_checked'] = now
+        entry['next_check'] = now + entry['interval']
+
+    def save(self, path=None, urls=None):
+        """Writes the entries of `urls` (the current URL list, so removed pages are pruned), or every entry."""
+        path = path or self.path
+        entries = self.entries if urls is None else {url: self.entries[url] for url in urls if url in self.entries}
+        write_json_atomically(path, entries, sort_keys=True)
@@ -0,0 +1,343 @@
+"""Extraction for farsroid.com download pages.
+
+Registered in scrapers.py for farsroid.com. Given a parsed page, it builds one
+record per download link (app name, version, variant, tracking id, suggested
+filename) and returns those newer than the tracker.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, unquote
+
+import variant_matcher
+import version_utils
+from version_utils import compare_versions_batch, extract_version_from_text_or_url
+from variant_matcher import detect_link_variants, strip_variant_keywords
+
+VERSION_PATTERNS_FOR_CLEANING = [
+    r'\s*[vV]?\d+(?:\.\d+){1,3}(?:(?:[-._]?[a-zA-Z0-9]+)+)?\b',
+    r'\s*[vV]?\d+(?:\.\d+){1,2}\b',
+    r'\s+\d+(?:\.\d+)*\b' 
+]
+
+_VERSION_CLEANING_RES = [re.compile(pattern, re.IGNORECASE) for pattern in VERSION_PATTERNS_FOR_CLEANING]
+_WHITESPACE_RE = re.compile(r'\s+')
+_LINK_TEXT_NOISE_RE = re.compile(r'\b(?:با لینک مستقیم|مگابایت|\d+)\b', re.IGNORECASE)
+
+# Layout of the per-page link state kept in link_fingerprints.json; bump it when the layout changes.
+LINK_STATE_VERSION = 1
+
+
+def _extraction_code_digest():
+    # Stored link records are only valid for the code that built them (version extraction, variant
+    # detection, tracking ids, filenames), so any change to these modules invalidates them.
+    digest = hashlib.sha1()
+    for module_file in (__file__, version_utils.__file__, variant_matcher.__file__):
+        with open(module_file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+LINK_STATE_FORMAT = f"{LINK_STATE_VERSION}-{_extraction_code_digest()}"
+
+
+def sanitize_text_for_tracking_id(text): # Simplified sanitize for tracking ID parts
+    if not text: return ""
+    text_cleaned = text.strip().lower()
+    text_cleaned = text_cleaned.replace('–', '-').replace('—', '-')
+    text_cleaned = re.sub(r'[^a-z0-9-_]', '', text_cleaned) # Keep only alphanumeric, dash, underscore
+    text_cleaned = re.sub(r'[-_]+', '_', text_cleaned) # Consolidate dash/underscore to single underscore
+    text_cleaned = text_cleaned.strip('_')
+    return text_cleaned
+
+
+def aggressively_clean_name_for_tracking(name_to_clean):
+    """Aggressively cleans a name for tracking ID purposes."""
+    cleaned_name = name_to_clean
+    
+    for pattern in _VERSION_CLEANING_RES:
+        cleaned_name = pattern.sub('', cleaned_name).strip("-_ ")
+        cleaned_name = _WHITESPACE_RE.sub(' ', cleaned_name).strip("-_ ")
+
+    # All variant keywords are removed in one precompiled pass (see variant_matcher).
+    cleaned_name = strip_variant_keywords(cleaned_name)
+
+    cleaned_name = re.sub(r'\s*\((?:www\.)?farsroid\.com.*?\)\s*$', '', cleaned_name, flags=re.IGNORECASE).strip()
+    cleaned_name = re.sub(r'\s*[-–—]\s*Farsroid\s*$', '', cleaned_name, flags=re.IGNORECASE).strip()
+    cleaned_name = cleaned_name.strip(' -–—') 
+    cleaned_name = re.sub(r'\s+', ' ', cleaned_name).strip()
+    if not cleaned_name: 
+        name_parts = name_to_clean.split()
+        if name_parts: cleaned_name = name_parts[0] 
+    return cleaned_name
+
+
+def extract_app_name_from_page(soup, page_url):
+    """Extracts app name from H1/Title, performs light cleaning (versions at end, site tags)."""
+    app_name_candidate = None
+    h1_tag = soup.find('h1', class_=re.compile(r'title', re.IGNORECASE))
+    if h1_tag and h1_tag.text.strip():
+        app_name_candidate = h1_tag.text.strip()
+    
+    if not app_name_candidate:
+        title_tag = soup.find('title')
+        if title_tag and title_tag.text.strip():
+            app_name_candidate = title_tag.text.strip()
+            app_name_candidate = re.sub(r'\s*[-|–—]\s*(?:فارسروید|دانلود.*)$', '', app_name_candidate, flags=re.IGNORECASE).strip()
+            app_name_candidate = re.sub(r'\s*–\s*اپلیکیشن.*$', '', app_name_candidate, flags=re.IGNORECASE).strip()
+
+    if app_name_candidate:
+        original_name = app_name_candidate 
+        if app_name_candidate.lower().startswith("دانلود "):
+            app_name_candidate = app_name_candidate[len("دانلود "):].strip()
+        
+        page_name_for_display = app_name_candidate # Keep it richer for display
+        
+        # Lightly clean for display (remove Farsroid tags, maybe trailing versions)
+        page_name_for_display = re.sub(r'\s*\((?:www\.)?farsroid\.com.*?\)\s*$', '', page_name_for_display, flags=re.IGNORECASE).strip()
+        for pattern in VERSION_PATTERNS_FOR_CLEANING: # Remove versions if they are at the very end
+            page_name_for_display = re.sub(pattern + r'$', '', page_name_for_display, flags=re.IGNORECASE).strip("-_ ")
+
+        page_name_for_display = page_name_for_display.strip(' -–—')
+        page_name_for_display = re.sub(r'\s+', ' ', page_name_for_display).strip()
+
+
+        if page_name_for_display:
+            logging.info(f"نام برنامه از H1/Title (اصلی: '{original_name}', برای نمایش: '{page_name_for_display}')")
+            return page_name_for_display
+    
+    # Fallback to URL if H1/Title fails (less aggressive cleaning here)
+    logging.info(f"نام برنامه از H1/Title استخراج نشد، تلاش برای استخراج از URL: {page_url}")
+    parsed_url = urlparse(page_url)
+    path_parts = [part for part in unquote(parsed_url.path).split('/') if part]
+    if path_parts:
+        guessed_name = path_parts[-1]
+        # Remove extension
+        known_extensions_regex = r'\.(apk|zip|exe|rar|xapk|apks|msi|dmg|pkg|deb|rpm|appimage|tar\.gz|tgz|tar\.bz2|tbz2|tar\.xz|txz|7z|gz|bz2|xz|jpg|jpeg|png|gif|bmp|tiff|tif|webp|svg|ico|mp3|wav|ogg|aac|flac|m4a|wma|mp4|mkv|avi|mov|wmv|flv|webm|mpeg|mpg|txt|pdf|doc|docx|xls|xlsx|ppt|pptx|odt|ods|odp|rtf|csv|html|htm|xml|json|md|ttf|otf|woff|woff2|eot)$'
+        guessed_name = re.sub(known_extensions_regex, '', guessed_name, flags=re.IGNORECASE)
+        # Remove versions
+        for pattern in VERSION_PATTERNS_FOR_CLEANING:
+            guessed_name = re.sub(pattern, '', guessed_name, flags=re.IGNORECASE).strip("-_ ")
+        # Remove only very generic URL terms
+        generic_url_terms = r'\b(دانلود|Download|برنامه|App|Apk|Farsroid|Android)\b'
+        guessed_name = re.sub(generic_url_terms, '', guessed_name, flags=re.IGNORECASE).strip("-_ ")
+        # Capitalize and join
+        guessed_name = ' '.join(word.capitalize() for word in re.split(r'[-_]+', guessed_name) if word)
+        guessed_name = re.sub(r'\s+', ' ', guessed_name).strip()
+        if guessed_name:
+            logging.info(f"نام حدس زده شده از URL (پاکسازی شده): {guessed_name}")
+            return guessed_name
+            
+    logging.warning(f"نام برنامه از هیچ منبعی استخراج نشد. URL: {page_url}")
+    return "UnknownApp"
+
+
+def get_file_extension_from_url(download_url, combined_text_for_variant):
+    parsed_url_path = urlparse(download_url).path
+    raw_filename_from_url = os.path.basename(parsed_url_path)
+    
+    double_extensions = [".tar.gz", ".tar.bz2", ".tar.xz"]
+    for de in double_extensions:
+        if raw_filename_from_url.lower().endswith(de): return de
+
+    _, ext_from_url = os.path.splitext(raw_filename_from_url)
+    
+    known_extensions = [
+        '.apk', '.zip', '.exe', '.rar', '.xapk', '.apks', '.7z', '.gz', '.bz2', '.xz',
+        '.msi', '.dmg', '.pkg', '.deb', '.rpm', '.appimage',
+        '.tgz', '.tbz2', '.txz', 
+        '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.webp', '.svg', '.ico',
+        '.mp3', '.wav', '.ogg', '.aac', '.flac', '.m4a', '.wma',
+        '.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mpeg', '.mpg',
+        '.txt', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', 
+        '.odt', '.ods', '.odp', '.rtf', '.csv', '.html', '.htm', '.xml', '.json', '.md',
+        '.ttf', '.otf', '.woff', '.woff2', '.eot'
+    ]
+    
+    if ext_from_url and ext_from_url.lower() in known_extensions:
+        return ext_from_url.lower()
+    else:
+        # Guess based on variant text if primary extension detection fails
+        combined_text_for_variant_lower = combined_text_for_variant.lower()
+        if "windows" in combined_text_for_variant_lower or "pc" in combined_text_for_variant_lower : return ".exe" 
+        if "macos" in combined_text_for_variant_lower or "mac" in combined_text_for_variant_lower: return ".dmg"
+        if "linux" in combined_text_for_variant_lower : return ".appimage" 
+        if "data" in combined_text_for_variant_lower or "obb" in combined_text_for_variant_lower : return ".zip" 
+        if "font" in combined_text_for_variant_lower: return ".zip" 
+        if ext_from_url: return ext_from_url.lower() # Return original if still unknown but present
+        return ".bin" # Default fallback
+
+
+def normalize_download_url(download_url):
+    """A download link's absolute URL without fragment and with scheme and host lowercased."""
+    parts = urlsplit(download_url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+
+def link_fingerprint(download_url, link_text):
+    normalized = normalize_download_url(download_url) + "\n" + _WHITESPACE_RE.sub(' ', link_text).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def _download_link_items(soup):
+    download_box = soup.find('section', class_='downloadbox')
+    if not download_box: return []
+    download_links_ul = download_box.find('ul', class_='download-links')
+    if not download_links_ul: return []
+    return download_links_ul.find_all('li', class_='download-link')
+
+
+def build_link_record(page_url, download_url, link_text, page_app_name_for_display, base_app_name_for_tracking_id):
+    """The update record of one download link, or None if it has no recognizable version."""
+    filename_from_url_decoded = unquote(urlparse(download_url).path.split('/')[-1])
+    current_version = extract_version_from_text_or_url(link_text, filename_from_url_decoded)
+
+    if not current_version:
+        logging.warning(f"  نسخه استخراج نشد.")
+        return None
+    logging.debug(f"  نسخه: {current_version}")
+
+    # --- تشخیص نوع (Variant) فقط از لینک دانلود ---
+    # Prepare a combined text from link and filename for robust variant detection
+    combined_text_for_link_variant_detection = (filename_from_url_decoded.lower() + " " + link_text.lower()).replace('(farsroid.com)', '').replace('دانلود فایل نصبی', '').replace('برنامه با لینک مستقیم', '').strip()
+    combined_text_for_link_variant_detection = _LINK_TEXT_NOISE_RE.sub('', combined_text_for_link_variant_detection).strip()
+    
+    link_only_variant_parts = detect_link_variants(combined_text_for_link_variant_detection)
+    
+    file_extension = get_file_extension_from_url(download_url, combined_text_for_link_variant_detection)
+    logging.debug(f"  پسوند فایل: {file_extension}")
+    
+    if file_extension == ".exe":
+        if "PC" in link_only_variant_parts:
+            link_only_variant_parts.remove("PC")
+        if "Windows" not in link_only_variant_parts:
+            link_only_variant_parts.append("Windows")
+    
+    arch_found_in_link_variants = any(arch_kw in link_only_variant_parts for arch_kw in ["Arm64-v8a", "Armeabi-v7a", "x86_64", "x86", "Arm"])
+    
+    temp_display_variants = sorted(list(set(link_only_variant_parts))) 
+    variant_final_for_display_tracking = "-".join(temp_display_variants) if temp_display_variants else ""
+    
+    if not variant_final_for_display_tracking:
+        if file_extension == ".apk" and not arch_found_in_link_variants : variant_final_for_display_tracking = "Universal"
+        elif file_extension == ".exe": variant_final_for_display_tracking = "Windows"
+        # Add more defaults based on extension if needed
+        else: variant_final_for_display_tracking = "Default" # Fallback for JSON/tracking
+    
+    logging.debug(f"  نوع نهایی برای نمایش/ردیابی: '{variant_final_for_display_tracking}'")
+
+    tracking_id_app_part = sanitize_text_for_tracking_id(base_app_name_for_tracking_id)
+    tracking_id_variant_part = sanitize_text_for_tracking_id(variant_final_for_display_tracking)
+    tracking_id = f"{tracking_id_app_part}_{tracking_id_variant_part}".lower()
+    tracking_id = re.sub(r'_+', '_', tracking_id).strip('_')
+    # Refine tracking_id: remove generic suffixes if not an APK or if they are redundant
+    if tracking_id.endswith(("_default", "_archive", "_image", "_audio", "_video", "_document", "_font")) and file_extension != ".apk":
+        tracking_id = tracking_id.rsplit('_', 1)[0]
+    elif tracking_id.endswith('_universal') and file_extension != ".apk":
+        tracking_id = tracking_id[:-len('_universal')]
+    
+    if not tracking_id_app_part and tracking_id_variant_part: # If app name was empty, use variant as base
+        tracking_id = tracking_id_variant_part
+    elif not tracking_id_variant_part and tracking_id_app_part: # If variant was empty, use app name as base
+        tracking_id = tracking_id_app_part
+    elif not tracking_id_app_part and not tracking_id_variant_part:
+        tracking_id = "unknown_app_variant" # Absolute fallback
+
+    logging.debug(f"  شناسه ردیابی: {tracking_id}")
+    
+    # --- ساخت نام فایل پیشنهادی (رویکرد جدید و ساده‌تر) ---
+    suggested_filename = filename_from_url_decoded
+    # فقط پسوند سایت را حذف کن
+    site_suffix_pattern = r'\s*\((?:www\.)?farsroid\.com.*?\)\s*'
+    suggested_filename = re.sub(site_suffix_pattern, '', suggested_filename, flags=re.IGNORECASE).strip()
+    # اطمینان از اینکه پسوند فایل حفظ شده
+    if not os.path.splitext(suggested_filename)[1]: # اگر پسوند ندارد
+        base_name_no_ext = os.path.splitext(filename_from_url_decoded)[0]
+        base_name_no_ext_cleaned = re.sub(site_suffix_pattern, '', base_name_no_ext, flags=re.IGNORECASE).strip()
+        suggested_filename = base_name_no_ext_cleaned + file_extension
+
+    logging.debug(f"  نام فایل پیشنهادی (ساده شده): {suggested_filename}")
+    
+    return {
+        "app_name": page_app_name_for_display, # Use the richer name for display
+        "version": current_version,
+        "variant": variant_final_for_display_tracking, 
+        "download_url": download_url,
+        "page_url": page_url,
+        "tracking_id": tracking_id,
+        "suggested_filename": suggested_filename,
+        "current_version_for_tracking": current_version # Store the version used for comparison
+    }
+
+
+def scrape_farsroid_page(page_url, soup, tracker_data, timings=None, fingerprints=None):
+    # timings, if given, receives the seconds spent in the version comparison under "compare".
+    # fingerprints, if given, is this page's state from the last run ({} the first time) and is replaced in place
+    # with this run's: per link fingerprint (normalized href + link text) the link's record and its verdict against
+    # the tracker version it was compared with. Links whose fingerprint is known skip variant detection and filename
+    # building; their verdict is reused while the tracker still holds that version. A state written by other
+    # extraction code (see LINK_STATE_FORMAT) is ignored.
+    page_app_name_for_display = extract_app_name_from_page(soup, page_url) 
+    logging.info(f"پردازش صفحه: {page_url} (نام برنامه از صفحه برای نمایش: '{page_app_name_for_display}')")
+
+    links = []
+    for li in _download_link_items(soup):
+        link_tag = li.find('a', class_='download-btn')
+        if not link_tag or not link_tag.get('href'): continue
+        link_text_span = link_tag.find('span', class_='txt')
+        link_text = link_text_span.text.strip() if link_text_span else ""
+        download_url = urljoin(page_url, link_tag['href'])
+        links.append((download_url, link_text, link_fingerprint(download_url, link_text)))
+    if not links:
+        if fingerprints is not None: fingerprints.clear()
+        return []
+
+    previous = dict(fingerprints or {})
+    if previous and previous.get('format') != LINK_STATE_FORMAT:
+        logging.info(f"اثر انگشت لینک های {page_url} با کد استخراج دیگری ساخته شده است. همه لینک ها دوباره پردازش می شوند.")
+        previous = {}
+    # Records embed the app name, so they are only reused while it is unchanged.
+    known_links = previous.get('links', {}) if previous.get('app_name') == page_app_name_for_display else {}
+    logging.info(f"تعداد {len(links)} لینک دانلود پیدا شد ({sum(fingerprint in known_links for _, _, fingerprint in links)} لینک بدون تغییر).")
+
+    base_app_name_for_tracking_id = None
+    link_states = {}
+    for download_url, link_text, fingerprint in links:
+        if fingerprint in link_states: continue
+        state = dict(known_links[fingerprint]) if fingerprint in known_links else None
+        if state is None:
+            if base_app_name_for_tracking_id is None:
+                # For tracking ID, use an aggressively cleaned name to ensure stability
+                base_app_name_for_tracking_id = aggressively_clean_name_for_tracking(page_app_name_for_display) or "UnknownApp"
+                logging.info(f"  نام پایه برای شناسه ردیابی: '{base_app_name_for_tracking_id}'")
+            logging.debug(f"  URL: {download_url}, متن لینک: {link_text}")
+            state = {"record": build_link_record(page_url, download_url, link_text, page_app_name_for_display, base_app_name_for_tracking_id)}
+        link_states[fingerprint] = state
+
+    # Links not judged yet, or whose tracker version moved since, are compared against the tracker in one batch.
+    to_compare = [state for state in link_states.values()
+                  if state["record"] is not None and ("newer" not in state or state.get("tracker_version") != tracker_data.get(state["record"]["tracking_id"]))]
+    compare_start = time.perf_counter()
+    last_known_versions = [tracker_data.get(state["record"]["tracking_id"], "0.0.0") for state in to_compare]
+    newer_flags = compare_versions_batch((state["record"]["version"], last_known) for state, last_known in zip(to_compare, last_known_versions))
+    if timings is not None: timings['compare'] = time.perf_counter() - compare_start
+    for state, last_known_version, is_newer in zip(to_compare, last_known_versions, newer_flags):
+        state["tracker_version"] = tracker_data.get(state["record"]["tracking_id"])
+        state["newer"] = is_newer
+        if not is_newer:
+            logging.debug(f"    => {state['record']['tracking_id']} به‌روز است (فعلی: {state['record']['version']}, قبلی: {last_known_version}).")
+    if not to_compare and all(fingerprint in known_links for fingerprint in link_states):
+        logging.info(f"لینک های دانلود {page_url} از آخرین بررسی تغییری نکرده اند. پردازش لینک ها رد شد.")
+
+    updates_found_on_page = []
+    for _, _, fingerprint in links:
+        state = link_states[fingerprint]
+        if state["record"] is not None and state["newer"]:
+            logging.info(f"    => آپدیت جدید برای {state['record']['tracking_id']}: {state['record']['version']} (قبلی: {state['tracker_version'] or '0.0.0'})")
+            updates_found_on_page.append(dict(state["record"]))
+    if fingerprints is not None:
+        fingerprints.clear()
+        fingerprints.update({"format": LINK_STATE_FORMAT, "app_name": page_app_name_for_display, "links": link_states})
+    return updates_found_on_page
@@ -0,0 +1,117 @@
+"""Retries, rate limiting and circuit breaking for page fetches.
+
+The fetch layer raises TransientFetchError for failures worth retrying
+(connection errors, timeouts, 429 and 5xx answers, a browser that crashed);
+anything else (e.g. a 404) is a final answer. A retried page goes back into
+the run's retry queue instead of blocking a worker:
+
+  - RetryPolicy spaces attempts with "full jitter" exponential backoff,
+    random(0, min(max_delay, base_delay * 2**(attempt - 1))), and never retries
+    sooner than a Retry-After header asked for. A Retry-After longer than
+    max_delay is left for the next run.
+  - TokenBucket limits the rate of requests per host (`rate` per second, with
+    bursts of up to `capacity`).
+  - CircuitBreaker stops requests to a host after `failure_threshold`
+    consecutive transient failures. After `reset_timeout` seconds requests are
+    let through again; the next failure reopens it, a success closes it.
+"""
+import email.utils
+import random
+import time
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 120.0
+
+
+class TransientFetchError(Exception):
+    """A fetch failed in a way that may succeed if tried again later."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after # seconds the server asked us to wait, if it said so
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, retry_at.timestamp() - now)
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = max(0.0, base_delay)
+        self.max_delay = max(self.base_delay, max_delay)
+
+    def retry_delay(self, attempt, retry_after=None):
+        """Seconds to wait before attempt `attempt + 1`, or None when the page should not be retried in this run."""
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None and retry_after > self.max_delay:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(delay, retry_after or 0.0)
+
+
+class TokenBucket:
+    """Not thread-safe on its own; HostLimiter calls it under its lock."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate # tokens per second; 0 means unlimited
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def reserve(self, now=None):
+        """Takes a token and returns how many seconds the caller has to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """Not thread-safe on its own; HostLimiter calls it under its lock."""
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def blocked_for(self, now=None):
+        """Seconds until requests may be sent again; 0 when the circuit is closed or ready for a trial request."""
+        if self.opened_at is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.opened_at + self.reset_timeout - now)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, now=None):
+        """Returns True when this failure opened (or reopened) the circuit."""
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic() if now is None else now
+            return True
+        return False
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from atomic_files import write_json_atomically
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_AGE_DAYS = 14
+PENDING_FILE_SUFFIX = ".pending"
+
+# Only these parts of a page feed the scrapers, so only they are hashed. Counters,
+# nonces and ads elsewhere on the page would otherwise change the hash every day.
+_RELEVANT_FRAGMENT_PATTERNS = [
+    re.compile(r'<title\b[^>]*>.*?</title>', re.IGNORECASE | re.DOTALL),
+    re.compile(r'<h1\b[^>]*>.*?</h1>', re.IGNORECASE | re.DOTALL),
+    re.compile(r'<section\b[^>]*class=["\'][^"\']*\bdownloadbox\b.*?</section>', re.IGNORECASE | re.DOTALL),
+]
+
+
+def pending_path(path):
+    """page_cache.json -> page_cache.pending.json, where entries wait for their page's updates to be published."""
+    base, extension = os.path.splitext(path)
+    return base + PENDING_FILE_SUFFIX + extension
+
+
+def content_hash(page_content):
+    """SHA-256 of the scraped parts of a page, or of the whole page if none of them are found."""
+    fragments = [m.group(0) for pattern in _RELEVANT_FRAGMENT_PATTERNS for m in pattern.finditer(page_content)]
+    relevant = "\n".join(fragments) if fragments else page_content
+    return hashlib.sha256(relevant.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """Per-URL HTTP validators and content hashes from the last successful scrape.
+
+    Entries are keyed by page URL and hold `etag`, `last_modified`, `content_hash`,
+    `stored_at` (last full scrape) and `checked_at` (last time the page was seen).
+    Entries older than `max_age_days` are dropped so every page is fully re-scraped
+    now and then; beyond `max_entries` the least recently checked ones go first.
+
+    A page whose scrape found updates is committed as pending: its entry is kept
+    out of the cache and saved apart (save_pending()), and release_publisher.py
+    stores it once the page's updates are published. Until then the page is
+    scraped in full on every run, so an update that failed to publish is found again.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_age_days=DEFAULT_MAX_AGE_DAYS, enabled=True):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.enabled = enabled
+        self._entries = {}
+        self._pending_validators = {}
+        self._pending_entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logging.warning(f"کش صفحات {self.path} قابل خواندن نیست ({e}). با کش خالی شروع می شود.")
+            self._entries = {}
+        self._evict(time.time())
+        logging.info(f"کش صفحات با {len(self._entries)} ورودی بارگذاری شد.")
+        return self
+
+    def _evict(self, now):
+        expired = [url for url, entry in self._entries.items() if now - entry.get('stored_at', 0) > self.max_age_seconds]
+        for url in expired:
+            del self._entries[url]
+        if len(self._entries) > self.max_entries:
+            by_last_check = sorted(self._entries, key=lambda url: self._entries[url].get('checked_at', 0))
+            for url in by_last_check[:len(self._entries) - self.max_entries]:
+                del self._entries[url]
+
+    def conditional_headers(self, url):
+        if not self.enabled:
+            return {}
+        with self._lock:
+            entry = self._entries.get(url)
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def note_validators(self, url, etag, last_modified):
+        # Held back until commit() so that a page whose scrape failed is never answered with a 304 later.
+        with self._lock:
+            self._pending_validators[url] = (etag, last_modified)
+
+    def discard_validators(self, url):
+        """Drops the validators noted for `url`, e.g. when the page is scraped from another response."""
+        with self._lock:
+            self._pending_validators.pop(url, None)
+
+    def mark_checked(self, url):
+        with self._lock:
+            if url in self._entries:
+                self._entries[url]['checked_at'] = time.time()
+            self.hits += 1
+
+    def is_unchanged(self, url, page_hash):
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._entries.get(url)
+        return bool(entry) and entry.get('content_hash') == page_hash
+
+    def commit(self, url, page_hash, pending=False):
+        """Stores the page's entry; with `pending`, only in the pending entries (and drops the cached one)."""
+        now = time.time()
+        with self._lock:
+            etag, last_modified = self._pending_validators.pop(url, (None, None))
+            entry = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'content_hash': page_hash,
+                'stored_at': now,
+                'checked_at': now,
+            }
+            if pending:
+                self._entries.pop(url, None)
+                self._pending_entries[url] = entry
+            else:
+                self._pending_entries.pop(url, None)
+                self._entries[url] = entry
+
+    def store(self, entries):
+        """Adds entries saved by save_pending(), e.g. those of pages whose updates have been published."""
+        with self._lock:
+            self._entries.update(entries)
+
+    def save(self, path=None):
+        """Writes the cache to `path` (default: where it was loaded from), atomically."""
+        path = path or self.path
+        with self._lock:
+            self._evict(time.time())
+            write_json_atomically(path, self._entries, sort_keys=True)
+
+    def save_pending(self, path=None):
+        """Writes the pending entries to `path` (default: pending_path() of the cache), atomically."""
+        with self._lock:
+            write_json_atomically(path or pending_path(self.path), self._pending_entries, sort_keys=True)
@@ -0,0 +1,309 @@
+"""Publishes the assets of a download manifest as one GitHub release.
+
+    python scripts/release_publisher.py --manifest download_manifest.json --release-tag TAG --title TITLE
+
+The release is created as a draft, its assets are uploaded in parallel (at
+most --workers at a time) and every asset is retried on its own with
+jittered exponential backoff (see fetch_resilience.RetryPolicy). Once the
+uploads are done the draft is published with release notes built from the
+update records of the assets that made it, plus the updates whose file was
+already published (the manifest's "linked" list). If no asset made it, the
+draft is deleted.
+
+Afterwards, in one batch each: the tracker records the published and linked
+updates, asset_index.json the uploaded files, and the page cache stores the
+pending entries (page_cache.pending.json, written by the checker) of the pages
+whose updates all made it. A page with a failed asset, or any page at all when
+the release could not be made, stays out of the page cache, so the next run
+scrapes it in full and finds its updates again. The manifest is rewritten with
+failed uploads moved from "downloaded" to "failed".
+
+The client talks to --api-url (GITHUB_API_URL, by default api.github.com) and
+uploads to whatever upload_url the created release reports, so a local
+server implementing the same endpoints can stand in for GitHub.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from asset_downloader import ASSET_INDEX_FILE, MANIFEST_FILE, AssetIndex, record_release
+from atomic_files import write_json_atomically
+from fetch_resilience import RETRYABLE_STATUS_CODES, RetryPolicy, parse_retry_after
+from page_cache import PageCache, pending_path
+from run_metrics import RunMetrics, merge_into_report
+from tracker_store import TRACKING_FILE, TrackerStore, commit_manifest
+
+API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+SERVER_URL = os.getenv('GITHUB_SERVER_URL', 'https://github.com')
+REPOSITORY = os.getenv('GITHUB_REPOSITORY', '')
+GITHUB_TOKEN = os.getenv('GH_TOKEN') or os.getenv('GITHUB_TOKEN')
+GITHUB_OUTPUT_FILE = os.getenv('GITHUB_OUTPUT', 'local_github_output.txt')
+PAGE_CACHE_FILE = "page_cache.json"
+UPLOAD_TIMEOUT = (15, 300)
+API_TIMEOUT = 30
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+class ReleaseAPIError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        # No status means the request never got an answer (connection error, timeout).
+        return self.status is None or self.status in RETRYABLE_STATUS_CODES or self.retry_after is not None
+
+
+class GitHubReleases:
+    """The handful of REST endpoints the publisher needs."""
+
+    def __init__(self, repository, token=None, api_url=API_URL, pool_size=4):
+        self.repository = repository
+        self.api_url = api_url.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/vnd.github+json', 'X-GitHub-Api-Version': '2022-11-28'})
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def _request(self, method, url, expected=(200, 201, 204), **kwargs):
+        kwargs.setdefault('timeout', API_TIMEOUT)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ReleaseAPIError(str(e)) from e
+        if response.status_code not in expected:
+            raise ReleaseAPIError(f"{method} {url}: HTTP {response.status_code} {response.text[:200]}", response.status_code,
+                                  parse_retry_after(response.headers.get('Retry-After')))
+        return response.json() if response.content else None
+
+    def _release_url(self, *parts):
+        return '/'.join([f"{self.api_url}/repos/{self.repository}/releases"] + [str(part) for part in parts])
+
+    def create_release(self, tag, name, body, draft=True):
+        return self._request('POST', self._release_url(), json={'tag_name': tag, 'name': name, 'body': body, 'draft': draft})
+
+    def update_release(self, release, **fields):
+        return self._request('PATCH', self._release_url(release['id']), json=fields)
+
+    def delete_release(self, release):
+        self._request('DELETE', self._release_url(release['id']))
+
+    def list_assets(self, release):
+        return self._request('GET', self._release_url(release['id'], 'assets'), params={'per_page': 100})
+
+    def delete_asset(self, asset_id):
+        self._request('DELETE', self._release_url('assets', asset_id))
+
+    def upload_asset(self, release, path, name):
+        upload_url = release['upload_url'].split('{', 1)[0]
+        with open(path, 'rb') as f:
+            return self._request('POST', upload_url, expected=(201,), params={'name': name}, data=f, timeout=UPLOAD_TIMEOUT,
+                                 headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(os.path.getsize(path))})
+
+
+def call_with_retries(retry_policy, description, func, *args, **kwargs):
+    """Calls `func`, retrying transient ReleaseAPIErrors per `retry_policy`; the last error is raised."""
+    attempt = 1
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except ReleaseAPIError as e:
+            delay = retry_policy.retry_delay(attempt, e.retry_after) if e.retryable else None
+            if delay is None:
+                raise
+            logging.warning(f"  {description} ناموفق بود ({e}). تلاش {attempt + 1} از {retry_policy.max_attempts} در {delay:.1f} ثانیه دیگر.")
+            time.sleep(delay)
+            attempt += 1
+
+
+def upload_replacing_stale(client, release, path, name):
+    try:
+        return client.upload_asset(release, path, name)
+    except ReleaseAPIError as e:
+        if e.status != 422:
+            raise
+        # An interrupted upload can leave a broken asset of the same name behind; it has to go before a retry.
+        stale = [asset for asset in client.list_assets(release) if asset['name'] == name]
+        if not stale:
+            raise
+        for asset in stale:
+            client.delete_asset(asset['id'])
+        raise ReleaseAPIError(f"removed a stale asset named {name}", retry_after=0.0) from e
+
+
+def build_release_notes(title, manifest, repository_url):
+    lines = [f"## {title}", "", "The following applications have been updated:", ""]
+    for record in manifest.get('downloaded', []):
+        lines.append(f"* **{record['app_name']} v{record['version']} ({record['variant']})** - [Source Page]({record['page_url']})")
+    for record in manifest.get('linked', []):
+        lines.append(f"* **{record['app_name']} v{record['version']} ({record['variant']})** - [Source Page]({record['page_url']})"
+                     f" - same file as `{record['asset_name']}` in [{record['release_tag']}]({repository_url}/releases/tag/{record['release_tag']})")
+    return "\n".join(lines) + "\n"
+
+
+def publish_manifest(manifest, client, release_tag, title, repository_url, workers=4, retry_policy=None, metrics=None):
+    """Creates the release and uploads the manifest's files; returns (release or None, published manifest).
+
+    The returned manifest lists under "downloaded" only the records whose file
+    was uploaded; the others are moved to "failed" with the upload error.
+    Raises ReleaseAPIError if the release cannot be created or published; a
+    draft that was created is deleted first.
+    """
+    if retry_policy is None: retry_policy = RetryPolicy()
+    if metrics is None: metrics = RunMetrics(outcome_counter="publish.assets")
+    records = manifest.get('downloaded', [])
+    published = {"downloaded": [], "linked": list(manifest.get('linked', [])), "failed": list(manifest.get('failed', []))}
+    files = {}
+    for record in records:
+        files.setdefault(record['filename'], record['path'])
+    if not files:
+        return None, published
+
+    release = call_with_retries(retry_policy, f"ساخت انتشار {release_tag}", client.create_release,
+                                release_tag, title, build_release_notes(title, manifest, repository_url), draft=True)
+    logging.info(f"انتشار پیش نویس {release_tag} ساخته شد. آپلود {len(files)} فایل با {workers} اتصال همزمان...")
+
+    def upload(filename):
+        started = time.perf_counter()
+        try:
+            call_with_retries(retry_policy, f"آپلود {filename}", upload_replacing_stale, client, release, files[filename], filename)
+        except ReleaseAPIError as e:
+            logging.error(f"  آپلود {filename} ناموفق بود: {e}")
+            metrics.observe("upload", time.perf_counter() - started, filename)
+            metrics.set_outcome(filename, "failed")
+            return filename, str(e)
+        size = os.path.getsize(files[filename])
+        metrics.observe("upload", time.perf_counter() - started, filename)
+        metrics.increment("upload.bytes", size, filename)
+        metrics.set_outcome(filename, "uploaded")
+        logging.info(f"  آپلود {filename} کامل شد ({size / 1024 / 1024:.1f}MB).")
+        return filename, None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        errors = dict(executor.map(upload, list(files)))
+
+    for record in records:
+        error = errors[record['filename']]
+        if error is None:
+            published["downloaded"].append(record)
+        else:
+            published["failed"].append(dict(record, error=f"upload failed: {error}"))
+
+    if not published["downloaded"]:
+        logging.error(f"هیچ فایلی در {release_tag} آپلود نشد. پیش نویس حذف می شود.")
+        call_with_retries(retry_policy, f"حذف پیش نویس {release_tag}", client.delete_release, release)
+        return None, published
+    try:
+        release = call_with_retries(retry_policy, f"انتشار {release_tag}", client.update_release,
+                                    release, body=build_release_notes(title, published, repository_url), draft=False)
+    except ReleaseAPIError:
+        # Nothing is recorded for an unpublished release, so its draft and uploads would only be left behind.
+        logging.error(f"انتشار {release_tag} ناموفق بود. پیش نویس و فایل های آن حذف می شوند.")
+        try:
+            call_with_retries(retry_policy, f"حذف پیش نویس {release_tag}", client.delete_release, release)
+        except ReleaseAPIError as e:
+            logging.error(f"حذف پیش نویس {release_tag} ناموفق بود: {e}")
+        raise
+    return release, published
+
+
+def record_published(published, release_tag, tracking_file=TRACKING_FILE, asset_index_file=ASSET_INDEX_FILE, page_cache_file=PAGE_CACHE_FILE,
+                     pending_page_cache_file=None):
+    """One tracker batch for what was published, the uploaded files in the asset index, and page cache entries for
+    the pages whose updates all made it. Returns (tracker entries committed, pages left to be scraped again)."""
+    count = commit_manifest(TrackerStore(tracking_file).load(), published, release_tag)
+    asset_index = AssetIndex(asset_index_file).load()
+    record_release(published, release_tag or "", asset_index)
+    asset_index.save()
+    failed_pages = {record['page_url'] for record in published.get('failed', []) if record.get('page_url')}
+    published_pages = {record['page_url'] for record in published.get('downloaded', []) + published.get('linked', [])} - failed_pages
+    pending_page_cache_file = pending_page_cache_file or pending_path(page_cache_file)
+    try:
+        with open(pending_page_cache_file, 'r', encoding='utf-8') as f:
+            pending = json.load(f)
+    except FileNotFoundError:
+        pending = {}
+    ready = {url: entry for url, entry in pending.items() if url in published_pages}
+    if ready:
+        page_cache = PageCache(page_cache_file).load()
+        page_cache.store(ready)
+        page_cache.save()
+    return count, failed_pages
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Publish the assets of a download manifest as a GitHub release.")
+    parser.add_argument('--manifest', default=MANIFEST_FILE)
+    parser.add_argument('--release-tag', required=True)
+    parser.add_argument('--title', help="Release title (default: the tag).")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent uploads.")
+    parser.add_argument('--max-attempts', type=int, default=3, help="Attempts per asset for transient failures.")
+    parser.add_argument('--backoff', type=float, default=2.0, help="Backoff base in seconds (jittered, doubled after every retry).")
+    parser.add_argument('--repository', default=REPOSITORY, help="owner/name (default: GITHUB_REPOSITORY).")
+    parser.add_argument('--api-url', default=API_URL, help="REST API root (default: GITHUB_API_URL or api.github.com).")
+    parser.add_argument('--tracking-file', default=TRACKING_FILE)
+    parser.add_argument('--asset-index', default=ASSET_INDEX_FILE)
+    parser.add_argument('--page-cache', default=PAGE_CACHE_FILE)
+    parser.add_argument('--pending-page-cache',
+                        help="Entries of the pages with updates, written by the checker (default: page_cache.pending.json).")
+    parser.add_argument('--run-report',
+                        help="Add upload timings to this run report (written by app_updater.py).")
+    parser.add_argument('--log-level', choices=("DEBUG", "INFO", "WARNING", "ERROR"), default=os.getenv('LOG_LEVEL', 'INFO').upper())
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(args.log_level)
+    try:
+        with open(args.manifest, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.error(f"فایل مانیفست {args.manifest} قابل خواندن نیست: {e}")
+        return 1
+
+    title = args.title or args.release_tag
+    client = GitHubReleases(args.repository, GITHUB_TOKEN, args.api_url, pool_size=max(1, args.workers))
+    metrics = RunMetrics(outcome_counter="publish.assets")
+    try:
+        release, published = publish_manifest(manifest, client, args.release_tag, title, f"{SERVER_URL}/{args.repository}",
+                                              args.workers, RetryPolicy(args.max_attempts, args.backoff), metrics)
+    except ReleaseAPIError as e:
+        # The release itself could not be created (or published): nothing is recorded. The pages of these updates
+        # are not in the page cache (their entries stay pending), so the next run scrapes them and tries again.
+        logging.error(f"ساخت انتشار {args.release_tag} ناموفق بود: {e}. فایل ردیاب بروزرسانی نمی شود.")
+        return 1
+    write_json_atomically(args.manifest, published)
+
+    count, failed_pages = record_published(published, args.release_tag if release else None, args.tracking_file, args.asset_index,
+                                           args.page_cache, args.pending_page_cache)
+    if args.run_report:
+        try:
+            merge_into_report(args.run_report, "publish", metrics.report())
+        except Exception as e:
+            logging.error(f"خطا در افزودن زمان های آپلود به {args.run_report}: {e}")
+    if os.getenv('GITHUB_OUTPUT'):
+        with open(GITHUB_OUTPUT_FILE, 'a', encoding='utf-8') as gh_output:
+            gh_output.write(f"published_count={len(published['downloaded'])}\nfailed_count={len(published['failed'])}\n")
+    if release:
+        logging.info(f"انتشار {args.release_tag} منتشر شد: {release.get('html_url', '')}")
+    logging.info(f"خلاصه انتشار: {len(published['downloaded'])} آپلود، {len(published['linked'])} پیوند به فایل موجود، "
+                 f"{len(published['failed'])} ناموفق ({len(failed_pages)} صفحه در اجرای بعد دوباره بررسی می شود). {count} شناسه در {args.tracking_file} ثبت شد.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
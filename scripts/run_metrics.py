@@ -0,0 +1,177 @@
+"""Timers and counters for one checker run, per URL and per stage.
+
+Top-level stages ("host_wait", "fetch", "parse", "extract", "compare",
+"download") do not overlap; dotted ones ("fetch.static", "browser.wait", ...)
+break a top-level stage down further. Every observation is kept per URL and
+folded into per-run aggregates, so the report answers both "which stage
+dominates the run" and "which URLs are slow". A URL's total_s sums its
+top-level stages. A stage's share of the wall time can exceed 1 when it runs
+on several workers at once.
+
+report() returns a JSON-ready dict; to_prometheus() renders the same
+aggregates in the Prometheus text exposition format (e.g. for the node
+exporter's textfile collector).
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from atomic_files import write_text_atomically
+
+REPORT_VERSION = 1
+
+
+class RunMetrics:
+    def __init__(self, outcome_counter="urls"):
+        self.outcome_counter = outcome_counter # outcomes are counted as "<outcome_counter>.<outcome>"
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages = {} # stage -> {"count", "total_s", "max_s"}
+        self.counters = {} # counter -> value
+        self.urls = {} # url -> {"stages": {stage: seconds}, "counters": {counter: value}, "outcome": str}
+
+    def _url(self, url):
+        return self.urls.setdefault(url, {"stages": {}, "counters": {}, "outcome": None})
+
+    def observe(self, stage, seconds, url=None):
+        with self._lock:
+            aggregate = self.stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            aggregate["count"] += 1
+            aggregate["total_s"] += seconds
+            aggregate["max_s"] = max(aggregate["max_s"], seconds)
+            if url is not None:
+                url_stages = self._url(url)["stages"]
+                url_stages[stage] = url_stages.get(stage, 0.0) + seconds
+
+    def observe_all(self, timings, prefix="", url=None):
+        """Records a {stage: seconds} dict, e.g. the timings filled in by the fetch layer."""
+        for stage, seconds in timings.items():
+            self.observe(prefix + stage, seconds, url)
+
+    @contextmanager
+    def timer(self, stage, url=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, url)
+
+    def increment(self, counter, amount=1, url=None):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+            if url is not None:
+                url_counters = self._url(url)["counters"]
+                url_counters[counter] = url_counters.get(counter, 0) + amount
+
+    def set_outcome(self, url, outcome):
+        """Records how a URL ended (e.g. "updated", "unchanged", "failed"); also counted per run."""
+        with self._lock:
+            self._url(url)["outcome"] = outcome
+        self.increment(f"{self.outcome_counter}.{outcome}")
+
+    def outcomes(self):
+        """{url: outcome} for every URL that has one."""
+        with self._lock:
+            return {url: values["outcome"] for url, values in self.urls.items() if values["outcome"] is not None}
+
+    def report(self, slowest=10):
+        wall_seconds = time.perf_counter() - self._start
+        with self._lock:
+            stages = {
+                stage: dict(values, mean_s=values["total_s"] / values["count"], share=values["total_s"] / wall_seconds if wall_seconds else None)
+                for stage, values in sorted(self.stages.items(), key=lambda item: -item[1]["total_s"])
+            }
+            urls = {url: dict(values, total_s=sum(seconds for stage, seconds in values["stages"].items() if '.' not in stage))
+                    for url, values in self.urls.items()}
+            counters = dict(sorted(self.counters.items()))
+        return {
+            "version": REPORT_VERSION,
+            "started_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self._started_at)),
+            "wall_seconds": wall_seconds,
+            "stages": stages,
+            "counters": counters,
+            "slowest_urls": [url for url, _ in sorted(urls.items(), key=lambda item: -item[1]["total_s"])[:slowest]],
+            "urls": urls,
+        }
+
+
+def _metric_name(name):
+    return ''.join(char if char.isalnum() else '_' for char in name)
+
+
+def to_prometheus(report, prefix="app_updater"):
+    """Renders the per-run aggregates of report() (and of any merged sections) as Prometheus text."""
+    lines = [
+        f"# HELP {prefix}_run_wall_seconds Wall time of the run.",
+        f"# TYPE {prefix}_run_wall_seconds gauge",
+        f"{prefix}_run_wall_seconds {report['wall_seconds']:.6f}",
+        f"# HELP {prefix}_stage_seconds_total Time spent per stage, summed over URLs and workers.",
+        f"# TYPE {prefix}_stage_seconds_total counter",
+    ]
+    lines += [f'{prefix}_stage_seconds_total{{stage="{stage}"}} {values["total_s"]:.6f}' for stage, values in report["stages"].items()]
+    lines += [f"# HELP {prefix}_stage_count_total Observations per stage.", f"# TYPE {prefix}_stage_count_total counter"]
+    lines += [f'{prefix}_stage_count_total{{stage="{stage}"}} {values["count"]}' for stage, values in report["stages"].items()]
+    lines += [f"# HELP {prefix}_stage_max_seconds Slowest single observation per stage.", f"# TYPE {prefix}_stage_max_seconds gauge"]
+    lines += [f'{prefix}_stage_max_seconds{{stage="{stage}"}} {values["max_s"]:.6f}' for stage, values in report["stages"].items()]
+    for counter, value in report["counters"].items():
+        name = f"{prefix}_{_metric_name(counter)}_total"
+        lines += [f"# TYPE {name} counter", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(report, path, prometheus_path=None):
+    write_text_atomically(path, json.dumps(report, ensure_ascii=False, indent=2) + "\n")
+    if prometheus_path:
+        write_text_atomically(prometheus_path, to_prometheus(report))
+
+
+def merge_reports(reports):
+    """Combines the reports of jobs that ran side by side (e.g. shards) into one.
+
+    Stage times and counters add up; the wall time is the longest job's.
+    """
+    stages, counters, urls = {}, {}, {}
+    for report in reports:
+        for stage, values in report["stages"].items():
+            aggregate = stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            aggregate["count"] += values["count"]
+            aggregate["total_s"] += values["total_s"]
+            aggregate["max_s"] = max(aggregate["max_s"], values["max_s"])
+        for counter, value in report["counters"].items():
+            counters[counter] = counters.get(counter, 0) + value
+        urls.update(report.get("urls", {}))
+    wall_seconds = max((report["wall_seconds"] for report in reports), default=0.0)
+    for values in stages.values():
+        values["mean_s"] = values["total_s"] / values["count"] if values["count"] else 0.0
+        values["share"] = values["total_s"] / wall_seconds if wall_seconds else None
+    return {
+        "version": REPORT_VERSION,
+        "started_at": min((report.get("started_at") or "" for report in reports), default=None),
+        "wall_seconds": wall_seconds,
+        "jobs": len(reports),
+        "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["total_s"])),
+        "counters": dict(sorted(counters.items())),
+        "slowest_urls": [url for url, _ in sorted(urls.items(), key=lambda item: -item[1].get("total_s", 0.0))[:10]],
+        "urls": urls,
+    }
+
+
+def merge_into_report(path, section, report, prometheus_path=None):
+    """Adds `report` (e.g. from the downloader) under `section` of an existing run report.
+
+    Its stages and counters are also folded into the run-wide ones, so they
+    should be named apart from the checker's (e.g. "download", "download.bytes").
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            run_report = json.load(f)
+    except (OSError, ValueError):
+        run_report = {"version": REPORT_VERSION, "wall_seconds": 0.0, "stages": {}, "counters": {}, "urls": {}}
+    run_report[section] = report
+    run_report["wall_seconds"] += report["wall_seconds"]
+    run_report["stages"].update(report["stages"])
+    run_report["counters"].update(report["counters"])
+    write_report(run_report, path, prometheus_path)
+    return run_report
@@ -0,0 +1,95 @@
+"""Registry of per-site scrapers, keyed by hostname.
+
+Each ScraperSpec says how to fetch a site's pages (fetch strategy, readiness
+condition for the browser) and which function extracts updates from a parsed
+page. The extraction function is given as a "module:function" path and only
+imported on first use, so adding sites costs nothing at startup. Selenium and
+webdriver_manager are likewise only imported once a page actually needs a browser.
+
+To add a site, write an extractor with the signature of
+farsroid_scraper.scrape_farsroid_page(page_url, soup, tracker_data, timings=None)
+and call register_scraper() at the bottom of this file. An extractor that
+compares versions should put the seconds it spent doing so in timings['compare'].
+With link_fingerprints=True it is also given fingerprints=<the page's state
+from the last run>, a dict it replaces in place; the checker stores it in
+link_fingerprints.json next to the tracker.
+"""
+import importlib
+import re
+import threading
+from urllib.parse import urlparse
+
+from browser_pool import ReadinessCondition
+
+# Cheap checks on the raw HTML; the static fast path is only trusted when the server-rendered page already has the download box
+# with at least one link in it (an empty box is filled in by the page's scripts, see the farsroid registration below).
+DOWNLOAD_BOX_MARKERS = [
+    re.compile(r'<section\b[^>]*class=["\'][^"\']*\bdownloadbox\b', re.IGNORECASE),
+    re.compile(r'<ul\b[^>]*class=["\'][^"\']*\bdownload-links\b', re.IGNORECASE),
+    re.compile(r'<li\b[^>]*class=["\'][^"\']*\bdownload-link\b[^>]*>(?:(?!</li>).)*?<a\b[^>]*class=["\'][^"\']*\bdownload-btn\b',
+               re.IGNORECASE | re.DOTALL),
+]
+
+
+class ScraperSpec:
+    """How to fetch and extract the pages of one site."""
+
+    def __init__(self, host, extract, fetch_strategy="auto", wait_for_class=None, readiness=None,
+                 static_markers=None, scoped_parse=True, link_fingerprints=False):
+        self.host = host
+        self.extract = extract # "module:function"
+        self.fetch_strategy = fetch_strategy # "auto" | "static" | "selenium"
+        self.wait_for_class = wait_for_class # class the browser waits for before the readiness condition
+        self.readiness = readiness
+        self.static_markers = static_markers or []
+        self.scoped_parse = scoped_parse # parse only <title>, <h1> and section.downloadbox
+        self.link_fingerprints = link_fingerprints # the extractor takes fingerprints= (see above)
+        self._extract_function = None
+        self._lock = threading.Lock()
+
+    def extract_function(self):
+        with self._lock:
+            if self._extract_function is None:
+                module_name, function_name = self.extract.split(':')
+                self._extract_function = getattr(importlib.import_module(module_name), function_name)
+            return self._extract_function
+
+    def has_expected_content(self, page_content):
+        return bool(page_content) and all(marker.search(page_content) for marker in self.static_markers)
+
+
+SCRAPER_REGISTRY = {}
+
+
+def normalize_host(host):
+    host = (host or "").lower().rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+
+def register_scraper(host, extract, **options):
+    spec = ScraperSpec(normalize_host(host), extract, **options)
+    SCRAPER_REGISTRY[spec.host] = spec
+    return spec
+
+
+def get_scraper(url):
+    """Returns the ScraperSpec for the URL's host (or a parent domain of it), or None."""
+    host = normalize_host(urlparse(url).hostname)
+    while host:
+        spec = SCRAPER_REGISTRY.get(host)
+        if spec is not None:
+            return spec
+        host = host.partition('.')[2]
+    return None
+
+
+register_scraper(
+    "farsroid.com",
+    "farsroid_scraper:scrape_farsroid_page",
+    fetch_strategy="auto",
+    wait_for_class="downloadbox",
+    # Farsroid fills in the download links after the box itself appears.
+    readiness=ReadinessCondition("li.download-link a.download-btn", quiet_period=0.5, timeout=10),
+    static_markers=DOWNLOAD_BOX_MARKERS,
+    link_fingerprints=True,
+)
@@ -0,0 +1,247 @@
+"""Splitting a run across several jobs, and merging their results.
+
+Each shard checks a deterministic subset of urls_to_check.txt:
+  hash  a URL always lands in the same shard (SHA-1 of the URL, modulo the count)
+  cost  shards get roughly equal work, using each URL's time from an earlier run
+        report; URLs without a recorded time count as the median
+
+A shard writes its results next to the usual files with a ".shard-<i>" suffix
+(updates_found.shard-0.json, page_cache.shard-0.json, page_cache.pending.shard-0.json,
+run_report.shard-0.json, check_schedule.shard-0.json, link_fingerprints.shard-0.json)
+and leaves the tracker alone. The merge step combines them:
+
+    python scripts/sharding.py merge --shard-count 4
+
+writes updates_found.json, tracker_delta.json ({tracking_id: version}),
+page_cache.json, page_cache.pending.json (the entries of pages with updates, which
+release_publisher.py stores once they are published), run_report.json,
+check_schedule.json and link_fingerprints.json, and with --commit-tracker also records the
+delta in versions_tracker.json. Pages that are no longer in urls_to_check.txt are
+dropped from check_schedule.json and link_fingerprints.json. When several pages
+report the same tracking_id, the highest version wins; among equal versions, the
+page listed first in urls_to_check.txt.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+
+from atomic_files import write_json_atomically
+
+SHARD_STRATEGIES = ("hash", "cost")
+URL_FILE = "urls_to_check.txt"
+UPDATES_FILE = "updates_found.json"
+TRACKER_DELTA_FILE = "tracker_delta.json"
+PAGE_CACHE_FILE = "page_cache.json"
+PENDING_PAGE_CACHE_FILE = "page_cache.pending.json"
+RUN_REPORT_FILE = "run_report.json"
+SCHEDULE_FILE = "check_schedule.json"
+LINK_FINGERPRINTS_FILE = "link_fingerprints.json"
+TRACKING_FILE = "versions_tracker.json"
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def shard_path(path, shard_index):
+    """updates_found.json -> updates_found.shard-2.json"""
+    base, extension = os.path.splitext(path)
+    return f"{base}.shard-{shard_index}{extension}"
+
+
+def read_url_file(url_file=URL_FILE):
+    with open(url_file, 'r', encoding='utf-8') as f:
+        return [line.strip().lstrip('\ufeff') for line in f if line.strip() and not line.startswith('#')]
+
+
+def hash_shard(url, shard_count):
+    return int(hashlib.sha1(url.encode('utf-8')).hexdigest()[:8], 16) % shard_count
+
+
+def load_url_costs(run_report_path):
+    """{url: seconds} from an earlier run report (merged or single-job), or {} if there is none.
+
+    URLs that were not checked in that run (e.g. deferred by the schedule) have no time and are left out.
+    """
+    try:
+        with open(run_report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {url: values['total_s'] for url, values in report.get('urls', {}).items() if values.get('total_s')}
+
+
+def cost_shards(urls, shard_count, costs):
+    """{url: shard}; longest-first greedy assignment, each URL to the currently lightest shard."""
+    known = [costs[url] for url in urls if url in costs]
+    default_cost = statistics.median(known) if known else 1.0
+    loads = [0.0] * shard_count
+    assignment = {}
+    # Ties are broken by URL and by shard index, so every job computes the same split.
+    for url in sorted(set(urls), key=lambda url: (-costs.get(url, default_cost), url)):
+        shard = min(range(shard_count), key=lambda index: (loads[index], index))
+        assignment[url] = shard
+        loads[shard] += costs.get(url, default_cost)
+    return assignment
+
+
+def select_shard(urls, shard_index, shard_count, strategy="hash", costs=None):
+    """The URLs of one shard, in their original order."""
+    if shard_count <= 1:
+        return list(urls)
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"shard index {shard_index} is outside 0..{shard_count - 1}")
+    if strategy == "cost":
+        assignment = cost_shards(urls, shard_count, costs or {})
+        return [url for url in urls if assignment[url] == shard_index]
+    return [url for url in urls if hash_shard(url, shard_count) == shard_index]
+
+
+def merge_updates(partial_updates, url_order):
+    """Combines per-shard update lists into one, keeping the highest version per tracking_id.
+
+    The result follows `url_order` (the URL file), then each page's own link order.
+    """
+    from version_utils import version_key
+    position = {url: index for index, url in enumerate(url_order)}
+    ordered = sorted(
+        ((position.get(update['page_url'], len(position)), shard, link_index, update)
+         for shard, updates in enumerate(partial_updates) for link_index, update in enumerate(updates)),
+        key=lambda item: item[:3],
+    )
+    best = {}
+    for rank, (_, _, _, update) in enumerate(ordered):
+        tracking_id = update['tracking_id']
+        current = best.get(tracking_id)
+        if current is None or version_key(update['current_version_for_tracking']) > version_key(current[1]['current_version_for_tracking']):
+            best[tracking_id] = (rank, update)
+    return [update for _, update in sorted(best.values(), key=lambda item: item[0])]
+
+
+def merge_page_caches(partial_caches):
+    """Per URL, the entry that was stored (or checked) most recently across the shards."""
+    merged = {}
+    for entries in partial_caches:
+        for url, entry in entries.items():
+            current = merged.get(url)
+            if current is None or (entry.get('stored_at', 0), entry.get('checked_at', 0)) > (current.get('stored_at', 0), current.get('checked_at', 0)):
+                merged[url] = entry
+    return merged
+
+
+def merge_schedules(partial_schedules):
+    """Per URL, the schedule entry of the most recent check across the shards."""
+    merged = {}
+    for entries in partial_schedules:
+        for url, entry in entries.items():
+            current = merged.get(url)
+            if current is None or (entry.get('last_checked') or 0, entry.get('next_check', 0)) >= (current.get('last_checked') or 0, current.get('next_check', 0)):
+                merged[url] = entry
+    return merged
+
+
+def _current_pages(entries, url_order):
+    """Drops the entries of pages that are no longer in the URL file (kept as they are without one)."""
+    if not url_order:
+        return entries
+    current = set(url_order)
+    return {url: entry for url, entry in entries.items() if url in current}
+
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def merge_shards(shard_count, updates_file=UPDATES_FILE, delta_file=TRACKER_DELTA_FILE, page_cache_file=PAGE_CACHE_FILE,
+                 run_report_file=RUN_REPORT_FILE, url_file=URL_FILE, schedule_file=SCHEDULE_FILE,
+                 fingerprints_file=LINK_FINGERPRINTS_FILE, pending_page_cache_file=PENDING_PAGE_CACHE_FILE):
+    """Merges the partial files of `shard_count` shards; returns (updates, tracker delta, missing shard indexes)."""
+    from run_metrics import merge_reports, write_report
+    missing = [index for index in range(shard_count) if not os.path.exists(shard_path(updates_file, index))]
+    partial_updates = [_read_json(shard_path(updates_file, index), []) for index in range(shard_count)]
+    url_order = read_url_file(url_file) if os.path.exists(url_file) else []
+    updates = merge_updates(partial_updates, url_order)
+    delta = {update['tracking_id']: update['current_version_for_tracking'] for update in updates}
+    write_json_atomically(updates_file, updates)
+    write_json_atomically(delta_file, delta)
+
+    # Pending entries belong to this run only, so an older pending file is replaced rather than merged into.
+    partial_pending = [_read_json(shard_path(pending_page_cache_file, index), None) for index in range(shard_count)]
+    pending = merge_page_caches([entries for entries in partial_pending if entries is not None])
+    write_json_atomically(pending_page_cache_file, pending)
+
+    partial_caches = [_read_json(shard_path(page_cache_file, index), None) for index in range(shard_count)]
+    partial_caches = [entries for entries in partial_caches if entries is not None]
+    if partial_caches:
+        page_cache = merge_page_caches([_read_json(page_cache_file, {})] + partial_caches)
+        # The other shards (and the committed file) still hold the old entry of a page that found updates.
+        for url in pending:
+            page_cache.pop(url, None)
+        write_json_atomically(page_cache_file, page_cache)
+
+    partial_schedules = [_read_json(shard_path(schedule_file, index), None) for index in range(shard_count)]
+    partial_schedules = [entries for entries in partial_schedules if entries is not None]
+    if partial_schedules:
+        schedule = merge_schedules([_read_json(schedule_file, {})] + partial_schedules)
+        write_json_atomically(schedule_file, _current_pages(schedule, url_order), sort_keys=True)
+
+    # Every shard wrote only the pages it checked, and no page is in two shards.
+    partial_fingerprints = [_read_json(shard_path(fingerprints_file, index), None) for index in range(shard_count)]
+    partial_fingerprints = [pages for pages in partial_fingerprints if pages is not None]
+    if partial_fingerprints:
+        fingerprints = _read_json(fingerprints_file, {})
+        for pages in partial_fingerprints:
+            fingerprints.update(pages)
+        write_json_atomically(fingerprints_file, _current_pages(fingerprints, url_order))
+
+    partial_reports = [_read_json(shard_path(run_report_file, index), None) for index in range(shard_count)]
+    partial_reports = [report for report in partial_reports if report is not None]
+    if partial_reports:
+        write_report(merge_reports(partial_reports), run_report_file)
+    return updates, delta, missing
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the results of a sharded run.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    merge_parser = subparsers.add_parser('merge', help="Combine the per-shard files into the usual single-run files.")
+    merge_parser.add_argument('--shard-count', type=int, required=True)
+    merge_parser.add_argument('--updates-file', default=UPDATES_FILE)
+    merge_parser.add_argument('--tracker-delta', default=TRACKER_DELTA_FILE)
+    merge_parser.add_argument('--page-cache', default=PAGE_CACHE_FILE)
+    merge_parser.add_argument('--pending-page-cache', default=PENDING_PAGE_CACHE_FILE)
+    merge_parser.add_argument('--run-report', default=RUN_REPORT_FILE)
+    merge_parser.add_argument('--url-file', default=URL_FILE)
+    merge_parser.add_argument('--schedule-file', default=SCHEDULE_FILE)
+    merge_parser.add_argument('--link-fingerprints', default=LINK_FINGERPRINTS_FILE)
+    merge_parser.add_argument('--commit-tracker', metavar='TRACKING_FILE', nargs='?', const=TRACKING_FILE,
+                              help="Also record the delta in the tracker (default versions_tracker.json).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    updates, delta, missing = merge_shards(args.shard_count, args.updates_file, args.tracker_delta, args.page_cache,
+                                           args.run_report, args.url_file, args.schedule_file, args.link_fingerprints,
+                                           args.pending_page_cache)
+    if missing:
+        logging.warning(f"نتیجه شارد های {missing} پیدا نشد. ادغام بدون آنها انجام شد.")
+    if args.commit_tracker:
+        from tracker_store import TrackerStore
+        TrackerStore(args.commit_tracker).load().commit(delta)
+        logging.info(f"{len(delta)} شناسه در {args.commit_tracker} ثبت شد.")
+    if os.getenv('GITHUB_OUTPUT'):
+        with open(os.getenv('GITHUB_OUTPUT'), 'a', encoding='utf-8') as gh_output:
+            gh_output.write(f"updates_count={len(updates)}\n")
+    logging.info(f"ادغام {args.shard_count} شارد: {len(updates)} آپدیت در {args.updates_file} و {len(delta)} تغییر در {args.tracker_delta}.")
+    return 1 if len(missing) == args.shard_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""Process-wide record of import and initialization times, reported by --profile-startup.
+
+Only the first measurement of each stage is kept: for lazy imports and one-off
+initialization that is the cold-start cost, later occurrences are free.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter() # roughly when the entry script started importing its dependencies
+
+_timings = {}
+_lock = threading.Lock()
+
+
+def record(stage, seconds):
+    with _lock:
+        _timings.setdefault(stage, seconds)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def report():
+    """Returns {stage: seconds} in the order the stages first ran."""
+    with _lock:
+        return dict(_timings)
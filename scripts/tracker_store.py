@@ -0,0 +1,211 @@
+"""Version tracker storage: versions_tracker.json plus a write-ahead journal.
+
+versions_tracker.json keeps its {tracking_id: version} format, so it stays
+readable by anything that loads it directly. Per-entry metadata (last_seen,
+asset_hash, release_tag) lives next to it in tracker_metadata.json, and per-page
+download link fingerprints with the per-link results they stand for in
+link_fingerprints.json (see LinkFingerprintStore).
+
+Changes are appended to versions_tracker.journal first and folded into the JSON
+files by compact(), which rewrites them atomically. A run that dies between the
+two steps loses nothing: the journal is replayed on the next load.
+
+release_publisher.py commits each release's updates through commit_manifest();
+the same batch can be recorded by hand from a manifest:
+    python scripts/tracker_store.py commit --manifest download_manifest.json --release-tag TAG
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from atomic_files import write_json_atomically
+
+TRACKING_FILE = "versions_tracker.json"
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def load_tracker(tracking_file=TRACKING_FILE):
+    if os.path.exists(tracking_file):
+        try:
+            with open(tracking_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                logging.info(f"فایل ردیابی {tracking_file} با موفقیت بارگذاری شد.")
+                return data
+        except json.JSONDecodeError:
+            logging.warning(f"{tracking_file} خراب است. با ردیاب خالی شروع می شود.")
+            return {}
+    logging.info(f"فایل ردیابی {tracking_file} یافت نشد. با ردیاب خالی شروع می شود.")
+    return {}
+
+
+class TrackerStore:
+    """In-memory index of tracked versions and metadata, backed by a journal and compacted JSON files."""
+
+    def __init__(self, tracking_file=TRACKING_FILE, journal_file=None, metadata_file=None):
+        base_dir = os.path.dirname(tracking_file)
+        self.tracking_file = tracking_file
+        self.journal_file = journal_file or os.path.splitext(tracking_file)[0] + ".journal"
+        self.metadata_file = metadata_file or os.path.join(base_dir, "tracker_metadata.json")
+        self.versions = {}
+        self.metadata = {}
+        self._journal_entries = 0
+
+    def load(self):
+        self.versions = load_tracker(self.tracking_file)
+        if os.path.exists(self.metadata_file):
+            try:
+                with open(self.metadata_file, 'r', encoding='utf-8') as f:
+                    self.metadata = json.load(f)
+            except json.JSONDecodeError:
+                logging.warning(f"{self.metadata_file} خراب است. فراداده ها نادیده گرفته می شوند.")
+                self.metadata = {}
+        self._replay_journal()
+        return self
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the last line can be torn by a crash mid-write; anything after it is untrusted too.
+                    logging.warning(f"خط {line_number} ژورنال {self.journal_file} ناقص است و نادیده گرفته شد.")
+                    break
+                self._apply(entry)
+                self._journal_entries += 1
+        if self._journal_entries:
+            logging.info(f"{self._journal_entries} تغییر از ژورنال {self.journal_file} بازیابی شد.")
+
+    def _apply(self, entry):
+        tracking_id = entry['tracking_id']
+        if entry.get('version') is not None:
+            self.versions[tracking_id] = entry['version']
+        meta = self.metadata.setdefault(tracking_id, {})
+        meta.update({key: value for key, value in entry.items() if key != 'tracking_id' and value is not None})
+
+    def get(self, tracking_id, default=None):
+        return self.versions.get(tracking_id, default)
+
+    def snapshot(self):
+        """A plain {tracking_id: version} copy, e.g. for handing to worker processes."""
+        return dict(self.versions)
+
+    def record(self, entries):
+        """Appends entries ({"tracking_id", "version", metadata...}) to the journal in one write and indexes them."""
+        entries = list(entries)
+        if not entries:
+            return
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        for entry in entries:
+            self._apply(entry)
+        self._journal_entries += len(entries)
+
+    def compact(self):
+        """Folds the journal into the JSON files (atomically) and truncates it."""
+        write_json_atomically(self.tracking_file, self.versions)
+        write_json_atomically(self.metadata_file, self.metadata)
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._journal_entries = 0
+
+    def commit(self, tracking_versions, **metadata_by_id):
+        """Records a batch of {tracking_id: version} changes and compacts once.
+
+        Keyword arguments map a metadata field name to a {tracking_id: value} dict,
+        e.g. commit(versions, asset_hash={...}, release_tag={...}).
+        """
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        entries = []
+        for tracking_id, version in tracking_versions.items():
+            entry = {'tracking_id': tracking_id, 'version': version, 'last_seen': now}
+            for field, values in metadata_by_id.items():
+                entry[field] = values.get(tracking_id)
+            entries.append(entry)
+        self.record(entries)
+        self.compact()
+        return len(entries)
+
+
+class LinkFingerprintStore:
+    """Per page URL, the state an extractor keeps between runs to skip unchanged download links.
+
+    The state is opaque here (see farsroid_scraper.scrape_farsroid_page); it is
+    only valid together with the tracker, since verdicts are recorded against
+    the tracker versions they were compared with. The extractor checks the
+    format it recorded in each page's state and ignores states it did not write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.pages = json.load(f)
+            except json.JSONDecodeError:
+                logging.warning(f"{self.path} خراب است. همه لینک ها دوباره پردازش می شوند.")
+                self.pages = {}
+        return self
+
+    def get(self, page_url):
+        return self.pages.get(page_url, {})
+
+    def update(self, page_url, state):
+        if state:
+            self.pages[page_url] = state
+        else:
+            self.pages.pop(page_url, None)
+
+    def save(self, path=None, page_urls=None):
+        """Writes every page, or only `page_urls` (the current URL list, or the pages of one shard)."""
+        pages = self.pages if page_urls is None else {url: self.pages[url] for url in page_urls if url in self.pages}
+        write_json_atomically(path or self.path, pages)
+
+
+def commit_manifest(store, manifest, release_tag=None):
+    """Commits every downloaded or linked update of a download manifest in a single batch."""
+    records = manifest.get('downloaded', []) + manifest.get('linked', [])
+    versions = {record['tracking_id']: record['current_version_for_tracking'] for record in records}
+    asset_hashes = {record['tracking_id']: record.get('sha256') for record in records}
+    release_tags = {record['tracking_id']: record.get('release_tag') or release_tag for record in records}
+    return store.commit(versions, asset_hash=asset_hashes, release_tag=release_tags)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain versions_tracker.json.")
+    parser.add_argument('--tracking-file', default=TRACKING_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    commit_parser = subparsers.add_parser('commit', help="Record the published updates of a download manifest.")
+    commit_parser.add_argument('--manifest', required=True)
+    commit_parser.add_argument('--release-tag', help="Release the downloaded assets were published in.")
+    subparsers.add_parser('compact', help="Fold a leftover journal into the JSON files.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = TrackerStore(args.tracking_file).load()
+    if args.command == 'commit':
+        with open(args.manifest, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        count = commit_manifest(store, manifest, args.release_tag)
+        logging.info(f"{count} شناسه در {args.tracking_file} ثبت شد.")
+    else:
+        store.compact()
+        logging.info(f"ژورنال در {args.tracking_file} ادغام شد.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import re
+
+COMMON_VARIANT_KEYWORDS_TO_DETECT_AND_CLEAN = [
+    "Mod-Extra", "مود اکسترا", "موداکسترا",
+    "Mod-Lite", "مود لایت", "مودلایت",
+    "Ad-Free", "بدون تبلیغات",
+    "Unlocked", "آنلاک شده", "آنلاک",
+    "Patched", "پچ شده",
+    "Premium", "پرمیوم",
+    "Persian", "فارسی",
+    "English", "انگلیسی",
+    "Universal", "یونیورسال",
+    "Original", "اورجینال", "اصلی", "معمولی",
+    "Arm64-v8a", "Armeabi-v7a", "x86_64",
+    "Arm64", "Armv7", "Arm", "x86",
+    "Windows", "ویندوز", "PC", "کامپیوتر",
+    "macOS", "Mac", "OSX",
+    "Linux", "لینوکس",
+    "Ultra", "اولترا",
+    "Clone", "کلون",
+    "Beta", "بتا",
+    "Full", "کامل",
+    "Lite", "لایت",
+    "Main",
+    "Data", "دیتا", "Obb",
+    "Mod", "مود",
+    "Pro", "پرو",
+    "VIP", "وی آی پی",
+    "Plus", "پلاس",
+    "Image", "تصویر",
+    "Audio", "صوتی",
+    "Video", "ویدیو",
+    "Document", "سند", "Text", "متن",
+    "Archive", "آرشیو",
+    "Font", "فونت"
+]
+
+# Variant name -> patterns that identify it in a download link. The order is the order variants are reported in.
+LINK_VARIANT_KEYWORDS_ORDERED = {
+    "Mod-Extra": ["mod-extra", "مود اکسترا"], "Mod-Lite": ["mod-lite", "مود لایت"],
+    "Ad-Free": ["ad-free", "بدون تبلیغات"], "Unlocked": ["unlocked", "آنلاک"], "Patched": ["patched", "پچ شده"],
+    "Premium": ["premium", "پرمیوم"], "Ultra": ["ultra", "اولترا"], "Clone": ["clone", "کلون"],
+    "Beta": ["beta", "بتا"], "Full": ["full", "کامل"], "Lite": ["lite", "لایت"], "Main": ["main"],
+    "Pro": ["pro", "پرو"], "VIP": ["vip"], "Plus": ["plus", "پلاس"],
+    "Persian": ["persian", "فارسی"], "English": ["english", "انگلیسی"],
+    "Arm64-v8a": ["arm64-v8a", "arm64"], "Armeabi-v7a": ["armeabi-v7a", "armv7"],
+    "x86_64": ["x86_64"], "x86": ["x86"], "Arm": ["arm"],
+    "Mod": ["mod", "مود"],
+    "PC": ["pc", "کامپیوتر"], "Windows": ["windows", "ویندوز"],
+    "Data": ["data", "obb", "دیتا"]
+}
+
+# A variant is dropped when any of the listed, more specific variants was also found.
+SUPPRESSED_BY = {
+    "Mod": ("Mod-Extra", "Mod-Lite"),
+    "Lite": ("Mod-Lite",),
+}
+
+
+def _compile_keyword_alternation(keywords):
+    # Longest first, so that at any position the most specific keyword wins (e.g. "Mod-Lite" over "Mod").
+    alternatives = sorted(set(keywords), key=lambda kw: (-len(kw), kw))
+    return re.compile(r'\b(?:' + '|'.join(re.escape(kw) for kw in alternatives) + r')\b', re.IGNORECASE)
+
+
+_LINK_VARIANT_BY_PATTERN = {
+    pattern.lower(): variant
+    for variant, patterns in LINK_VARIANT_KEYWORDS_ORDERED.items()
+    for pattern in patterns
+}
+_LINK_VARIANT_RE = _compile_keyword_alternation(_LINK_VARIANT_BY_PATTERN)
+_VARIANT_ORDER = {variant: position for position, variant in enumerate(LINK_VARIANT_KEYWORDS_ORDERED)}
+
+# Longest first, as the tracking-id cleaning always removed them; ties by name so the order is stable.
+_TRACKING_CLEAN_KEYWORDS = sorted(
+    set(COMMON_VARIANT_KEYWORDS_TO_DETECT_AND_CLEAN + ["PC", "کامپیوتر", "ویندوز", "Windows", "Lite", "لایت", "Pro", "پرو"]),
+    key=lambda kw: (-len(kw), kw),
+)
+_TRACKING_CLEAN_RES = [(kw.lower(), re.compile(r'\b' + re.escape(kw) + r'\b', re.IGNORECASE)) for kw in _TRACKING_CLEAN_KEYWORDS]
+_WHITESPACE_RE = re.compile(r'\s+')
+# Letters that re.IGNORECASE matches to a keyword letter although str.lower() maps them elsewhere.
+_IGNORECASE_FOLDS = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's'})
+
+
+def detect_link_variants(text):
+    """Returns the variants named in `text`, in LINK_VARIANT_KEYWORDS_ORDERED order, from a single regex scan.
+
+    A longer keyword shadows the shorter ones it contains, which only ever hides
+    variants that SUPPRESSED_BY would drop anyway (e.g. "mod" inside "mod-lite").
+    """
+    found = {_LINK_VARIANT_BY_PATTERN[match.group(0).lower()] for match in _LINK_VARIANT_RE.finditer(text)}
+    found = {variant for variant in found if not any(s in found for s in SUPPRESSED_BY.get(variant, ()))}
+    return sorted(found, key=_VARIANT_ORDER.__getitem__)
+
+
+def _strip_separators(name):
+    name = name.strip("-_ ")
+    return _WHITESPACE_RE.sub(' ', name).strip("-_ ")
+
+
+def strip_variant_keywords(name):
+    """Removes the variant keywords from `name` one keyword at a time, longest first.
+
+    Separators ("-_ ") are stripped after every removal, because that decides
+    what the next keyword can match (an underscore is a word character, so
+    "_Pro" only matches once the underscore is gone). The patterns are
+    precompiled, and a keyword that is not a substring of the name is skipped
+    without running its regex.
+    """
+    name = _strip_separators(name)
+    for keyword, pattern in _TRACKING_CLEAN_RES:
+        if keyword not in name.translate(_IGNORECASE_FOLDS).lower():
+            continue
+        previous = None
+        while previous != name:
+            previous = name
+            name = _strip_separators(pattern.sub('', name))
+    return name
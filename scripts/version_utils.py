@@ -0,0 +1,109 @@
+"""Version extraction and comparison.
+
+Patterns are compiled once at import. version_key() turns any version string into
+a comparable tuple and is LRU-cached, so the same tracker versions are parsed
+once per process no matter how many links are compared against them.
+
+Ordering: PEP 440 strings compare as packaging.version does (epochs aside).
+Other strings, such as "1.7.7-Mod-Extra", are split into a numeric release and
+a suffix. A suffix that starts with a pre-release word (alpha, beta, rc, dev,
+...) orders like the matching PEP 440 pre-release. Any other suffix sorts after
+the plain release and before the next one: 1.7.7 < 1.7.7-Mod < 1.7.8.
+Strings without a leading number sort below everything else.
+"""
+import re
+from functools import lru_cache
+
+from packaging.version import Version, InvalidVersion
+
+VERSION_REGEX_PATTERNS = [
+    r'(?<![\w.-])(?:[vV])?(\d+(?:\.\d+){1,3}(?:(?:[-._]?[a-zA-Z0-9]+)+)?)(?![.\w])',
+    r'(?<![\w.-])(?:[vV])?(\d+(?:\.\d+){1,2})(?![.\w])',
+]
+# Fallback pattern if more specific ones fail
+FALLBACK_VERSION_PATTERN = r'(\d+\.\d+(?:\.\d+){0,2}(?:[.-]?[a-zA-Z0-9]+)*)'
+
+_VERSION_RES = [re.compile(pattern) for pattern in VERSION_REGEX_PATTERNS]
+_FALLBACK_VERSION_RE = re.compile(FALLBACK_VERSION_PATTERN)
+_LEGACY_VERSION_RE = re.compile(r'^\s*[vV]?(\d+(?:\.\d+)*)(.*)$', re.DOTALL)
+_SUFFIX_TOKEN_RE = re.compile(r'[a-zA-Z]+|\d+')
+_PRE_RELEASE_STAGES = {
+    'dev': 0, 'alpha': 1, 'a': 1, 'beta': 2, 'b': 2, 'preview': 3, 'pre': 3, 'c': 3, 'rc': 3,
+}
+_STAGE_FINAL = 4
+_STAGE_POST = 5
+_NO_DEV = (1, 0) # sorts after every (0, n) dev marker
+
+
+def extract_version_from_text_or_url(text_content, url_content):
+    sources = [source for source in (text_content, url_content) if source]
+    for compiled_patterns in (_VERSION_RES, [_FALLBACK_VERSION_RE]):
+        for source in sources:
+            for pattern in compiled_patterns:
+                match = pattern.search(source)
+                if match: return match.group(1).strip("-_ ")
+    return None
+
+
+def _trim_release(parts):
+    parts = list(parts)
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts)
+
+
+def _pep440_key(version):
+    if version.pre is not None:
+        stage = (_PRE_RELEASE_STAGES[version.pre[0]], version.pre[1])
+    elif version.post is None and version.dev is not None:
+        stage = (_PRE_RELEASE_STAGES['dev'], 0)
+    elif version.post is not None:
+        stage = (_STAGE_POST, version.post)
+    else:
+        stage = (_STAGE_FINAL, 0)
+    dev = (0, version.dev) if version.dev is not None else _NO_DEV
+    return (_trim_release(version.release), stage, dev, ())
+
+
+def _suffix_tokens(suffix):
+    return tuple((1, int(token)) if token.isdigit() else (0, token) for token in _SUFFIX_TOKEN_RE.findall(suffix.lower()))
+
+
+def _legacy_key(version_string):
+    match = _LEGACY_VERSION_RE.match(version_string)
+    if not match:
+        return ((), (-1, 0), _NO_DEV, _suffix_tokens(version_string))
+    release = _trim_release(int(part) for part in match.group(1).split('.'))
+    tokens = _suffix_tokens(match.group(2))
+    if tokens and tokens[0][0] == 0 and tokens[0][1] in _PRE_RELEASE_STAGES:
+        number = tokens[1][1] if len(tokens) > 1 and tokens[1][0] == 1 else 0
+        consumed = 2 if len(tokens) > 1 and tokens[1][0] == 1 else 1
+        return (release, (_PRE_RELEASE_STAGES[tokens[0][1]], number), _NO_DEV, tokens[consumed:])
+    return (release, (_STAGE_FINAL, 0), _NO_DEV, tokens)
+
+
+@lru_cache(maxsize=4096)
+def version_key(version_string):
+    """Returns a tuple that orders version strings; equal keys mean equal versions."""
+    try:
+        return _pep440_key(Version(version_string))
+    except InvalidVersion:
+        return _legacy_key(version_string)
+
+
+def is_newer_version(current_v_str, last_v_str):
+    """True if `current_v_str` is newer than the tracker's `last_v_str`; an empty or "0.0.0" tracker version is always older."""
+    if not current_v_str:
+        return False
+    if not last_v_str or last_v_str == "0.0.0":
+        return True
+    current_key, last_key = version_key(current_v_str), version_key(last_v_str)
+    if current_key != last_key:
+        return current_key > last_key
+    # Same version written differently (e.g. "1.7" and "1.7.0"): keep the old tie-break on the raw strings.
+    return current_v_str != last_v_str and current_v_str > last_v_str
+
+
+def compare_versions_batch(pairs):
+    """Compares many (current, last) pairs at once; returns one bool per pair, in order."""
+    return [is_newer_version(current_v_str, last_v_str) for current_v_str, last_v_str in pairs]
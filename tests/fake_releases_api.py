@@ -0,0 +1,161 @@
+"""An in-process stand-in for the GitHub releases endpoints that release_publisher.py uses.
+
+    with FakeReleasesAPI() as api:
+        client = GitHubReleases("owner/repo", api_url=api.url)
+
+Releases and assets live in memory (`releases`, `deleted_releases`,
+`deleted_assets`). Uploads can be made to fail: `upload_failures` maps an
+asset name to a list of statuses, one consumed per upload attempt. A status of
+"interrupted" stores the asset and still answers 502, like an upload that was
+cut off after GitHub had created the asset; the next upload of that name then
+gets the 422 GitHub answers for a duplicate name. `update_failures` likewise
+lists the statuses of the next release updates (PATCH).
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_RELEASES_RE = re.compile(r'^/repos/[^/]+/[^/]+/releases$')
+_RELEASE_RE = re.compile(r'^/repos/[^/]+/[^/]+/releases/(\d+)$')
+_RELEASE_ASSETS_RE = re.compile(r'^/repos/[^/]+/[^/]+/releases/(\d+)/assets$')
+_ASSET_RE = re.compile(r'^/repos/[^/]+/[^/]+/releases/assets/(\d+)$')
+_UPLOAD_RE = re.compile(r'^/uploads/repos/([^/]+/[^/]+)/releases/(\d+)/assets$')
+
+
+class FakeReleasesAPI:
+    def __init__(self):
+        self.releases = {}
+        self.deleted_releases = []
+        self.deleted_assets = []
+        self.upload_failures = {}
+        self.upload_attempts = {}
+        self.update_failures = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def _send(self, status, payload=None):
+                body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                body = self._body()
+                with api._lock:
+                    if _RELEASES_RE.match(parsed.path):
+                        self._send(201, api._create_release(json.loads(body), parsed.path))
+                        return
+                    match = _UPLOAD_RE.match(parsed.path)
+                    if match:
+                        status, payload = api._upload(int(match.group(2)), parse_qs(parsed.query)['name'][0], body)
+                        self._send(status, payload)
+                        return
+                self._send(404, {'message': 'Not Found'})
+
+            def do_PATCH(self):
+                match = _RELEASE_RE.match(urlparse(self.path).path)
+                fields = json.loads(self._body())
+                with api._lock:
+                    release = api.releases.get(int(match.group(1))) if match else None
+                    if release is None:
+                        self._send(404, {'message': 'Not Found'})
+                        return
+                    if api.update_failures:
+                        self._send(api.update_failures.pop(0), {'message': 'Server Error'})
+                        return
+                    release.update(fields)
+                    self._send(200, api._public(release))
+
+            def do_GET(self):
+                match = _RELEASE_ASSETS_RE.match(urlparse(self.path).path)
+                with api._lock:
+                    release = api.releases.get(int(match.group(1))) if match else None
+                    if release is None:
+                        self._send(404, {'message': 'Not Found'})
+                        return
+                    self._send(200, [{'id': asset['id'], 'name': asset['name'], 'size': asset['size']} for asset in release['assets']])
+
+            def do_DELETE(self):
+                path = urlparse(self.path).path
+                with api._lock:
+                    match = _RELEASE_RE.match(path)
+                    if match and int(match.group(1)) in api.releases:
+                        api.deleted_releases.append(api.releases.pop(int(match.group(1))))
+                        self._send(204)
+                        return
+                    match = _ASSET_RE.match(path)
+                    if match:
+                        asset_id = int(match.group(1))
+                        for release in api.releases.values():
+                            for asset in release['assets']:
+                                if asset['id'] == asset_id:
+                                    release['assets'].remove(asset)
+                                    api.deleted_assets.append(asset)
+                                    self._send(204)
+                                    return
+                self._send(404, {'message': 'Not Found'})
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id - 1
+
+    def _public(self, release):
+        return {key: value for key, value in release.items() if key != 'assets'}
+
+    def _create_release(self, fields, path):
+        release_id = self._new_id()
+        repository = path.split('/')[2] + '/' + path.split('/')[3]
+        release = dict(fields, id=release_id, assets=[],
+                       upload_url=f"{self.url}/uploads/repos/{repository}/releases/{release_id}/assets{{?name,label}}",
+                       html_url=f"https://github.com/{repository}/releases/tag/{fields['tag_name']}")
+        self.releases[release_id] = release
+        return self._public(release)
+
+    def _upload(self, release_id, name, content):
+        release = self.releases.get(release_id)
+        if release is None:
+            return 404, {'message': 'Not Found'}
+        self.upload_attempts[name] = self.upload_attempts.get(name, 0) + 1
+        if any(asset['name'] == name for asset in release['assets']):
+            return 422, {'message': 'Validation Failed', 'errors': [{'resource': 'ReleaseAsset', 'code': 'already_exists', 'field': 'name'}]}
+        failures = self.upload_failures.get(name)
+        failure = failures.pop(0) if failures else None
+        if failure is not None and failure != "interrupted":
+            return failure, {'message': 'Server Error'}
+        asset = {'id': self._new_id(), 'name': name, 'size': len(content), 'content': content}
+        release['assets'].append(asset)
+        if failure == "interrupted":
+            return 502, {'message': 'Server Error'}
+        return 201, {'id': asset['id'], 'name': name, 'size': asset['size']}
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
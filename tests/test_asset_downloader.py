@@ -0,0 +1,184 @@
+"""download_asset() against a local Range-capable server that can drop connections."""
+import hashlib
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from asset_downloader import AssetIndex, DownloadError, build_session, download_asset, download_updates
+
+CONTENT = bytes(range(256)) * 4096 # 1 MiB
+CONTENT_SHA256 = hashlib.sha256(CONTENT).hexdigest()
+_RANGE_RE = re.compile(r'bytes=(\d+)-$')
+
+
+class AssetServer:
+    """Serves CONTENT at /asset.apk with Range support.
+
+    `drop_after` is a list of byte counts: each of the next requests sends that
+    many body bytes and then closes the connection, despite its Content-Length.
+    Every request's Range header (or None) is recorded in `ranges`.
+    """
+
+    def __init__(self, content=CONTENT):
+        self.drop_after = []
+        self.ranges = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                range_header = self.headers.get('Range')
+                server.ranges.append(range_header)
+                start = 0
+                if range_header:
+                    start = int(_RANGE_RE.match(range_header).group(1))
+                    if start >= len(content):
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{len(content)}")
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{len(content) - 1}/{len(content)}")
+                else:
+                    self.send_response(200)
+                body = content[start:]
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if server.drop_after:
+                    self.wfile.write(body[:server.drop_after.pop(0)])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/asset.apk"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    with AssetServer() as asset_server:
+        yield asset_server
+
+
+def _file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _download(server, dest_path, retries=3):
+    return download_asset(build_session(1), server.url, str(dest_path), retries=retries, backoff=0.0, chunk_size=64 * 1024)
+
+
+def test_fresh_download_hashes_while_streaming(server, tmp_path):
+    dest = tmp_path / "asset.apk"
+
+    size, sha256 = _download(server, dest)
+
+    assert (size, sha256) == (len(CONTENT), CONTENT_SHA256)
+    assert _file_sha256(dest) == sha256
+    assert not os.path.exists(str(dest) + '.part')
+    assert server.ranges == [None]
+
+
+def test_resumes_a_part_file_with_range(server, tmp_path):
+    dest = tmp_path / "asset.apk"
+    (tmp_path / "asset.apk.part").write_bytes(CONTENT[:300000])
+
+    size, sha256 = _download(server, dest)
+
+    assert server.ranges == ["bytes=300000-"]
+    assert (size, sha256) == (len(CONTENT), CONTENT_SHA256)
+    assert _file_sha256(dest) == sha256
+
+
+def test_restarts_when_the_part_file_does_not_fit(server, tmp_path):
+    dest = tmp_path / "asset.apk"
+    # Longer than the remote file, e.g. left behind by an older build of the asset.
+    (tmp_path / "asset.apk.part").write_bytes(b"x" * (len(CONTENT) + 10))
+
+    size, sha256 = _download(server, dest)
+
+    assert server.ranges == [f"bytes={len(CONTENT) + 10}-", None]
+    assert (size, sha256) == (len(CONTENT), CONTENT_SHA256)
+    assert dest.read_bytes() == CONTENT
+
+
+def test_retries_a_dropped_connection_from_where_it_stopped(server, tmp_path):
+    dest = tmp_path / "asset.apk"
+    server.drop_after = [200000, 100000]
+
+    size, sha256 = _download(server, dest)
+
+    assert len(server.ranges) == 3
+    assert server.ranges[0] is None
+    resumed_from = [int(_RANGE_RE.match(header).group(1)) for header in server.ranges[1:]]
+    # Each retry picks up after the bytes that made it to the .part file.
+    assert 0 < resumed_from[0] <= 200000
+    assert resumed_from[0] < resumed_from[1] <= resumed_from[0] + 100000
+    assert (size, sha256) == (len(CONTENT), CONTENT_SHA256)
+    assert _file_sha256(dest) == sha256
+
+
+def test_gives_up_after_the_last_retry_and_keeps_the_part_file(server, tmp_path):
+    dest = tmp_path / "asset.apk"
+    server.drop_after = [200000, 200000]
+
+    with pytest.raises(DownloadError):
+        _download(server, dest, retries=1)
+
+    assert not dest.exists()
+    assert (tmp_path / "asset.apk.part").stat().st_size > 0
+
+
+def _update(server, version):
+    return {"app_name": "App", "version": version, "variant": "Universal", "download_url": server.url, "page_url": "https://farsroid.com/app/",
+            "tracking_id": "app", "suggested_filename": f"app-{version}.apk", "current_version_for_tracking": version}
+
+
+def test_a_fixed_url_is_only_linked_for_the_version_it_was_published_as(server, tmp_path):
+    asset_index = AssetIndex(str(tmp_path / "asset_index.json"))
+    asset_index.record("old-build", "app-1.0.apk", "updates-0", 10, "app", server.url, "1.0")
+
+    same = download_updates([_update(server, "1.0")], str(tmp_path / "same"), backoff=0.0, asset_index=asset_index)
+    assert [record["release_tag"] for record in same["linked"]] == ["updates-0"]
+    assert server.ranges == []
+
+    newer = download_updates([_update(server, "1.1")], str(tmp_path / "newer"), backoff=0.0, asset_index=asset_index)
+    assert server.ranges == [None]
+    assert newer["linked"] == []
+    assert [record["sha256"] for record in newer["downloaded"]] == [CONTENT_SHA256]
+
+
+def test_an_index_without_versions_is_not_trusted_for_urls(tmp_path):
+    path = tmp_path / "asset_index.json"
+    path.write_text(json.dumps({"by_hash": {"h": {"asset_name": "a.apk", "release_tag": "updates-0", "size": 1, "tracking_ids": [], "urls": ["u"]}},
+                                "by_url": {"u": "h"}}), encoding='utf-8')
+
+    asset_index = AssetIndex(str(path)).load()
+
+    assert asset_index.published_for_url("u", "1.0") == (None, None)
+    assert asset_index.published_for_hash("h")["release_tag"] == "updates-0"
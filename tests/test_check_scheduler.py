@@ -0,0 +1,15 @@
+"""CheckSchedule persistence."""
+import json
+
+from check_scheduler import CheckSchedule
+
+
+def test_save_prunes_pages_that_are_no_longer_listed(tmp_path):
+    path = tmp_path / "check_schedule.json"
+    schedule = CheckSchedule(str(path))
+    for url in ("https://farsroid.com/kept/", "https://farsroid.com/removed/"):
+        schedule.record(url, "current", now=100.0)
+
+    schedule.save(urls=["https://farsroid.com/kept/", "https://farsroid.com/never-checked/"])
+
+    assert set(json.loads(path.read_text(encoding='utf-8'))) == {"https://farsroid.com/kept/"}
@@ -0,0 +1,56 @@
+"""scrape_farsroid_page() reusing the per-page link state, on the saved farsroid page."""
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+import farsroid_scraper
+from farsroid_scraper import LINK_STATE_FORMAT, scrape_farsroid_page
+
+PAGE_URL = "https://www.farsroid.com/vivatv-android/"
+FIXTURE_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures', 'vivatv-android.html')
+
+
+@pytest.fixture(scope="module")
+def soup():
+    with open(FIXTURE_PAGE, 'r', encoding='utf-8') as f:
+        return BeautifulSoup(f.read(), 'html.parser')
+
+
+def _scraped_state(soup):
+    fingerprints = {}
+    updates = scrape_farsroid_page(PAGE_URL, soup, {}, fingerprints=fingerprints)
+    return updates, fingerprints
+
+
+def _fail_to_build(*args):
+    raise AssertionError("build_link_record() was called for a known link")
+
+
+def test_known_links_skip_record_building(soup, monkeypatch):
+    updates, fingerprints = _scraped_state(soup)
+    assert fingerprints["format"] == LINK_STATE_FORMAT
+    monkeypatch.setattr(farsroid_scraper, "build_link_record", _fail_to_build)
+
+    assert scrape_farsroid_page(PAGE_URL, soup, {}, fingerprints=fingerprints) == updates
+
+
+def test_state_from_other_extraction_code_is_rebuilt(soup, monkeypatch):
+    updates, fingerprints = _scraped_state(soup)
+    stale = dict(fingerprints, format="0-stale")
+    for state in stale["links"].values():
+        state["record"] = dict(state["record"], tracking_id="built_by_old_code")
+    built = []
+    build_link_record = farsroid_scraper.build_link_record
+    monkeypatch.setattr(farsroid_scraper, "build_link_record", lambda *args: built.append(args) or build_link_record(*args))
+
+    assert scrape_farsroid_page(PAGE_URL, soup, {}, fingerprints=stale) == updates
+    assert len(built) == len(fingerprints["links"])
+    assert stale["format"] == LINK_STATE_FORMAT
+
+
+def test_verdict_is_recomputed_when_the_tracker_moves(soup):
+    updates, fingerprints = _scraped_state(soup)
+    tracker = {update["tracking_id"]: update["version"] for update in updates}
+
+    assert scrape_farsroid_page(PAGE_URL, soup, tracker, fingerprints=fingerprints) == []
@@ -0,0 +1,176 @@
+"""publish_manifest() and record_published() against the local fake of the releases API."""
+import json
+import socket
+import time
+
+import pytest
+
+from fake_releases_api import FakeReleasesAPI
+from fetch_resilience import RetryPolicy
+from release_publisher import GitHubReleases, ReleaseAPIError, main, publish_manifest, record_published
+
+REPOSITORY_URL = "https://github.com/owner/repo"
+
+
+@pytest.fixture
+def api():
+    with FakeReleasesAPI() as fake_api:
+        yield fake_api
+
+
+def _record(tmp_path, tracking_id, version, page_url, content=None):
+    filename = f"{tracking_id}-{version}.apk"
+    path = tmp_path / filename
+    path.write_bytes(content if content is not None else tracking_id.encode('utf-8') * 1000)
+    return {
+        "app_name": tracking_id, "version": version, "variant": "Universal", "download_url": f"https://dl.example.com/{filename}",
+        "page_url": page_url, "tracking_id": tracking_id, "suggested_filename": filename, "current_version_for_tracking": version,
+        "filename": filename, "path": str(path), "size": path.stat().st_size, "sha256": tracking_id * 4,
+    }
+
+
+def _publish(api, manifest, max_attempts=3):
+    client = GitHubReleases("owner/repo", api_url=api.url)
+    return publish_manifest(manifest, client, "updates-1", "App Updates", REPOSITORY_URL, workers=2,
+                            retry_policy=RetryPolicy(max_attempts, 0.0))
+
+
+def test_failed_asset_moves_to_failed_and_the_draft_is_still_published(api, tmp_path):
+    good = _record(tmp_path, "app_a", "1.1", "https://farsroid.com/app-a/")
+    bad = _record(tmp_path, "app_b", "2.0", "https://farsroid.com/app-b/")
+    api.upload_failures[bad["filename"]] = [502, 503]
+
+    release, published = _publish(api, {"downloaded": [good, bad], "linked": [], "failed": []}, max_attempts=2)
+
+    assert release is not None and release["draft"] is False
+    assert api.upload_attempts[bad["filename"]] == 2
+    assert published["downloaded"] == [good]
+    assert [record["tracking_id"] for record in published["failed"]] == ["app_b"]
+    assert published["failed"][0]["error"].startswith("upload failed:")
+    stored = api.releases[release["id"]]
+    assert [asset["name"] for asset in stored["assets"]] == [good["filename"]]
+    # The published notes list only what made it.
+    assert "app_a v1.1" in stored["body"] and "app_b" not in stored["body"]
+
+
+def test_stale_asset_is_deleted_after_a_422_and_the_upload_retried(api, tmp_path):
+    record = _record(tmp_path, "app_a", "1.1", "https://farsroid.com/app-a/")
+    api.upload_failures[record["filename"]] = ["interrupted"]
+
+    release, published = _publish(api, {"downloaded": [record], "linked": [], "failed": []})
+
+    # 502 with the asset left behind, then 422 for the duplicate name, then a clean upload.
+    assert api.upload_attempts[record["filename"]] == 3
+    assert [asset["name"] for asset in api.deleted_assets] == [record["filename"]]
+    assets = api.releases[release["id"]]["assets"]
+    assert [asset["name"] for asset in assets] == [record["filename"]]
+    assert assets[0]["content"] == open(record["path"], 'rb').read()
+    assert published["downloaded"] == [record] and published["failed"] == []
+
+
+def test_draft_is_deleted_when_every_upload_fails(api, tmp_path):
+    records = [_record(tmp_path, "app_a", "1.1", "https://farsroid.com/app-a/"),
+               _record(tmp_path, "app_b", "2.0", "https://farsroid.com/app-b/")]
+    for record in records:
+        api.upload_failures[record["filename"]] = [500, 500]
+
+    release, published = _publish(api, {"downloaded": records, "linked": [], "failed": []}, max_attempts=2)
+
+    assert release is None
+    assert api.releases == {}
+    assert [deleted["tag_name"] for deleted in api.deleted_releases] == ["updates-1"]
+    assert published["downloaded"] == []
+    assert [record["tracking_id"] for record in published["failed"]] == ["app_a", "app_b"]
+
+
+def test_draft_is_deleted_when_it_cannot_be_published(api, tmp_path):
+    record = _record(tmp_path, "app_a", "1.1", "https://farsroid.com/app-a/")
+    api.update_failures = [502, 502]
+
+    with pytest.raises(ReleaseAPIError):
+        _publish(api, {"downloaded": [record], "linked": [], "failed": []}, max_attempts=2)
+
+    assert api.releases == {}
+    assert [deleted["tag_name"] for deleted in api.deleted_releases] == ["updates-1"]
+    assert [asset["name"] for asset in api.deleted_releases[0]["assets"]] == [record["filename"]]
+
+
+def test_nothing_to_upload_creates_no_release(api, tmp_path):
+    linked = dict(_record(tmp_path, "app_a", "1.1", "https://farsroid.com/app-a/"), release_tag="updates-0", asset_name="app_a-1.1.apk")
+
+    release, published = _publish(api, {"downloaded": [], "linked": [linked], "failed": []})
+
+    assert release is None and api.releases == {} and api.deleted_releases == []
+    assert published["linked"] == [linked]
+
+
+def _write_json(path, data):
+    path.write_text(json.dumps(data), encoding='utf-8')
+
+
+def _read_json(path):
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def test_record_published_commits_the_tracker_and_caches_only_fully_published_pages(tmp_path):
+    page_a, page_b, page_c = "https://farsroid.com/app-a/", "https://farsroid.com/app-b/", "https://farsroid.com/app-c/"
+    uploaded = _record(tmp_path, "app_a", "1.1", page_a)
+    linked = dict(_record(tmp_path, "app_c", "3.0", page_c), release_tag="updates-0", asset_name="app_c-3.0.apk")
+    # app_b's page had two updates and one of them failed, so the whole page has to be scraped again.
+    b_uploaded = _record(tmp_path, "app_b_mod", "2.0", page_b)
+    b_failed = dict(_record(tmp_path, "app_b", "2.0", page_b), error="upload failed: HTTP 502")
+    published = {"downloaded": [uploaded, b_uploaded], "linked": [linked], "failed": [b_failed]}
+
+    tracking_file, asset_index_file, page_cache_file = tmp_path / "versions_tracker.json", tmp_path / "asset_index.json", tmp_path / "page_cache.json"
+    _write_json(tracking_file, {"app_a": "1.0", "app_b": "1.9", "other": "5.0"})
+    _write_json(asset_index_file, {"by_hash": {linked["sha256"]: {"asset_name": "app_c-3.0.apk", "release_tag": "updates-0", "size": 1,
+                                                                  "tracking_ids": [], "urls": []}}, "by_url": {}})
+    now = time.time()
+    _write_json(page_cache_file, {"https://farsroid.com/unchanged/": {"content_hash": "u", "stored_at": now, "checked_at": now}})
+    pending = {url: {"content_hash": url[-6:], "stored_at": now, "checked_at": now, "etag": None, "last_modified": None}
+               for url in (page_a, page_b, page_c)}
+    _write_json(tmp_path / "page_cache.pending.json", pending)
+
+    count, failed_pages = record_published(published, "updates-1", str(tracking_file), str(asset_index_file), str(page_cache_file))
+
+    assert count == 3
+    assert failed_pages == {page_b}
+    assert _read_json(tracking_file) == {"app_a": "1.1", "app_b": "1.9", "app_b_mod": "2.0", "app_c": "3.0", "other": "5.0"}
+    metadata = _read_json(tmp_path / "tracker_metadata.json")
+    assert metadata["app_a"]["release_tag"] == "updates-1" and metadata["app_c"]["release_tag"] == "updates-0"
+    assert _read_json(asset_index_file)["by_hash"][uploaded["sha256"]]["release_tag"] == "updates-1"
+    assert set(_read_json(page_cache_file)) == {"https://farsroid.com/unchanged/", page_a, page_c}
+
+
+def test_record_published_without_a_release_leaves_pending_pages_uncached(tmp_path):
+    page = "https://farsroid.com/app-a/"
+    failed = dict(_record(tmp_path, "app_a", "1.1", page), error="upload failed: HTTP 500")
+    page_cache_file = tmp_path / "page_cache.json"
+    _write_json(tmp_path / "page_cache.pending.json", {page: {"content_hash": "h", "stored_at": 1, "checked_at": 1}})
+
+    count, failed_pages = record_published({"downloaded": [], "linked": [], "failed": [failed]}, None, str(tmp_path / "versions_tracker.json"),
+                                           str(tmp_path / "asset_index.json"), str(page_cache_file))
+
+    assert (count, failed_pages) == (0, {page})
+    assert not page_cache_file.exists()
+
+
+def test_main_records_nothing_when_the_release_cannot_be_created(tmp_path, monkeypatch):
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        unreachable = f"http://127.0.0.1:{closed.getsockname()[1]}"
+    page = "https://farsroid.com/app-a/"
+    manifest_file = tmp_path / "download_manifest.json"
+    _write_json(manifest_file, {"downloaded": [_record(tmp_path, "app_a", "1.1", page)], "linked": [], "failed": []})
+    tracking_file = tmp_path / "versions_tracker.json"
+    _write_json(tracking_file, {"app_a": "1.0"})
+    _write_json(tmp_path / "page_cache.pending.json", {page: {"content_hash": "h", "stored_at": time.time(), "checked_at": time.time()}})
+    monkeypatch.delenv('GITHUB_OUTPUT', raising=False)
+
+    status = main(["--manifest", str(manifest_file), "--release-tag", "updates-1", "--repository", "owner/repo", "--api-url", unreachable,
+                   "--backoff", "0", "--tracking-file", str(tracking_file), "--asset-index", str(tmp_path / "asset_index.json"),
+                   "--page-cache", str(tmp_path / "page_cache.json")])
+
+    assert status == 1
+    assert _read_json(tracking_file) == {"app_a": "1.0"}
+    assert not (tmp_path / "page_cache.json").exists()
@@ -0,0 +1,36 @@
+"""The static fast path's readiness check on raw HTML."""
+import os
+
+import pytest
+
+from scrapers import get_scraper
+
+FIXTURE_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures', 'vivatv-android.html')
+
+
+@pytest.fixture(scope="module")
+def farsroid():
+    return get_scraper("https://www.farsroid.com/vivatv-android/")
+
+
+def test_server_rendered_download_box_is_accepted(farsroid):
+    with open(FIXTURE_PAGE, 'r', encoding='utf-8') as f:
+        assert farsroid.has_expected_content(f.read())
+
+
+@pytest.mark.parametrize("page_content", [
+    '',
+    '<section class="downloadbox"><ul class="download-links"></ul></section>',
+    '<section class="downloadbox"><ul class="download-links"><li class="download-link"></li></ul></section>',
+    # A button outside any download-link item does not count.
+    '<section class="downloadbox"><ul class="download-links"><li class="download-link"></li></ul><a class="download-btn" href="/x.apk">x</a></section>',
+])
+def test_download_box_without_links_needs_the_browser(farsroid, page_content):
+    assert not farsroid.has_expected_content(page_content)
+
+
+def test_one_link_is_enough(farsroid):
+    assert farsroid.has_expected_content(
+        '<section class="downloadbox"><ul class="download-links">'
+        '<li class="download-link"><a class="download-btn" href="/app.apk"><span class="txt">دانلود</span></a></li>'
+        '</ul></section>')
@@ -0,0 +1,81 @@
+"""select_shard() and merge_shards() on the files two shards leave behind."""
+import json
+
+import pytest
+
+from sharding import hash_shard, merge_shards, select_shard, shard_path
+
+URLS = [f"https://farsroid.com/app-{index}/" for index in range(20)]
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def _read_json(path):
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+@pytest.mark.parametrize("strategy, costs", [("hash", None), ("cost", {url: index + 1.0 for index, url in enumerate(URLS[:10])})])
+def test_shards_split_the_urls_without_overlap(strategy, costs):
+    shards = [select_shard(URLS, index, 3, strategy, costs) for index in range(3)]
+
+    assert sorted(url for shard in shards for url in shard) == sorted(URLS)
+    for shard in shards:
+        assert shard == [url for url in URLS if url in shard] # original order
+    if strategy == "hash":
+        assert all(hash_shard(url, 3) == index for index, shard in enumerate(shards) for url in shard)
+
+
+def test_select_shard_rejects_an_index_outside_the_count():
+    with pytest.raises(ValueError):
+        select_shard(URLS, 3, 3)
+
+
+def test_merge_combines_pending_entries_and_drops_their_old_cache_entries(tmp_path):
+    page_a, page_b, page_c = URLS[:3]
+    (tmp_path / "urls_to_check.txt").write_text("\n".join([page_a, page_b, page_c]), encoding='utf-8')
+    files = {name: tmp_path / name for name in ("updates_found.json", "tracker_delta.json", "page_cache.json", "run_report.json",
+                                                  "check_schedule.json", "link_fingerprints.json", "page_cache.pending.json")}
+    # The committed cache still holds the entries page_a and page_b had before they found updates.
+    _write_json(files["page_cache.json"], {url: {"content_hash": "old", "stored_at": 1, "checked_at": 1} for url in (page_a, page_b, page_c)})
+    _write_json(files["page_cache.pending.json"], {"https://farsroid.com/from-an-older-run/": {"content_hash": "x", "stored_at": 1}})
+    shards = [(page_a, {"tracking_id": "app_a", "current_version_for_tracking": "1.1", "page_url": page_a}),
+              (page_b, {"tracking_id": "app_b", "current_version_for_tracking": "2.0", "page_url": page_b})]
+    for index, (page, update) in enumerate(shards):
+        _write_json(shard_path(files["updates_found.json"], index), [update])
+        _write_json(shard_path(files["page_cache.pending.json"], index), {page: {"content_hash": "new", "stored_at": 5, "checked_at": 5}})
+        _write_json(shard_path(files["page_cache.json"], index), {page_c: {"content_hash": "old", "stored_at": 1, "checked_at": 5 + index}})
+
+    updates, delta, missing = merge_shards(2, str(files["updates_found.json"]), str(files["tracker_delta.json"]), str(files["page_cache.json"]),
+                                           str(files["run_report.json"]), str(tmp_path / "urls_to_check.txt"), str(files["check_schedule.json"]),
+                                           str(files["link_fingerprints.json"]), str(files["page_cache.pending.json"]))
+
+    assert missing == []
+    assert delta == {"app_a": "1.1", "app_b": "2.0"}
+    assert [update["tracking_id"] for update in updates] == ["app_a", "app_b"]
+    pending = _read_json(files["page_cache.pending.json"])
+    assert set(pending) == {page_a, page_b}
+    assert all(entry["content_hash"] == "new" for entry in pending.values())
+    page_cache = _read_json(files["page_cache.json"])
+    assert set(page_cache) == {page_c}
+    assert page_cache[page_c]["checked_at"] == 6
+
+
+def test_merge_prunes_pages_removed_from_the_url_file(tmp_path):
+    kept, removed = URLS[:2]
+    (tmp_path / "urls_to_check.txt").write_text(kept, encoding='utf-8')
+    schedule_file, fingerprints_file = tmp_path / "check_schedule.json", tmp_path / "link_fingerprints.json"
+    _write_json(schedule_file, {url: {"last_checked": 1, "next_check": 2, "interval": 1, "changes": []} for url in (kept, removed)})
+    _write_json(fingerprints_file, {removed: {"links": {}}})
+    _write_json(shard_path(str(tmp_path / "updates_found.json"), 0), [])
+    _write_json(shard_path(str(schedule_file), 0), {kept: {"last_checked": 5, "next_check": 9, "interval": 4, "changes": []}})
+    _write_json(shard_path(str(fingerprints_file), 0), {kept: {"links": {}}})
+
+    merge_shards(1, str(tmp_path / "updates_found.json"), str(tmp_path / "tracker_delta.json"), str(tmp_path / "page_cache.json"),
+                 str(tmp_path / "run_report.json"), str(tmp_path / "urls_to_check.txt"), str(schedule_file), str(fingerprints_file),
+                 str(tmp_path / "page_cache.pending.json"))
+
+    assert _read_json(schedule_file) == {kept: {"last_checked": 5, "next_check": 9, "interval": 4, "changes": []}}
+    assert set(_read_json(fingerprints_file)) == {kept}
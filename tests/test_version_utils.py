@@ -0,0 +1,121 @@
+"""Version extraction and ordering, pinned on the tracker's own values and the saved farsroid page."""
+import json
+import os
+import re
+from urllib.parse import unquote, urlparse
+
+import pytest
+
+from version_utils import compare_versions_batch, extract_version_from_text_or_url, is_newer_version, version_key
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIXTURE_PAGE = os.path.join(REPO_DIR, 'benchmarks', 'fixtures', 'vivatv-android.html')
+_DOWNLOAD_LINK_RE = re.compile(r'class="download-btn"[^>]*href="([^"]+)"[^>]*>.*?<span class="txt">(.*?)</span>', re.DOTALL)
+
+
+def _tracker_versions():
+    with open(os.path.join(REPO_DIR, 'versions_tracker.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _fixture_links():
+    with open(FIXTURE_PAGE, 'r', encoding='utf-8') as f:
+        return [(href, text) for href, text in _DOWNLOAD_LINK_RE.findall(f.read())]
+
+
+def test_tracker_values_are_covered():
+    assert sorted(set(_tracker_versions().values())) == ["1.7.7", "7.6b"]
+
+
+@pytest.mark.parametrize("current, last, expected", [
+    ("1.7.7", "1.7.7", False),
+    ("1.7.8", "1.7.7", True),
+    ("1.7.6", "1.7.7", False),
+    ("1.8", "1.7.7", True),
+    ("1.7.7.1", "1.7.7", True),
+    ("7.6b", "7.6b", False),
+    ("7.6", "7.6b", True), # the final release follows its beta
+    ("7.6b", "7.6", False),
+    ("7.6b1", "7.6b", True),
+    ("7.6a", "7.6b", False),
+    ("7.7", "7.6b", True),
+    ("1.7.7", None, True),
+    ("1.7.7", "0.0.0", True),
+    ("", "1.7.7", False),
+])
+def test_is_newer_version_against_tracker_values(current, last, expected):
+    assert is_newer_version(current, last) is expected
+
+
+@pytest.mark.parametrize("smaller, larger", [
+    ("1.7.7", "1.7.8"),
+    ("1.9-mod", "1.10-mod"),
+    ("1.7.7", "1.7.7-Mod"),
+    ("1.7.7-Mod", "1.7.8"),
+    ("1.7.7-Mod-Extra", "1.7.8"),
+    ("7.6b", "7.6b-Premium"),
+    ("7.6b-Premium", "7.6"),
+    ("7.6b-Premium", "7.6-Premium"),
+    ("7.6a-Premium", "7.6b-Premium"),
+    ("7.6b-Premium", "7.6.1b"),
+    ("beta", "0.1"), # no leading number sorts below everything
+])
+def test_version_key_orders_non_pep440_versions(smaller, larger):
+    assert version_key(smaller) < version_key(larger)
+    assert is_newer_version(larger, smaller)
+    assert not is_newer_version(smaller, larger)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("1.7", "1.7.0"),
+    ("v1.7.7", "1.7.7"),
+    ("7.6b", "7.6beta"),
+    ("1.7.7-Mod", "1.7.7-mod"),
+])
+def test_equal_versions_share_a_key(first, second):
+    assert version_key(first) == version_key(second)
+
+
+# The old compare_versions() fell back to comparing raw strings whenever either side was not PEP 440,
+# so these pairs used to come out the other way round.
+@pytest.mark.parametrize("current, last, expected", [
+    ("1.10-mod", "1.9-mod", True),
+    ("1.9-mod", "1.10-mod", False),
+    ("7.6b-Premium", "7.6", False),
+    ("7.6", "7.6b-Premium", True),
+    ("v1.2", "1.7.7-Mod-Extra", False),
+    ("1.7.7-Mod-Extra", "v1.2", True),
+    ("10.0-Mod", "9.9-Mod", True),
+])
+def test_ordering_changed_from_string_comparison(current, last, expected):
+    assert is_newer_version(current, last) is expected
+
+
+def test_equal_keys_keep_the_string_tie_break():
+    # "1.7.0" > "1.7" as strings, as the version comparison has always decided.
+    assert is_newer_version("1.7.0", "1.7")
+    assert not is_newer_version("1.7", "1.7.0")
+
+
+def test_extract_version_from_fixture_links():
+    versions = [extract_version_from_text_or_url(text, unquote(urlparse(href).path.split('/')[-1]))
+                for href, text in _fixture_links()]
+    assert versions == ["1.7.7-Mod-Extra", "1.7.7-Mod-Lite", "7.6b-Premium"]
+
+
+def test_fixture_versions_against_the_tracker():
+    tracker = _tracker_versions()
+    pairs = [("1.7.7-Mod-Extra", tracker["vivatv_mod_extra"]), ("1.7.7-Mod-Lite", tracker["vivatv_mod_lite"]),
+             ("7.6b-Premium", tracker["vivatv_premium"]), ("1.7.7", tracker["vivatv_mod_extra"])]
+    # A variant suffix sorts after its plain release, so the page's own spelling reads as newer than the tracker's.
+    assert compare_versions_batch(pairs) == [True, True, True, False]
+
+
+@pytest.mark.parametrize("text, url, expected", [
+    ("دانلود نسخه 1.7.8 برنامه", "ViVaTV-1.7.7-Mod-Extra(www.farsroid.com).apk", "1.7.8"), # the link text wins
+    ("دانلود ViVa TV v2.0.1 - 25 مگابایت", "ViVaTV(www.farsroid.com).apk", "2.0.1"),
+    ("", "Telegram-10.3.2-arm64-v8a(www.farsroid.com).apk", "10.3.2-arm64-v8a"),
+    ("دانلود فایل نصبی برنامه", "app.apk", None),
+])
+def test_extract_version_from_text_or_url(text, url, expected):
+    assert extract_version_from_text_or_url(text, url) == expected